@@ -1,8 +1,8 @@
-from datetime import datetime
 import inspect
 import os
 
-from scaffold.cf.stack.builder import StackBuilder, ConfigUploader
+from scaffold.cf import CONFIG_BUNDLE_NAME
+from scaffold.cf.stack.builder import StackBuilder, ConfigUploader, content_key_prefix
 from scaffold.cf import stack
 from .tiny_template import TinyElkTemplate
 
@@ -16,14 +16,20 @@ class TinyElkBuilder(StackBuilder):
         return self.args.deploy_s3_bucket
 
     def create_s3_key_prefix(self):
-        return '{}/elk-tiny-{}'.format(self.args.deploy_s3_key_prefix, datetime.utcnow().strftime('%Y%m%d-%H%M%S'))
+        return content_key_prefix(self.args.deploy_s3_key_prefix, 'elk-tiny', [self._config_dir()])
+
+    def get_template_key_prefix(self):
+        return '{}/templates'.format(self.args.deploy_s3_key_prefix)
+
+    def get_dependency_stack_names(self):
+        return [self.args.network_stack_name]
 
     def get_dependencies(self, dependencies):
-        outputs = stack.outputs(self.session, self.args.network_stack_name)
+        outputs = stack.exported_outputs(self.session, self.args.network_stack_name)
 
         dependencies.vpc_id = outputs['VpcId']
         dependencies.vpc_cidr = outputs['VpcCidr']
-        dependencies.es_subnet_ids = outputs.values(lambda k: 'PrivateSubnet' in k)
+        dependencies.es_subnet_ids = outputs.values(stack.KeySelector.glob('*PrivateSubnet*'))
         # dependencies.kibana_subnet_ids = outputs.values(lambda k: 'PublicSubnet' in k)
 
     def get_capabilities(self):
@@ -50,11 +56,12 @@ class TinyElkBuilder(StackBuilder):
     # es_instance_type=build_parameters.es_instance_type if argy.es_instance_type is None else argy.es_instance_type,
     # kibana_instance_type=build_parameters.kibana_instance_type if argy.kibana_instance_type is None else argy.kibana_instance_type
 
-    def do_before_create(self, dependencies, dry_run):
-        base_dir = os.path.dirname(inspect.getfile(TinyElkTemplate))
-        base_dir = os.path.join(base_dir, 'config')
+    def _config_dir(self):
+        return os.path.join(os.path.dirname(inspect.getfile(TinyElkTemplate)), 'config')
 
-        ConfigUploader(self.session, self.get_s3_bucket()).upload_to_s3(base_dir, dependencies.s3_key_prefix)
+    def do_before_create(self, dependencies, dry_run):
+        key = '{}/{}'.format(dependencies.s3_key_prefix, CONFIG_BUNDLE_NAME)
+        return [ConfigUploader(self.session, self.get_s3_bucket()).upload_bundle(self._config_dir(), key)]
 
     def get_stack_parameters(self):
         stack_parms = {}
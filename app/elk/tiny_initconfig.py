@@ -1,3 +1,7 @@
+from scaffold.cf import CONFIG_BUNDLE_NAME
+
+# Where the config bundle is extracted on the Logstash server
+LOGSTASH_CONFIG_DIR = '/etc/logstash/laurel'
 
 
 class ESInitConfig(object):
@@ -62,26 +66,16 @@ class LogstashInitConfig(object):
             }
         }
 
-    def files(self):
+    def sources(self):
+        # the whole app/elk/config directory, as packed by ConfigUploader.upload_bundle
         return {
-            '/etc/logstash/logstash.pre.conf': {
-                'source': self._to_s3_url('ls-tiny.conf'),
-                'group': 'logstash',
-                'owner': 'logstash',
-                'mode': '000777'  # TODO: change to 644
-            },
-            '/etc/logstash/ls_config.py': {
-                'source': self._to_s3_url('ls_config.py'),
-                'group': 'logstash',
-                'owner': 'logstash',
-                'mode': '000777'  # TODO: change to 644
-            }
+            LOGSTASH_CONFIG_DIR: self._to_s3_url(CONFIG_BUNDLE_NAME)
         }
 
     def commands(self):
         return {
             'config-logstash': {
-                'command': 'python ls_config.py logstash.pre.conf',
+                'command': 'python {0}/ls_config.py {0}/ls-tiny.conf'.format(LOGSTASH_CONFIG_DIR),
                 'cwd': '/etc/logstash'
             }
         }
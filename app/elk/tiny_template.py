@@ -320,7 +320,7 @@ class TinyElkTemplate(TemplateBuilder):
             ),
             logstash=cf.InitConfig(
                 packages=init.packages(),
-                files=init.files(),
+                sources=init.sources(),
                 commands=init.commands(),
                 services=init.services()
             )
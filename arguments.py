@@ -5,11 +5,13 @@ default_deploy_s3_key_prefix = 'scaffold'
 
 
 deploy_s3_bucket_help = 'Name of the S3 bucket to which stack template files are uploaded.'
+build_report_help = 'Write the phase timings, API call counts and bytes uploaded of the build to this file as JSON.'
 deploy_s3_key_prefix_help = 'Prefix to use when uploading stack template files to the bucket. Also here is a very long line that should trigger pyflakes or pylint'
 
 role_help = 'Role, if any, to assume when performing actions'
 profile_help = 'AWS Credential and Config profile to use.'
 region_help = 'Region to connect to. Required if profile is specified.'
+regions_help = 'Deploy to each of these regions concurrently instead of to --region. A {region} placeholder in --deploy-s3-bucket is replaced with each region.'
 dry_run_help = 'Report on what would have happened. Take no mutable action.'
 
 def add_deployment_group(argparser,
@@ -21,12 +23,15 @@ def add_deployment_group(argparser,
                        help=generate_help(deploy_s3_bucket_help, default_deploy_s3_bucket, use_defaults))
     group.add_argument('--deploy-s3-key-prefix', default=default_deploy_s3_key_prefix if use_defaults else None,
                        help=generate_help(deploy_s3_key_prefix_help, default_deploy_s3_key_prefix, use_defaults))
+    group.add_argument('--build-report', metavar='FILE',
+                       help=build_report_help)
     return group
 
 
 def add_security_control_group(argparser,
                                default_profile_name='default',
-                               add_help=True):
+                               add_help=True,
+                               multi_region=False):
     group = argparser.add_argument_group('Security and control')
     group.add_argument('--role',
                        help=role_help)
@@ -34,6 +39,9 @@ def add_security_control_group(argparser,
                        help=generate_help(profile_help, default_profile_name))
     group.add_argument('--region', default=default_region_name,
                        help=generate_help(region_help, default_region_name))
+    if multi_region:
+        group.add_argument('--regions', nargs='+', metavar='REGION',
+                           help=regions_help)
     group.add_argument('--dry-run', default=False, action='store_true',
                        help='Report on what would have happened. Take no mutable action.')
     if add_help:
@@ -4,7 +4,9 @@ import argparse
 
 import arguments
 import logconfig
+import regional
 import session
+from scaffold.cf.stack import timing
 from scaffold.vpc.vpc_builder import VpcBuilder
 
 
@@ -41,7 +43,7 @@ def get_args():
                     help=arguments.generate_help('Size of the private subnets.', default_priv_size))
 
     arguments.add_deployment_group(ap)
-    arguments.add_security_control_group(ap)
+    arguments.add_security_control_group(ap, multi_region=True)
 
     return ap.parse_args()
 
@@ -49,12 +51,18 @@ def get_args():
 if __name__ == "__main__":
     logconfig.config()
     args = get_args()
-    results = create_stack(args)
-    # TODO: move these to logging messages
-    if results.dry_run:
-        print results.template
+    if args.regions:
+        results = regional.deploy(args, create_stack)
+        regional.print_results(results)
     else:
-        print 'ID:     ', results.stack.stack_id
-        print 'STATUS: ', results.stack.stack_status
-        if results.stack.stack_status_reason is not None:
-            print 'REASON: ', results.stack.stack_status_reason
+        results = create_stack(args)
+        # TODO: move these to logging messages
+        if results.dry_run:
+            print results.template
+        else:
+            print 'ID:     ', results.stack.stack_id
+            print 'STATUS: ', results.stack.stack_status
+            if results.stack.stack_status_reason is not None:
+                print 'REASON: ', results.stack.stack_status_reason
+    if args.build_report:
+        timing.write_build_report(args.build_report, results)
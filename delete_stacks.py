@@ -0,0 +1,63 @@
+#!/usr/bin/python
+# Delete a group of stacks, dependents first.
+#
+# Stacks are selected by name pattern (shell-style, e.g. 'dev-*'), by stack tag, or both.
+# Dependencies are worked out from the stacks' exports/imports and, heuristically, from output values that other
+# stacks' templates or parameters use verbatim (see stack_dependency_graph).
+# Stacks that do not depend on each other are deleted concurrently.
+
+import argparse
+
+import arguments
+import logconfig
+import session
+from scaffold.cf.stack.bulk_delete import BulkStackDeleter, APPLICATION_TAG
+
+
+def delete_stacks(args):
+    boto3_session = session.new(args.profile, args.region, args.role)
+
+    deleter = BulkStackDeleter(boto3_session,
+                               pattern=args.pattern,
+                               tag_value=args.tag_value,
+                               tag_key=args.tag_key,
+                               max_workers=args.max_concurrency)
+    layers = deleter.plan()
+    if args.dry_run:
+        return layers, None
+    return layers, deleter.delete(layers)
+
+
+default_max_concurrency = 4
+
+
+def get_args():
+    ap = argparse.ArgumentParser(description='Delete all stacks matching a name pattern and/or tag, in reverse dependency order',
+                                 add_help=False)
+    sel = ap.add_argument_group('Stack selection')
+    sel.add_argument('--pattern',
+                     help='Shell-style pattern matched against stack names, e.g. dev-*')
+    sel.add_argument('--tag-value',
+                     help='Only delete stacks whose tag has this value.')
+    sel.add_argument('--tag-key', default=APPLICATION_TAG,
+                     help=arguments.generate_help('Stack tag matched by --tag-value.', APPLICATION_TAG))
+    sel.add_argument('--max-concurrency', default=default_max_concurrency, type=int, metavar='N',
+                     help=arguments.generate_help('Maximum number of concurrent delete requests.', default_max_concurrency))
+    arguments.add_security_control_group(ap)
+    return ap.parse_args()
+
+
+if __name__ == '__main__':
+    logconfig.config()
+    args = get_args()
+    layers, results = delete_stacks(args)
+    # TODO: move these to logging messages
+    for index, layer in enumerate(layers):
+        print 'Layer {}: {}'.format(index, ', '.join(layer))
+    if results is not None:
+        for name, status in sorted(results.results.items()):
+            print 'Stack {} deleted'.format(name)
+        for name, error in sorted(results.failures.items()):
+            print 'Stack {} FAILED: {}'.format(name, error)
+        for name in results.skipped:
+            print 'Stack {} SKIPPED'.format(name)
@@ -0,0 +1,187 @@
+#!/usr/bin/python
+# Create or update every stack in an environment.
+#
+# Stacks are built in dependency order. Stacks that do not depend on each other are built concurrently,
+# so bringing up an environment takes as long as its longest chain of dependent stacks.
+#
+# The environment file is YAML. Each stack names its type; all other keys are passed to the stack's builder
+# exactly as the corresponding create_*/update_* script arguments would be. Example:
+#
+# stacks:
+#   DevNetwork:
+#     type: vpc
+#     cidr: 172.16.0.0/18
+#   DevStile:
+#     type: stile
+#     network_stack_name: DevNetwork
+#     bastion_key: dev-key
+#   DevConsul:
+#     type: consul
+#     network_stack_name: DevNetwork
+#     consul_key: dev-key
+#
+# Stacks that already exist are updated; stacks that do not are created with the create script defaults.
+# Stack names must be alphanumeric where the stack's template uses the name in its resource names.
+
+import argparse
+import re
+
+import yaml
+
+import arguments
+import create_consul_stack
+import create_iam_stack
+import create_stile_stack
+import create_tiny_elk_stack
+import create_vpc_stack
+import logconfig
+import regional
+import session
+from scaffold.cf import stack
+from scaffold.cf.stack import timing
+from app.elk.tiny_builder import TinyElkBuilder
+from scaffold.cf.stack.orchestrator import StackOrchestrator
+from scaffold.consul.consul_builder import ConsulBuilder
+from scaffold.iam.cf_builder import IAMBuilder
+from scaffold.stile.stile_builder import StileBuilder
+from scaffold.vpc.vpc_builder import VpcBuilder
+
+
+STACK_TYPES = {
+    'vpc': (VpcBuilder, {
+        'desc': create_vpc_stack.default_desc,
+        'cidr': create_vpc_stack.default_cidr,
+        'availability_zones': create_vpc_stack.default_azs,
+        'pub_size': create_vpc_stack.default_pub_size,
+        'priv_size': create_vpc_stack.default_priv_size
+    }),
+    'stile': (StileBuilder, {
+        'desc': create_stile_stack.default_desc,
+        'bastion_type': create_stile_stack.default_bastion_type,
+        'nat_type': create_stile_stack.default_nat_type
+    }),
+    'consul': (ConsulBuilder, {
+        'desc': create_consul_stack.default_desc,
+        'instance_type': create_consul_stack.default_instance_type,
+        'ui_instance_type': create_consul_stack.default_ui_instance_type,
+        'cluster_size': create_consul_stack.default_cluster_size
+    }),
+    'elk': (TinyElkBuilder, {
+        'desc': create_tiny_elk_stack.default_desc,
+        'es_instance_type': create_tiny_elk_stack.default_es_instance_type,
+        'kibana_instance_type': create_tiny_elk_stack.default_kibana_instance_type
+    }),
+    'iam': (IAMBuilder, {
+        'desc': create_iam_stack.default_desc,
+        'bucket': create_iam_stack.default_bucket,
+        'enable': False
+    })
+}
+
+# Templates of these stack types use the stack name in resource names, which must be alphanumeric
+NAMED_RESOURCE_TYPES = ('vpc',)
+
+
+class StackArgs(argparse.Namespace):
+    '''Builder arguments. Arguments the environment file leaves out are None, as they are in the update scripts.'''
+    def __getattr__(self, name):
+        if name.startswith('__'):
+            raise AttributeError(name)
+        return None
+
+
+def create_builders(args, environment, boto3_session):
+    existing_stacks = stack.StackCatalog(boto3_session)
+    stack.outputs_cache.prime(boto3_session, existing_stacks)  # dependency outputs without a describe per stack
+
+    builders = []
+    for stack_name, spec in environment['stacks'].items():
+        spec = dict(spec)
+        stack_type = spec.pop('type')
+        if stack_type not in STACK_TYPES:
+            raise ValueError('Stack {} has unknown type {}. Known types: {}'.format(
+                stack_name, stack_type, sorted(STACK_TYPES)))
+        if stack_type in NAMED_RESOURCE_TYPES and not re.match(r'^[a-zA-Z0-9]+$', stack_name):
+            raise ValueError('Stack {} must have an alphanumeric name: {} templates use it in resource names'.format(
+                stack_name, stack_type))
+        builder_class, create_defaults = STACK_TYPES[stack_type]
+        is_update = stack_name in existing_stacks
+
+        stack_args = StackArgs(stack_name=stack_name,
+                               deploy_s3_bucket=args.deploy_s3_bucket,
+                               deploy_s3_key_prefix=args.deploy_s3_key_prefix)
+        if not is_update:
+            for k, v in create_defaults.items():
+                setattr(stack_args, k, v)
+        for k, v in spec.items():
+            setattr(stack_args, k, v)
+
+        builders.append(builder_class(stack_args, session.clone(boto3_session), is_update))
+    return builders
+
+
+def deploy_environment(args):
+    boto3_session = session.new(args.profile, args.region, args.role)
+    with open(args.environment_file, 'r') as f:
+        environment = yaml.safe_load(f)
+    builders = create_builders(args, environment, boto3_session)
+    orchestrator = StackOrchestrator(builders, args.max_concurrency, not args.keep_going)
+    return orchestrator.build(args.dry_run)
+
+
+default_max_concurrency = 4
+
+
+def get_args():
+    ap = argparse.ArgumentParser(description='Create or update all stacks in an environment, in dependency order',
+                                 add_help=False)
+    req = ap.add_argument_group('Required')
+    req.add_argument('environment_file',
+                     help='YAML file describing the stacks in the environment')
+
+    orc = ap.add_argument_group('Orchestration')
+    orc.add_argument('--max-concurrency', default=default_max_concurrency, type=int, metavar='N',
+                     help=arguments.generate_help('Maximum number of stacks to build at the same time.',
+                                                  default_max_concurrency))
+    orc.add_argument('--keep-going', default=False, action='store_true',
+                     help='Keep building stacks that do not depend on a failed stack. By default, no new stacks are started after a failure.')
+    arguments.add_deployment_group(ap)
+    arguments.add_security_control_group(ap, multi_region=True)
+    return ap.parse_args()
+
+
+def print_results(results):
+    # TODO: move these to logging messages
+    for name, stack_results in sorted(results.results.items()):
+        print '== {}'.format(name)
+        if stack_results.dry_run:
+            print stack_results.template
+        else:
+            print 'ID:     ', stack_results.stack.stack_id
+            print 'STATUS: ', stack_results.stack.stack_status
+            if stack_results.stack.stack_status_reason is not None:
+                print 'REASON: ', stack_results.stack.stack_status_reason
+    for name, error in sorted(results.failures.items()):
+        print '== {}'.format(name)
+        print 'FAILED: ', error
+    for name in results.skipped:
+        print '== {}'.format(name)
+        print 'SKIPPED'
+
+
+if __name__ == '__main__':
+    logconfig.config()
+    args = get_args()
+    if args.regions:
+        results = regional.deploy(args, deploy_environment)
+        for region, environment_results in sorted(results.results.items()):
+            print '===== {}'.format(region)
+            print_results(environment_results)
+        for region, error in sorted(results.failures.items()):
+            print '===== {}'.format(region)
+            print 'FAILED: ', error
+    else:
+        results = deploy_environment(args)
+        print_results(results)
+    if args.build_report:
+        timing.write_build_report(args.build_report, results)
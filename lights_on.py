@@ -5,6 +5,7 @@ import argparse
 import arguments
 import logconfig
 import session
+from scaffold import throttling
 from scaffold.cf import stack
 
 
@@ -19,7 +20,7 @@ def lights_on(args):
 
     outputs = stack.outputs(boto3_session, args.stack_name)
 
-    logical_asgs = outputs.keys(lambda k: k.endswith('ASG'))
+    logical_asgs = outputs.keys(stack.KeySelector.suffix('ASG'))
     if len(args.asg_names) > 0:
         logical_asgs = [asg for asg in logical_asgs if any((partial in asg for partial in args.asg_names))]
         asg_values = {k: asg_values[k] for k in asg_values if k in logical_asgs}
@@ -56,6 +57,7 @@ if __name__ == '__main__':
     logconfig.config()
     args = get_args()
     results = lights_on(args)
+    throttling.log_summary()
     # TODO: move these to logging messages
     for asg_name, values in results.iteritems():
         print 'ASG {} scaled to min: {}, max: {}'.format(asg_name, values['min'], values['max'])
@@ -5,6 +5,7 @@ import argparse
 import arguments
 import logconfig
 import session
+from scaffold import throttling
 from scaffold.cf import stack
 
 
@@ -16,7 +17,7 @@ def lights_out(args):
     boto3_session = session.new(args.profile, args.region, args.role)
 
     outputs = stack.outputs(boto3_session, args.stack_name)
-    logical_asgs = outputs.keys(lambda k: k.endswith('ASG'))
+    logical_asgs = outputs.keys(stack.KeySelector.suffix('ASG'))
     if len(args.asg_names) > 0:
         logical_asgs = [asg for asg in logical_asgs if any((partial in asg for partial in args.asg_names))]
 
@@ -54,6 +55,7 @@ if __name__ == '__main__':
     logconfig.config()
     args = get_args()
     results = lights_out(args)
+    throttling.log_summary()
     # TODO: move these to logging messages
     for asg in results:
         print 'ASG scaled to 0: {}'.format(asg)
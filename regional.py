@@ -0,0 +1,25 @@
+from scaffold.cf.stack.regions import fan_out, region_args
+
+
+def deploy(args, deploy_stack):
+    '''Call deploy_stack(args) for every region in args.regions concurrently, each with a copy of args for that region.
+
+    Returns OrchestrationResults keyed by region.
+    '''
+    return fan_out(args.regions, lambda region: deploy_stack(region_args(args, region)))
+
+
+def print_results(results):
+    # TODO: move these to logging messages
+    for region, stack_results in sorted(results.results.items()):
+        print '== {}'.format(region)
+        if stack_results.dry_run:
+            print stack_results.template
+        else:
+            print 'ID:     ', stack_results.stack.stack_id
+            print 'STATUS: ', stack_results.stack.stack_status
+            if stack_results.stack.stack_status_reason is not None:
+                print 'REASON: ', stack_results.stack.stack_status_reason
+    for region, error in sorted(results.failures.items()):
+        print '== {}'.format(region)
+        print 'FAILED: ', error
@@ -1,3 +1,5 @@
+# Name of the tarball of a config directory, under a build's key prefix. Templates extract it with cfn-init sources.
+CONFIG_BUNDLE_NAME = 'config.tar.gz'
 
 
 class AmiRegionMap(dict):
@@ -1,6 +1,20 @@
 #!/usr/bin/python
 
-from .elements import Outputs, Parameters, Summary
+import logging
+
+import botocore.exceptions
+
+from .elements import KeySelector, Outputs, Parameters, Summary
+from .cache import ExportsCache, OutputsCache, SummaryCache
+from .catalog import StackCatalog
+from .exports import ExportsIndex, export_name
+
+logger = logging.getLogger('laurel.cf.stack')
+
+# Shared by every builder and script in the process
+outputs_cache = OutputsCache()
+summary_cache = SummaryCache()
+exports_cache = ExportsCache()
 
 
 def new_parameters(parms_dict):
@@ -12,11 +26,30 @@ def parameters(boto3_session, stack_name):
 
 
 def outputs(boto3_session, stack_name):
-    return Outputs(_get_stack(boto3_session, stack_name))
+    return outputs_cache.get(boto3_session, stack_name)
+
+
+def exports(boto3_session):
+    '''Every export in the session's account and region.'''
+    return exports_cache.get(boto3_session)
+
+
+def exported_outputs(boto3_session, stack_name):
+    '''The stack's exported outputs, from the region's exports. A stack that exports nothing is described instead,
+    as is every stack when cloudformation:ListExports is not allowed.
+    '''
+    try:
+        exported = exports(boto3_session).outputs(stack_name)
+    except botocore.exceptions.ClientError as e:
+        if e.response['Error']['Code'] not in ('AccessDenied', 'AccessDeniedException'):
+            raise
+        logger.debug('ListExports is not allowed, describing %s instead', stack_name)
+        return outputs(boto3_session, stack_name)
+    return exported if len(exported) else outputs(boto3_session, stack_name)
 
 
 def summary(boto3_session, stack_name):
-    return Summary(boto3_session, stack_name)
+    return Summary(boto3_session, stack_name, summary_cache)
 
 
 def _get_stack(session, name):
@@ -1,17 +1,53 @@
+from collections import namedtuple
+import copy
+import gzip
+import hashlib
+import json
+import logging
 import os
+import tarfile
+import tempfile
 
-from .operation import StackOperation
+from boto3.s3.transfer import TransferConfig
+import botocore.exceptions
+from concurrent import futures
+
+from scaffold import sessions
+from . import exports_cache, outputs_cache, summary_cache
+from .operation import StackOperation, template_size_report
 from .elements import Summary
+from .timing import ApiCallCounter, PhaseTimer, monotonic
+
+logger = logging.getLogger('laurel.cf.builder')
 
 
 class StackResults(object):
     def __init__(self, dry_run):
         self.dry_run = dry_run
-        self.template = ''
+        self.template = ''  # indented for a dry run, which is printed; otherwise the compact JSON sent
+        self.template_source = None  # 'inline' (TemplateBody) or 's3' (TemplateURL)
+        self.template_size = None    # bytes
         self.before_create = None
         self.stack_parameters = None
         self.stack = None
+        self.changes = None  # planned resource changes of an update; empty if the update was a no-op
         self.after_create = None
+        self.timings = None         # {phase: seconds}; background phases overlap the others
+        self.elapsed = None         # seconds, start to finish
+        self.api_calls = None       # {'service.Operation': count}
+        self.bytes_uploaded = None  # bytes sent to S3, templates and configs alike
+
+    def to_dict(self):
+        '''Timing and size figures of the build, for dumping as JSON.'''
+        return {'dry_run': self.dry_run,
+                'template_source': self.template_source,
+                'template_size': self.template_size,
+                'timings': self.timings,
+                'total_seconds': sum(self.timings.values()) if self.timings else 0.0,
+                'elapsed_seconds': self.elapsed,
+                'api_calls': self.api_calls,
+                'api_call_count': sum(self.api_calls.values()) if self.api_calls else 0,
+                'bytes_uploaded': self.bytes_uploaded}
 
 
 class Dependencies(object):
@@ -22,24 +58,215 @@ class Parameters(object):
     pass
 
 
+class PreviousBuildParameters(object):
+    '''Build parameters of the stack's last build, read from its template summary when one is first asked for.
+
+    Builders only ask for the parameters the command line left out, so a fully specified update fetches nothing.
+    '''
+    def __init__(self, summary):
+        self._summary = summary
+
+    def __getattr__(self, name):
+        if name.startswith('_'):
+            raise AttributeError(name)
+        if name == 'description':
+            return self._summary.description()
+        try:
+            return self._summary.build_parameters()[name]
+        except KeyError:
+            raise AttributeError(name)
+
+
+# Result of uploading one config file. action is 'uploaded', 'copied' (server-side, from the previous
+# upload of the same content) or 'unchanged'. error is None if the upload succeeded.
+UploadResult = namedtuple('UploadResult', ['path', 'key', 'size', 'seconds', 'action', 'error'])
+
+
+def _file_digest(file_path, digest):
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def file_sha256(file_path):
+    return _file_digest(file_path, hashlib.sha256())
+
+
+def file_md5(file_path):
+    return _file_digest(file_path, hashlib.md5())
+
+
+def _config_files(base_dir, exclude):
+    '''(path, path relative to base_dir) of every file under base_dir not ending in exclude, in path order.'''
+    files = []
+    for dir_name, dir_list, file_list in os.walk(base_dir):
+        for file_name in file_list:
+            if not file_name.endswith(tuple(exclude)):
+                file_path = os.path.join(dir_name, file_name)
+                files.append((file_path, os.path.relpath(file_path, base_dir).replace(os.sep, '/')))
+    return sorted(files)
+
+
+def content_hash(base_dirs, exclude=('.pyc',)):
+    '''Short SHA-256 of the names and contents of the files under base_dirs, skipping names ending in exclude.'''
+    digest = hashlib.sha256()
+    for base_dir in base_dirs:
+        for file_path, name in _config_files(base_dir, exclude):
+            digest.update('{}\0{}\0'.format(name, file_sha256(file_path)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+def content_key_prefix(key_prefix, name, base_dirs):
+    '''Key prefix for a build's uploads, named by their content: the same files always go to the same keys.'''
+    return '{}/{}-{}'.format(key_prefix, name, content_hash(base_dirs))
+
+
+def pack_config(base_dir, fileobj, exclude=('.pyc',)):
+    '''Write the files under base_dir to fileobj as a gzipped tarball, skipping names ending in exclude.
+
+    The same files always pack to the same bytes: entries are sorted and carry no timestamps or owners.
+    '''
+    gz = gzip.GzipFile(filename='', mode='wb', fileobj=fileobj, mtime=0)
+    try:
+        tar = tarfile.open(fileobj=gz, mode='w', format=tarfile.GNU_FORMAT)
+        for path, name in _config_files(base_dir, exclude):
+            info = tar.gettarinfo(path, arcname=name)
+            info.mtime = 0
+            info.uid = info.gid = 0
+            info.uname = info.gname = ''
+            info.mode = 0o755 if info.mode & 0o111 else 0o644
+            with open(path, 'rb') as f:
+                tar.addfile(info, f)
+        tar.close()
+    finally:
+        gz.close()
+
+
+def _read_manifest(s3_client, bucket_name, manifest_key):
+    try:
+        body = s3_client.get_object(Bucket=bucket_name, Key=manifest_key)['Body'].read()
+    except botocore.exceptions.ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchKey'):
+            return None
+        raise
+    return json.loads(body.decode('utf-8'))
+
+
 class ConfigUploader(object):
+    '''Uploads a directory tree to S3, several files at a time.
+
+    Files are streamed from disk in binary mode; files larger than multipart_threshold bytes are
+    sent as managed multipart uploads.
+
+    Given a manifest key, only changed files are uploaded. The manifest records the SHA-256 of every file
+    and the prefix they were uploaded to; files whose content has not changed since are copied server-side
+    from that prefix, or left alone if the prefix is the same.
 
-    def __init__(self, boto3_session, bucket_name):
+    upload_bundle sends the tree as one tarball instead, so a deploy uploads and an instance fetches one object.
+    The builders use upload_bundle; upload_to_s3 is kept for callers that need the files as separate objects.
+    '''
+    def __init__(self, boto3_session, bucket_name, max_workers=8, multipart_threshold=8 * 1024 * 1024):
         self._session = boto3_session
         self._bucket_name = bucket_name
+        self._max_workers = max_workers
+        self._transfer_config = TransferConfig(multipart_threshold=multipart_threshold)
 
-    def upload_to_s3(self, base_dir, key_prefix, mapping={}):
-        s3 = self._session.resource('s3')
-        bucket = s3.Bucket(self._bucket_name)
+    def upload_to_s3(self, base_dir, key_prefix, mapping={}, manifest_key=None):
+        '''Upload every file under base_dir. Returns an UploadResult per file, in path order.
+
+        Raises the first failure once all uploads have finished. The manifest is only written if all succeed.
+        '''
+        files = []
         for dir_name, dir_list, file_list in os.walk(base_dir):
             for file_name in file_list:
                 file_path = os.path.join(dir_name, file_name)
                 target_path = os.path.relpath(file_path, base_dir)
                 target_path = mapping.get(target_path, target_path)
-                key_path = '/'.join((key_prefix, target_path))
-                with open(file_path, 'r') as f:
-                    bucket.put_object(Key=key_path,
-                                      Body=f.read())
+                files.append((file_path, target_path))
+        files.sort()
+
+        s3_client = self._session.client('s3')  # clients, unlike sessions, can be shared between threads
+        hashes = {}
+        previous = None
+        if manifest_key is not None:
+            hashes = {target_path: file_sha256(file_path) for file_path, target_path in files}
+            previous = _read_manifest(s3_client, self._bucket_name, manifest_key)
+
+        def sync(f):
+            return self._sync(s3_client, f[0], key_prefix, f[1], hashes.get(f[1]), previous)
+
+        with futures.ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            results = list(executor.map(sync, files))
+
+        failures = [r for r in results if r.error is not None]
+        for failure in failures:
+            logger.error('uploading %s to %s failed: %s', failure.path, failure.key, failure.error)
+        if failures:
+            raise failures[0].error
+
+        if manifest_key is not None:
+            manifest = {'prefix': key_prefix, 'files': hashes}
+            s3_client.put_object(Bucket=self._bucket_name, Key=manifest_key,
+                                 Body=json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8'))
+        return results
+
+    def upload_bundle(self, base_dir, key):
+        '''Upload base_dir as one gzipped tarball (see pack_config). Returns its UploadResult.
+
+        The upload is skipped if key already holds the same bytes.
+        '''
+        s3_client = self._session.client('s3')
+        start = monotonic()
+        with tempfile.NamedTemporaryFile(suffix='.tar.gz') as bundle:
+            pack_config(base_dir, bundle)
+            bundle.flush()
+            size = os.path.getsize(bundle.name)
+            action = 'uploaded'
+            if self._etag(s3_client, key) == file_md5(bundle.name):
+                action = 'unchanged'
+            else:
+                s3_client.upload_file(bundle.name, self._bucket_name, key, Config=self._transfer_config)
+        logger.debug('%s %s to %s (%d bytes)', action, base_dir, key, size)
+        return UploadResult(base_dir, key, size, monotonic() - start, action, None)
+
+    def _etag(self, s3_client, key):
+        try:
+            etag = s3_client.head_object(Bucket=self._bucket_name, Key=key)['ETag']
+        except botocore.exceptions.ClientError as e:
+            # without s3:ListBucket, S3 answers HEAD on a missing key with 403
+            if e.response['Error']['Code'] not in ('403', '404', 'NoSuchKey'):
+                raise
+            return None
+        return etag.strip('"')  # the MD5 of the content, for objects not uploaded in parts
+
+    def _sync(self, s3_client, file_path, key_prefix, target_path, sha256, previous):
+        key = '/'.join((key_prefix, target_path))
+        start = monotonic()
+        action = 'uploaded'
+        try:
+            if previous is not None and sha256 is not None and previous['files'].get(target_path) == sha256:
+                if previous['prefix'] == key_prefix:
+                    action = 'unchanged'
+                else:
+                    action = self._copy(s3_client, '/'.join((previous['prefix'], target_path)), key)
+            if action == 'uploaded':
+                s3_client.upload_file(file_path, self._bucket_name, key, Config=self._transfer_config)
+        except Exception as e:
+            return UploadResult(file_path, key, os.path.getsize(file_path), monotonic() - start, action, e)
+        logger.debug('%s %s to %s', action, file_path, key)
+        return UploadResult(file_path, key, os.path.getsize(file_path), monotonic() - start, action, None)
+
+    def _copy(self, s3_client, source_key, key):
+        try:
+            s3_client.copy_object(Bucket=self._bucket_name, Key=key,
+                                  CopySource={'Bucket': self._bucket_name, 'Key': source_key})
+        except botocore.exceptions.ClientError as e:
+            if e.response['Error']['Code'] not in ('404', 'NoSuchKey'):
+                raise
+            logger.debug('%s is gone, uploading instead', source_key)
+            return 'uploaded'
+        return 'copied'
 
 
 # TODO: use the new abstract method pattern with abc
@@ -50,60 +277,109 @@ class StackBuilder(object):
         self._is_update = is_update
 
     def build(self, dry_run=False):
+        '''Build the stack. Uploads (do_before_create) run in the background while the template is made.'''
+        timer = PhaseTimer()
+        api_calls = ApiCallCounter().install(self.session)
+        results = StackResults(dry_run)
+        start = monotonic()
+        try:
+            with futures.ThreadPoolExecutor(max_workers=2) as executor:
+                # clone the session here, on the thread that owns self.session, not on the pool thread
+                def submit(*args):
+                    return executor.submit(self._in_background, self.thread_session(), api_calls, timer, *args)
+                self._build(dry_run, results, timer, submit)
+        finally:
+            api_calls.uninstall()
+            results.elapsed = monotonic() - start
+            results.timings = timer.phases
+            results.api_calls = dict(api_calls.calls)  # calls made after the build are not its cost
+            results.bytes_uploaded = api_calls.bytes_uploaded
+        return results
+
+    def _in_background(self, session, api_calls, timer, method_name, *args):
+        # boto3 sessions must not be shared between threads: run the method on a copy of this builder
+        # that has a session of its own.
+        worker = copy.copy(self)
+        worker.session = session
+        api_calls.install(session)
+        with timer.phase(method_name):
+            return getattr(worker, method_name)(*args)
+
+    def _build(self, dry_run, results, timer, submit):
         s3_key_prefix = self.create_s3_key_prefix()
 
         dependencies = Dependencies()
         dependencies.s3_key_prefix = s3_key_prefix
-        self.get_dependencies(dependencies)
-
-        build_parm_names = self.get_build_parameter_names()
-        prev_build_parms = self.get_previous_build_parms(build_parm_names)
-
-        template = self.create_template(dependencies, prev_build_parms)
-        template.build_template()
-        template_json = template.to_json()
-
-        results = StackResults(dry_run)
-        results.template = template_json
-        results.before_create = self.do_before_create(dependencies, dry_run)
+        with timer.phase('get_dependencies'):
+            self.get_dependencies(dependencies)
+
+        # dependencies must not change from here on: the background phases share them
+        before_create = submit('do_before_create', dependencies, dry_run)
+        with timer.phase('get_previous_build_parms'):
+            prev_build_parms = self.get_previous_build_parms(self.get_build_parameter_names())
+        with timer.phase('create_template'):
+            template = self.create_template(dependencies, prev_build_parms)
+        with timer.phase('build_template'):
+            template.build_template()
+        with timer.phase('to_json'):
+            template_json = template.to_json(compact=True)
+        results.template = template.to_json() if dry_run else template_json
 
         stack_parms = self.get_stack_parameters()
         results.stack_parameters = stack_parms
 
         capabilities = self.get_capabilities()
 
-        if dry_run:
-            return results
-
         operator = StackOperation(self.session,
                                   self.stack_name,
                                   template_json,
                                   capabilities,
                                   self.get_s3_bucket(),
-                                  s3_key_prefix)
+                                  self.get_template_key_prefix())
+        results.template_source = operator.template_source
+        results.template_size = operator.template_size
+        logger.info('%s - template is %s', self.stack_name, template_size_report(operator.template_size))
+
+        if not dry_run:
+            with timer.phase('upload'):
+                if operator.template_source == 's3':
+                    operator.template_url()
+        with timer.phase('wait_before_create'):
+            results.before_create = before_create.result()
+        if dry_run:
+            return
+
         if self.is_update():
-            results.stack = operator.update(stack_parms)
+            with timer.phase('update'):
+                results.stack = operator.update(stack_parms)
+            results.changes = operator.changes
         else:
-            results.stack = operator.create(stack_parms)
-        results.after_create = self.do_after_create(results.stack)
-        return results
+            with timer.phase('create'):
+                results.stack = operator.create(stack_parms)
+        # stacks built after this one must see its new outputs
+        outputs_cache.invalidate(self.get_region(), self.stack_name)
+        summary_cache.invalidate(self.get_region(), self.stack_name)
+        exports_cache.invalidate(self.get_region())
+        with timer.phase('do_after_create'):
+            results.after_create = self.do_after_create(results.stack)
 
     def get_previous_build_parms(self, names):
-        p = Parameters()
         if self.is_update():
-            summary = Summary(self.session, self.stack_name)
-            p.description = summary.description()
-            for name, value in summary.build_parameters().items():
-                setattr(p, name, value)
-        else:
-            p.description = None
-            for n in names:
-                setattr(p, n, None)
+            # the template summary is only fetched if the builder asks for a parameter
+            return PreviousBuildParameters(Summary(self.session, self.stack_name, summary_cache))
+        p = Parameters()
+        p.description = None
+        for n in names:
+            setattr(p, n, None)
         return p
 
     def is_update(self):
         return self._is_update
 
+    def thread_session(self):
+        '''A new session with the same credentials and region, for build work on another thread.'''
+        return sessions.clone(self.session)
+
     def get_region(self):
         return self.session.region_name
 
@@ -111,14 +387,24 @@ class StackBuilder(object):
         raise NotImplementedError('Must implement get_s3_bucket()')
 
     def create_s3_key_prefix(self):
+        '''Key prefix for the build's uploads. Derive it from their content (see content_key_prefix), not the time;
+        a builder that uploads nothing can return a constant.'''
         raise NotImplementedError('Must implement create_s3_key_prefix()')
 
+    def get_template_key_prefix(self):
+        '''Key prefix for uploaded templates. Templates are named by content hash, so this prefix is not per-build.'''
+        return 'templates'
+
     def create_template(self, dependencies):
         raise NotImplementedError('Must implement create_template')
 
     def get_build_parameter_names(self):
         return []
 
+    def get_dependency_stack_names(self):
+        '''Names of the stacks that must exist before this stack can be built.'''
+        return []
+
     def get_dependencies(self, dependencies):
         pass
 
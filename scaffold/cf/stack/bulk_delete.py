@@ -0,0 +1,147 @@
+import fnmatch
+import json
+import logging
+
+import botocore.exceptions
+
+from .catalog import StackCatalog
+from .operation import StackDeleter, _logging_cb
+from .orchestrator import OrchestrationResults, deployment_layers
+from .poller import StackPoller
+
+logger = logging.getLogger('laurel.cf.bulk_delete')
+
+APPLICATION_TAG = 'Application'
+
+
+def select_stacks(boto3_session, pattern=None, tag_value=None, tag_key=APPLICATION_TAG):
+    '''Return the described stacks matching the name pattern and tag, from one StackCatalog.'''
+    def selected(stack):
+        if pattern is not None and not fnmatch.fnmatchcase(stack['StackName'], pattern):
+            return False
+        return tag_value is None or {t['Key']: t['Value'] for t in stack.get('Tags', [])}.get(tag_key) == tag_value
+    catalog = StackCatalog(boto3_session, selected)
+    return [catalog.describe(name) for name in catalog]
+
+
+def _string_values(obj):
+    if isinstance(obj, dict):
+        for v in obj.values():
+            for s in _string_values(v):
+                yield s
+    elif isinstance(obj, list):
+        for v in obj:
+            for s in _string_values(v):
+                yield s
+    elif isinstance(obj, basestring):
+        yield obj
+
+
+def _importing_stacks(cf_client, export_name):
+    names = []
+    kwargs = {'ExportName': export_name}
+    try:
+        while True:
+            response = cf_client.list_imports(**kwargs)
+            names.extend(response['Imports'])
+            if 'NextToken' not in response:
+                return names
+            kwargs['NextToken'] = response['NextToken']
+    except botocore.exceptions.ClientError as e:
+        if 'is not imported' in e.response['Error'].get('Message', ''):
+            return names
+        raise
+
+
+def _template_body(cf_client, stack):
+    body = cf_client.get_template(StackName=stack['StackId'])['TemplateBody']
+    if not isinstance(body, dict):
+        try:
+            body = json.loads(body)
+        except ValueError:
+            pass
+    return body
+
+
+def stack_dependency_graph(cf_client, stacks):
+    '''Return {stack_name: set(names of the given stacks it depends on)}.
+
+    A stack depends on another if it imports one of the other's exports, or if an output value the other stack
+    owns appears verbatim in its parameters or template (builders bake upstream outputs into templates). The
+    second rule is a heuristic: an output value that also appears in its own stack's template or parameters -
+    a constant, or a value passed through from upstream - is not owned, so it links nothing. Stacks that output
+    the same generated value can still be linked wrongly; a resulting cycle makes deployment_layers raise.
+    '''
+    referenced = {}
+    for stack in stacks:
+        values = set(_string_values(_template_body(cf_client, stack)))
+        values.update(p.get('ParameterValue') for p in stack.get('Parameters', []))
+        referenced[stack['StackName']] = values
+    owned = {s['StackName']: set(o['OutputValue'] for o in s.get('Outputs', [])) - referenced[s['StackName']]
+             for s in stacks}
+    graph = {s['StackName']: set() for s in stacks}
+
+    for name, values in referenced.items():
+        for other, outputs in owned.items():
+            if other != name and outputs & values:
+                graph[name].add(other)
+
+    for stack in stacks:
+        for output in stack.get('Outputs', []):
+            if 'ExportName' not in output:
+                continue
+            for importer in _importing_stacks(cf_client, output['ExportName']):
+                if importer in graph and importer != stack['StackName']:
+                    graph[importer].add(stack['StackName'])
+    return graph
+
+
+class BulkStackDeleter(object):
+    '''Deletes a group of stacks, dependents first. Stacks that do not depend on each other are deleted concurrently.'''
+    def __init__(self, boto3_session, pattern=None, tag_value=None, tag_key=APPLICATION_TAG, max_workers=4):
+        if pattern is None and tag_value is None:
+            raise ValueError('Select the stacks to delete by name pattern, tag, or both')
+        self._session = boto3_session
+        self._pattern = pattern
+        self._tag_value = tag_value
+        self._tag_key = tag_key
+        self._max_workers = max_workers
+        self._stack_ids = {}
+
+    def plan(self):
+        '''Return the selected stack names as layers, in deletion order.'''
+        stacks = select_stacks(self._session, self._pattern, self._tag_value, self._tag_key)
+        self._stack_ids = {s['StackName']: s['StackId'] for s in stacks}
+        graph = stack_dependency_graph(self._session.client('cloudformation'), stacks)
+        return list(reversed(deployment_layers(graph)))
+
+    def delete(self, layers=None, progress_callback=_logging_cb, poller=None):
+        '''Delete the stacks layer by layer. Stops after the first layer in which a stack fails to delete.'''
+        if layers is None:
+            layers = self.plan()
+        if poller is None:
+            with StackPoller(self._max_workers) as poller:
+                return self.delete(layers, progress_callback, poller)
+
+        results = OrchestrationResults()
+        for index, layer in enumerate(layers):
+            logger.info('deleting stacks %s', layer)
+            # delete by ID: the stacks are monitored by ID and must not be confused with new stacks of the same name
+            pending = {name: StackDeleter(self._session, self._stack_ids.get(name, name))
+                       .delete_async(poller, progress_callback)
+                       for name in layer}
+            for name, future in sorted(pending.items()):
+                try:
+                    status = future.result()['ResourceStatus']
+                except Exception as e:
+                    logger.exception('deleting stack %s failed', name)
+                    results.failures[name] = e
+                    continue
+                if status == 'DELETE_COMPLETE':
+                    results.results[name] = status
+                else:
+                    results.failures[name] = status
+            if results.failures:
+                results.skipped = sorted(name for later in layers[index + 1:] for name in later)
+                break
+        return results
@@ -0,0 +1,260 @@
+import errno
+import glob
+import json
+import logging
+import os
+import threading
+import time
+
+from .elements import Outputs
+from .exports import ExportsIndex
+
+logger = logging.getLogger('laurel.cf.cache')
+
+# Directory for laurel's on-disk caches. Unset: nothing is cached on disk.
+CACHE_DIR_VARIABLE = 'LAUREL_CACHE_DIR'
+
+
+def cache_dir():
+    return os.environ.get(CACHE_DIR_VARIABLE) or None
+
+
+# Every status but DELETE_COMPLETE: ListStacks would otherwise return 90 days of deleted stacks
+LIVE_STACK_STATUSES = ['CREATE_IN_PROGRESS', 'CREATE_FAILED', 'CREATE_COMPLETE', 'ROLLBACK_IN_PROGRESS',
+                       'ROLLBACK_FAILED', 'ROLLBACK_COMPLETE', 'DELETE_IN_PROGRESS', 'DELETE_FAILED',
+                       'UPDATE_IN_PROGRESS', 'UPDATE_COMPLETE_CLEANUP_IN_PROGRESS', 'UPDATE_COMPLETE',
+                       'UPDATE_ROLLBACK_IN_PROGRESS', 'UPDATE_ROLLBACK_FAILED',
+                       'UPDATE_ROLLBACK_COMPLETE_CLEANUP_IN_PROGRESS', 'UPDATE_ROLLBACK_COMPLETE',
+                       'REVIEW_IN_PROGRESS']
+
+
+_accounts = {}  # access key -> account, shared by every cache
+_accounts_lock = threading.Lock()
+
+
+def _account(boto3_session):
+    access_key = boto3_session.get_credentials().access_key
+    with _accounts_lock:
+        account = _accounts.get(access_key)
+    if account is None:
+        account = boto3_session.client('sts').get_caller_identity()['Account']
+        with _accounts_lock:
+            _accounts[access_key] = account
+    return account
+
+
+def _version(stack):
+    '''When a stack (as described or listed) last changed; its outputs can only change when this does.
+
+    None while the stack is changing: LastUpdatedTime is set when an update starts, not when it ends.
+    '''
+    if stack['StackStatus'].endswith('_IN_PROGRESS'):
+        return None
+    changed = stack.get('LastUpdatedTime') or stack.get('CreationTime')
+    return changed.isoformat() if hasattr(changed, 'isoformat') else changed
+
+
+def _write_json(path, obj):
+    try:
+        os.makedirs(os.path.dirname(path))
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    temp_path = '{}.{}.tmp'.format(path, os.getpid())
+    with open(temp_path, 'w') as f:
+        json.dump(obj, f)
+    os.rename(temp_path, path)  # readers never see a partly written file
+
+
+def _read_json(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+class _StackCache(object):
+    '''Per-stack cache entries keyed by (account, region, stack name).
+
+    A stack's version is its LastUpdatedTime, listed for every stack in a region with one paginated ListStacks
+    that is reused for ttl seconds.
+    '''
+    def __init__(self, ttl=300, directory=cache_dir, clock=time.time):
+        self.ttl = ttl
+        self._directory = directory
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._entries = {}
+        self._versions = {}  # (account, region) -> (expires, {name: version}) from ListStacks
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._versions.clear()
+        with _accounts_lock:
+            _accounts.clear()
+
+    def _key(self, boto3_session, stack_name):
+        return (_account(boto3_session), boto3_session.region_name, stack_name)
+
+    def _listed_version(self, boto3_session, key):
+        region_key = key[:2]
+        now = self._clock()
+        with self._lock:
+            listed = self._versions.get(region_key)
+        if listed is None or listed[0] <= now:
+            versions = {}
+            paginator = boto3_session.client('cloudformation').get_paginator('list_stacks')
+            for page in paginator.paginate(StackStatusFilter=LIVE_STACK_STATUSES):
+                for summary in page['StackSummaries']:
+                    versions[summary['StackName']] = _version(summary)
+            listed = (now + self.ttl, versions)
+            with self._lock:
+                self._versions[region_key] = listed
+        return listed[1].get(key[2])
+
+
+class OutputsCache(_StackCache):
+    '''Stack outputs, cached per (account, region, stack name) for ttl seconds.
+
+    With a cache directory, outputs also outlive the process. An on-disk entry is used only while the stack's
+    LastUpdatedTime still matches, which is checked for every stack in a region with one paginated ListStacks.
+    '''
+    # _entries: (account, region, name) -> (expires, Outputs)
+
+    def get(self, boto3_session, stack_name):
+        '''Outputs of the stack, from the cache if possible.'''
+        key = self._key(boto3_session, stack_name)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        outputs = Outputs(outputs=self._load(boto3_session, key))  # indexed once, shared by every caller
+        with self._lock:
+            self._entries[key] = (now + self.ttl, outputs)
+        return outputs
+
+    def prime(self, boto3_session, catalog):
+        '''Cache the outputs of every stack in a StackCatalog, so builders need not describe them again.'''
+        account = _account(boto3_session)
+        expires = self._clock() + self.ttl
+        with self._lock:
+            for name in catalog.names():
+                self._entries[(account, boto3_session.region_name, name)] = (expires, catalog.outputs(name))
+
+    def invalidate(self, region, stack_name):
+        '''Forget the stack in every account, e.g. after creating or updating it.'''
+        with self._lock:
+            for key in [k for k in self._entries if k[1:] == (region, stack_name)]:
+                del self._entries[key]
+            for (account, version_region), (expires, versions) in self._versions.items():
+                if version_region == region:
+                    versions.pop(stack_name, None)
+        directory = self._directory()
+        if directory is not None:
+            for path in glob.glob(os.path.join(directory, 'outputs', '*', region, stack_name + '.json')):
+                os.remove(path)
+
+    def _load(self, boto3_session, key):
+        directory = self._directory()
+        if directory is None:
+            return self._describe(boto3_session, key[2])[0]
+
+        path = os.path.join(directory, 'outputs', *key) + '.json'
+        cached = _read_json(path)
+        if cached is not None and cached['version'] == self._listed_version(boto3_session, key):
+            logger.debug('outputs of %s from %s', key[2], path)
+            return cached['outputs']
+
+        outputs, version = self._describe(boto3_session, key[2])
+        if version is not None:  # outputs of a stack that is changing are not kept on disk
+            _write_json(path, {'version': version, 'outputs': outputs})
+        return outputs
+
+    def _describe(self, boto3_session, stack_name):
+        stack = boto3_session.client('cloudformation').describe_stacks(StackName=stack_name)['Stacks'][0]
+        return stack.get('Outputs', []), _version(stack)
+
+
+class SummaryCache(_StackCache):
+    '''Template summaries (GetTemplateSummary), cached per (account, region, stack name).
+
+    Without a cache directory, summaries are kept for the process until invalidate(). With one, they also
+    outlive the process: an entry is used for as long as the stack's LastUpdatedTime is unchanged, so repeated
+    updates and dry runs of a stack cost one ListStacks for the whole region.
+    '''
+    # _entries: (account or access key, region, name) -> (version, template summary)
+
+    def get(self, boto3_session, stack_name):
+        '''GetTemplateSummary of the stack, from the cache if the stack has not changed since.'''
+        if self._directory() is None:
+            key = (boto3_session.get_credentials().access_key, boto3_session.region_name, stack_name)
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                entry = (None, self._template_summary(boto3_session, stack_name))
+                with self._lock:
+                    self._entries[key] = entry
+            return entry[1]
+
+        key = self._key(boto3_session, stack_name)
+        version = self._listed_version(boto3_session, key)
+        if version is None:  # not listed (yet) or changing: nothing to check an entry against
+            return self._template_summary(boto3_session, stack_name)
+
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] == version:
+            return entry[1]
+
+        path = os.path.join(self._directory(), 'summaries', *key) + '.json'
+        cached = _read_json(path)
+        if cached is not None and cached['version'] == version:
+            logger.debug('template summary of %s from %s', stack_name, path)
+            summary = cached['summary']
+        else:
+            summary = self._template_summary(boto3_session, stack_name)
+            _write_json(path, {'version': version, 'summary': summary})
+        with self._lock:
+            self._entries[key] = (version, summary)
+        return summary
+
+    def invalidate(self, region, stack_name):
+        '''Forget the stack in every account. The region's stacks are listed again to learn its new version.'''
+        with self._lock:
+            for key in [k for k in self._entries if k[1:] == (region, stack_name)]:
+                del self._entries[key]
+            for region_key in [k for k in self._versions if k[1] == region]:
+                del self._versions[region_key]
+
+    def _template_summary(self, boto3_session, stack_name):
+        summary = boto3_session.client('cloudformation').get_template_summary(StackName=stack_name)
+        summary.pop('ResponseMetadata', None)
+        return summary
+
+
+class ExportsCache(_StackCache):
+    '''An ExportsIndex per (account, region), reused for ttl seconds.'''
+    # _entries: (account, region) -> (expires, ExportsIndex)
+
+    def get(self, boto3_session):
+        key = (_account(boto3_session), boto3_session.region_name)
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        index = ExportsIndex(boto3_session)
+        with self._lock:
+            self._entries[key] = (now + self.ttl, index)
+        return index
+
+    def invalidate(self, region):
+        '''Forget the region's exports in every account, e.g. after a stack there was created or updated.'''
+        with self._lock:
+            for key in [k for k in self._entries if k[1] == region]:
+                del self._entries[key]
@@ -0,0 +1,65 @@
+import fnmatch
+
+from .elements import Outputs, Parameters
+
+
+class StackCatalog(object):
+    '''Every stack in a region, fetched with one paginated DescribeStacks and indexed by name and by ID.
+
+    stack_filter narrows the catalog: a name pattern ('web-*') or a function of the described stack dict.
+    parameters(), outputs(), tags() and status() make no further API calls; refresh() describes again.
+    '''
+    def __init__(self, boto3_session, stack_filter=None):
+        self._session = boto3_session
+        if isinstance(stack_filter, basestring):
+            pattern = stack_filter
+            stack_filter = lambda s: fnmatch.fnmatchcase(s['StackName'], pattern)
+        self._filter = stack_filter
+        self.refresh()
+
+    def refresh(self):
+        self._by_name = {}
+        self._by_id = {}
+        self._outputs = {}
+        paginator = self._session.client('cloudformation').get_paginator('describe_stacks')
+        for page in paginator.paginate():
+            for stack in page['Stacks']:
+                if self._filter is not None and not self._filter(stack):
+                    continue
+                self._by_name[stack['StackName']] = stack
+                self._by_id[stack['StackId']] = stack
+
+    def names(self):
+        return sorted(self._by_name)
+
+    def describe(self, name_or_id):
+        '''The stack as DescribeStacks returned it. Raises KeyError for a stack not in the catalog.'''
+        stack = self._by_name.get(name_or_id) or self._by_id.get(name_or_id)
+        if stack is None:
+            raise KeyError(name_or_id)
+        return stack
+
+    def parameters(self, name_or_id):
+        stack = self.describe(name_or_id)
+        return Parameters(parms={p['ParameterKey']: p['ParameterValue'] for p in stack.get('Parameters', [])})
+
+    def outputs(self, name_or_id):
+        stack = self.describe(name_or_id)
+        if stack['StackId'] not in self._outputs:  # indexed once, shared by every caller
+            self._outputs[stack['StackId']] = Outputs(outputs=stack.get('Outputs', []))
+        return self._outputs[stack['StackId']]
+
+    def tags(self, name_or_id):
+        return {t['Key']: t['Value'] for t in self.describe(name_or_id).get('Tags', [])}
+
+    def status(self, name_or_id):
+        return self.describe(name_or_id)['StackStatus']
+
+    def __contains__(self, name_or_id):
+        return name_or_id in self._by_name or name_or_id in self._by_id
+
+    def __iter__(self):
+        return iter(self.names())
+
+    def __len__(self):
+        return len(self._by_name)
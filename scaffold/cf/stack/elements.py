@@ -1,7 +1,11 @@
 #!/usr/bin/python
 
+import bisect
 import collections
+import fnmatch
+import itertools
 import json
+import re
 
 from scaffold.doby import Doby
 
@@ -41,46 +45,115 @@ class Parameters(collections.MutableMapping):
         return iter(self._parms)
 
 
-class Outputs(collections.Mapping):
-    def __init__(self, boto3_stack):
-        self._outputs = boto3_stack.outputs
+class KeySelector(object):
+    '''A precompiled output key filter. Outputs returns the keys a selector picks in sorted order.
+
+    Selectors are plain callables too, so they work anywhere a key_filter function does.
+    '''
+    def __init__(self, match, literal_prefix=''):
+        self._match = match
+        # every selected key starts with literal_prefix; Outputs finds those keys by bisection
+        self.literal_prefix = literal_prefix
+
+    def __call__(self, key):
+        return self._match(key)
+
+    @classmethod
+    def glob(cls, pattern):
+        literal = re.split(r'[*?[]', pattern, 1)[0]
+        return cls(re.compile(fnmatch.translate(pattern)).match, literal)
+
+    @classmethod
+    def prefix(cls, prefix):
+        return cls(lambda k: k.startswith(prefix), prefix)
+
+    @classmethod
+    def suffix(cls, suffix):
+        return cls(lambda k: k.endswith(suffix))
+
+    @classmethod
+    def regex(cls, pattern):
+        '''Keys containing a match for pattern (re.search).'''
+        compiled = re.compile(pattern)
+        return cls(lambda k: compiled.search(k) is not None)
 
-    def keys(self, key_filter=lambda x: True):
-        return [o['OutputKey'] for o in self._outputs if key_filter(o['OutputKey'])]
 
-    def values(self, key_filter=lambda x: True):
-        return [o['OutputValue'] for o in self._outputs if key_filter(o['OutputKey'])]
+class Outputs(collections.Mapping):
+    '''Stack outputs, indexed by key.
+
+    key_filter arguments are KeySelectors, which select keys in sorted order, or functions of the key,
+    which select keys in the stack's output order.
+    '''
+    def __init__(self, boto3_stack=None, outputs=None):
+        if boto3_stack is not None:
+            outputs = boto3_stack.outputs
+        self._outputs = outputs or []
+        self._index = {o['OutputKey']: o['OutputValue'] for o in self._outputs}
+        self._sorted_keys = sorted(self._index)
+
+    def select(self, key_filter):
+        '''Generate the keys key_filter picks.'''
+        if not isinstance(key_filter, KeySelector):
+            return (o['OutputKey'] for o in self._outputs if key_filter(o['OutputKey']))
+        keys = self._sorted_keys
+        prefix = key_filter.literal_prefix
+        start = bisect.bisect_left(keys, prefix)
+        candidates = itertools.takewhile(lambda k: k.startswith(prefix), itertools.islice(keys, start, None))
+        return (k for k in candidates if key_filter(k))
+
+    def keys(self, key_filter=None):
+        if key_filter is None:
+            return [o['OutputKey'] for o in self._outputs]
+        return list(self.select(key_filter))
+
+    def values(self, key_filter=None):
+        return [self._index[k] for k in self.keys(key_filter)]
 
     def first(self, key_filter):
-        return next((o['OutputValue'] for o in self._outputs if key_filter(o['OutputKey'])), None)
+        key = next(self.select(key_filter), None)
+        return None if key is None else self._index[key]
 
     def __len__(self):
         return len(self._outputs)
 
     def __getitem__(self, key):
-        value = self.first(lambda k: k == key)
-        if value is None:
-            raise KeyError(key)
-        return value
+        return self._index[key]
+
+    def __contains__(self, key):
+        return key in self._index
 
     def __iter__(self):
         return (o['OutputKey'] for o in self._outputs)
 
 
 class Summary(object):
-    def __init__(self, boto3_session, stack_name):
+    '''The stack's description and build parameters, from its template summary.
+
+    Nothing is fetched until they are first asked for. With a cache (a SummaryCache), the template summary
+    comes from the cache.
+    '''
+    def __init__(self, boto3_session, stack_name, cache=None):
         self._session = boto3_session
         self._stack_name = stack_name
-        self._load_template()
+        self._cache = cache
+        self._loaded = False
 
     def _load_template(self):
-        self._template = self._session.client('cloudformation').get_template_summary(StackName=self._stack_name)
+        if self._loaded:
+            return
+        if self._cache is None:
+            self._template = self._session.client('cloudformation').get_template_summary(StackName=self._stack_name)
+        else:
+            self._template = self._cache.get(self._session, self._stack_name)
         template_d = Doby(self._template)
         self._description = template_d.Description
         self._build_parameters = Doby(json.loads(template_d.Metadata)).BuildParameters
+        self._loaded = True
 
     def description(self):
+        self._load_template()
         return self._description
 
     def build_parameters(self):
+        self._load_template()
         return self._build_parameters
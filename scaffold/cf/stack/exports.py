@@ -0,0 +1,59 @@
+from .elements import Outputs
+
+
+def export_name(stack_name, key):
+    '''Name of the export of a stack's output, as TemplateBuilder(export_outputs=True) names it.'''
+    return '{}-{}'.format(stack_name, key)
+
+
+def _stack_name(stack_id):
+    # arn:aws:cloudformation:<region>:<account>:stack/<name>/<id>
+    return stack_id.split(':', 5)[-1].split('/')[1]
+
+
+class ExportsIndex(object):
+    '''Every export in a region, loaded with one paginated ListExports and resolved from memory.
+
+    Exports are indexed by export name and by (exporting stack, output key). The output key is the export name
+    without the '<stack name>-' prefix given by export_name(); exports named otherwise are only found by name.
+    '''
+    def __init__(self, boto3_session):
+        self._by_name = {}   # export name -> value
+        self._by_stack = {}  # stack name -> {output key: value}
+        self._outputs = {}   # stack name -> Outputs
+        paginator = boto3_session.client('cloudformation').get_paginator('list_exports')
+        for page in paginator.paginate():
+            for export in page['Exports']:
+                self._by_name[export['Name']] = export['Value']
+                stack_name = _stack_name(export['ExportingStackId'])
+                prefix = export_name(stack_name, '')
+                if export['Name'].startswith(prefix):
+                    self._by_stack.setdefault(stack_name, {})[export['Name'][len(prefix):]] = export['Value']
+
+    def value(self, name):
+        '''Value of the export with the given name. Raises KeyError if there is none.'''
+        return self._by_name[name]
+
+    def get(self, stack_name, key):
+        '''Value of the stack's exported output. Raises KeyError if the stack does not export it.'''
+        try:
+            return self._by_stack[stack_name][key]
+        except KeyError:
+            raise KeyError((stack_name, key))
+
+    def stack_names(self):
+        return sorted(self._by_stack)
+
+    def outputs(self, stack_name):
+        '''The stack's exported outputs, empty if it exports none.'''
+        if stack_name not in self._outputs:
+            self._outputs[stack_name] = Outputs(outputs=[{'OutputKey': k, 'OutputValue': v}
+                                                         for k, v in self._by_stack.get(stack_name, {}).items()])
+        return self._outputs[stack_name]
+
+    def __contains__(self, stack_and_key):
+        stack_name, key = stack_and_key
+        return key in self._by_stack.get(stack_name, {})
+
+    def __len__(self):
+        return len(self._by_name)
@@ -0,0 +1,156 @@
+from collections import namedtuple
+import logging
+import time
+
+logger = logging.getLogger('laurel.cf.monitor')
+
+STACK_RESOURCE_TYPE = 'AWS::CloudFormation::Stack'
+
+
+def is_terminal(status):
+    return not status.endswith('_IN_PROGRESS')
+
+
+def is_stack_event(event, stack_id):
+    '''True if the event describes the stack itself rather than one of its resources.'''
+    return event['ResourceType'] == STACK_RESOURCE_TYPE and event['PhysicalResourceId'] == stack_id
+
+
+def latest_event_id(cf_client, stack_id):
+    '''Return the ID of the newest event recorded for the stack, or None if it has no events.'''
+    events = cf_client.describe_stack_events(StackName=stack_id)['StackEvents']
+    return events[0]['EventId'] if events else None
+
+
+# One stack event; started is the timestamp at which the resource's current operation began.
+ResourceEvent = namedtuple('ResourceEvent', ['event_id', 'logical_id', 'physical_id', 'resource_type', 'status',
+                                             'reason', 'timestamp', 'started', 'is_stack'])
+
+
+class EventCursor(object):
+    '''Fetches only the stack events that are newer than the last event seen.
+
+    describe_stack_events pages from newest to oldest, so paging stops as soon as
+    the previously seen event turns up.
+    '''
+    def __init__(self, cf_client, stack_id, last_event_id=None):
+        self._client = cf_client
+        self._stack_id = stack_id
+        self._last_event_id = last_event_id
+
+    def fetch(self):
+        '''Return the new events, oldest first.'''
+        new_events = []
+        kwargs = {'StackName': self._stack_id}
+        while True:
+            response = self._client.describe_stack_events(**kwargs)
+            for event in response['StackEvents']:
+                if event['EventId'] == self._last_event_id:
+                    return self._advance(new_events)
+                new_events.append(event)
+            token = response.get('NextToken')
+            if token is None:
+                return self._advance(new_events)
+            kwargs['NextToken'] = token
+
+    def _advance(self, new_events):
+        if new_events:
+            self._last_event_id = new_events[0]['EventId']
+        new_events.reverse()
+        return new_events
+
+
+class Backoff(object):
+    '''Poll delay that grows while nothing happens and snaps back once something does.'''
+    def __init__(self, initial=2.0, maximum=30.0, factor=1.5):
+        self.initial = initial
+        self.maximum = maximum
+        self.factor = factor
+        self._delay = initial
+
+    def reset(self):
+        self._delay = self.initial
+
+    def next(self):
+        delay = self._delay
+        self._delay = min(self._delay * self.factor, self.maximum)
+        return delay
+
+
+class StackMonitor(object):
+    '''Follows a stack operation through the stack's event stream until the stack reaches a terminal status.
+
+    The stack is addressed by ID, so the stack can be followed after it has been deleted.
+    '''
+    def __init__(self, cf_client, stack_id, since_event_id=None, backoff=None, sleep=time.sleep):
+        self._stack_id = stack_id
+        self._cursor = EventCursor(cf_client, stack_id, since_event_id)
+        self._backoff = Backoff() if backoff is None else backoff
+        self._sleep = sleep
+
+    def poll(self, callback):
+        '''Fetch and report new stack events once. Returns the terminal stack event, or None if there is none yet.'''
+        events = self._cursor.fetch()
+        for event in events:
+            if not is_stack_event(event, self._stack_id):
+                continue
+            status = event['ResourceStatus']
+            callback(self._stack_id, status, event.get('ResourceStatusReason'))
+            if is_terminal(status):
+                return event
+        if events:
+            self._backoff.reset()
+        return None
+
+    def next_delay(self):
+        return self._backoff.next()
+
+    def events(self):
+        '''Generate the stack's events as ResourceEvents, oldest first, until the stack reaches a terminal status.
+
+        Every event is yielded once; the last one is the stack's own terminal event. Polls back off while
+        nothing happens, just like wait().
+        '''
+        seen = set()
+        started = {}
+        while True:
+            events = self._cursor.fetch()
+            for event in events:
+                if event['EventId'] in seen:
+                    continue
+                seen.add(event['EventId'])
+                resource_event = self._to_resource_event(event, started)
+                yield resource_event
+                if resource_event.is_stack and is_terminal(resource_event.status):
+                    return
+            if events:
+                self._backoff.reset()
+            self._sleep(self.next_delay())
+
+    def _to_resource_event(self, event, started):
+        key = event['LogicalResourceId']
+        status = event['ResourceStatus']
+        timestamp = event.get('Timestamp')
+        if is_terminal(status):
+            resource_started = started.pop(key, timestamp)
+        else:
+            resource_started = started.setdefault(key, timestamp)
+        return ResourceEvent(event_id=event['EventId'],
+                             logical_id=key,
+                             physical_id=event.get('PhysicalResourceId'),
+                             resource_type=event['ResourceType'],
+                             status=status,
+                             reason=event.get('ResourceStatusReason'),
+                             timestamp=timestamp,
+                             started=resource_started,
+                             is_stack=is_stack_event(event, self._stack_id))
+
+    def wait(self, callback):
+        '''Block until the stack operation finishes. Returns the final stack event.'''
+        while True:
+            event = self.poll(callback)
+            if event is not None:
+                return event
+            delay = self.next_delay()
+            logger.debug('%s - no terminal status yet, polling again in %.1fs', self._stack_id, delay)
+            self._sleep(delay)
@@ -1,15 +1,30 @@
 #!/usr/bin/python
 
+from datetime import datetime
+import hashlib
+import json
 import logging
 import time
 
-import botocore
+import botocore.exceptions
 
 from . import Parameters
 from . import _get_stack
+from .monitor import Backoff, StackMonitor, latest_event_id
 
 logger = logging.getLogger('laurel.cf.operation')
 
+# CloudFormation rejects inline TemplateBody values larger than this; bigger templates must come from S3.
+TEMPLATE_BODY_LIMIT = 51200
+# ...and templates larger than this altogether, even from S3.
+TEMPLATE_URL_LIMIT = 460800
+
+
+def template_size_report(size):
+    '''How a template of size bytes compares with CloudFormation's limits.'''
+    return '{} bytes, {:.0%} of the {} byte TemplateBody limit and {:.0%} of the {} byte TemplateURL limit'.format(
+        size, float(size) / TEMPLATE_BODY_LIMIT, TEMPLATE_BODY_LIMIT, float(size) / TEMPLATE_URL_LIMIT, TEMPLATE_URL_LIMIT)
+
 
 def _logging_cb(stack_id, stack_status, status_reason):
     logger.info('%s - %s : %s', stack_id, stack_status, status_reason)
@@ -18,19 +33,63 @@ def _printing_cb(stack_id, stack_status, status_reason):
     print '{0} - {1} : {2}'.format(stack_id, stack_status, status_reason if status_reason else '')
 
 
-# TODO: _monitor_stack could use the cloudformation client and query by stack ID
-#       This would prevent boto3 from throwing an exception in the case of stack deletion
-def _monitor_stack(stack, conditions, callback):
-    while stack.stack_status in conditions:
-        callback(stack.stack_id, stack.stack_status, stack.stack_status_reason)
-        time.sleep(10)
-        stack.reload()
+def _monitor_stack(cf_client, stack_id, callback, since_event_id=None):
+    return StackMonitor(cf_client, stack_id, since_event_id).wait(callback)
+
+
+def _stack_events(cf_client, stack_id, since_event_id=None, backoff=None):
+    return StackMonitor(cf_client, stack_id, since_event_id, backoff).events()
 
 
 def _to_s3_url(bucket, key):
     return 'http://s3.amazonaws.com/{}/{}'.format(bucket, key)
 
 
+def _to_bytes(template_body):
+    return template_body.encode('utf-8') if isinstance(template_body, unicode) else template_body
+
+
+def _s3_object_matches(s3_client, bucket_name, key, body):
+    '''True if the object exists and holds body. The ETag of a single-part upload is the MD5 of its content.
+
+    S3 answers HEAD on a missing key with 403 rather than 404 if the caller may not list the bucket.
+    '''
+    try:
+        response = s3_client.head_object(Bucket=bucket_name, Key=key)
+    except botocore.exceptions.ClientError as e:
+        if e.response['Error']['Code'] in ('403', '404', 'NoSuchKey', 'NotFound'):
+            return False
+        raise
+    return response['ETag'].strip('"') == hashlib.md5(body).hexdigest()
+
+
+def _parse_template(template):
+    # get_template hands back JSON template bodies already parsed
+    return template if isinstance(template, dict) else json.loads(template)
+
+
+def template_hash(template):
+    '''SHA-256 of a template's canonical JSON form, so formatting and key order do not count as changes.'''
+    canonical = json.dumps(_parse_template(template), sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+def _update_parameters(template_parameter_names, previous_parameter_names, updated_stack_params):
+    '''Stack parameters for an update. Parameters not being updated keep their previous values.'''
+    parms = []
+    for key in sorted(template_parameter_names):
+        if key in updated_stack_params:
+            parms.append({'ParameterKey': key, 'ParameterValue': updated_stack_params[key]})
+        elif key in previous_parameter_names:
+            parms.append({'ParameterKey': key, 'UsePreviousValue': True})
+    return parms
+
+
+def _is_no_changes(change_set):
+    return change_set['Status'] == 'FAILED' and \
+        "didn't contain changes" in change_set.get('StatusReason', '')
+
+
 class StackOperation(object):
     def __init__(self, boto3_session, stack_name, template_body, capabilities, bucket_name, key_prefix):
         self._stack_name = stack_name
@@ -38,48 +97,174 @@ class StackOperation(object):
         self._capabilities = capabilities
         self._bucket_name = bucket_name
         self._key_prefix = key_prefix
-        self._template_url = self._upload_template(template_body)
+        self._template_body = template_body
+        self._template_url = None
+        self._clients = {}
+        self.template_size = len(_to_bytes(template_body))
+        self.template_source = 'inline' if self.template_size <= TEMPLATE_BODY_LIMIT else 's3'
+        self.changes = None
+
+    def template_url(self):
+        if self.template_size > TEMPLATE_URL_LIMIT:
+            raise ValueError('{} - template is too large for CloudFormation: {}'.format(
+                self._stack_name, template_size_report(self.template_size)))
+        if self._template_url is None:
+            self._template_url = self._upload_template(self._template_body)
+        return self._template_url
+
+    def template_args(self):
+        '''TemplateBody for templates within the inline limit, TemplateURL (uploading if necessary) for larger ones.'''
+        if self.template_source == 'inline':
+            return {'TemplateBody': self._template_body}
+        return {'TemplateURL': self.template_url()}
 
     def create(self, stack_params={}, progress_callback=_logging_cb):
-        cf = self._session.resource('cloudformation')
+        cf_client, stack_id, since_event_id = self._start_create(stack_params)
+        _monitor_stack(cf_client, stack_id, progress_callback, since_event_id)
+        return self._stack()
+
+    def create_async(self, poller, stack_params={}, progress_callback=_logging_cb):
+        '''Start creating the stack without waiting for it. Returns a Future for the stack, resolved once poller sees the create finish.'''
+        stack = self._prepare_async()
+        return poller.follow(lambda: self._start_create(stack_params), progress_callback, lambda event: stack)
+
+    def create_events(self, stack_params={}, backoff=None):
+        '''Start creating the stack. Returns an iterator of its ResourceEvents as they happen, ending with the stack's final event.'''
+        cf_client, stack_id, since_event_id = self._start_create(stack_params)
+        return _stack_events(cf_client, stack_id, since_event_id, backoff)
+
+    def update(self, updated_stack_params={}, progress_callback=_logging_cb):
+        '''Update the stack through a change set. Returns without touching the stack if nothing changed.
+
+        The planned resource changes are left in self.changes; an empty list means the update was a no-op.
+        '''
+        started = self._start_update(updated_stack_params)
+        if started is not None:
+            cf_client, stack_id, since_event_id = started
+            _monitor_stack(cf_client, stack_id, progress_callback, since_event_id)
+        return self._stack()
+
+    def update_async(self, poller, updated_stack_params={}, progress_callback=_logging_cb):
+        '''Start updating the stack without waiting for it. Returns a Future for the stack, resolved once poller sees the update finish.'''
+        stack = self._prepare_async()
+        return poller.follow(lambda: self._start_update(updated_stack_params), progress_callback, lambda event: stack)
+
+    def update_events(self, updated_stack_params={}, backoff=None):
+        '''Start updating the stack. Returns an iterator of its ResourceEvents as they happen, empty if nothing changed.'''
+        started = self._start_update(updated_stack_params)
+        if started is None:
+            return iter(())
+        cf_client, stack_id, since_event_id = started
+        return _stack_events(cf_client, stack_id, since_event_id, backoff)
+
+    def _start_create(self, stack_params):
+        cf_client = self._client('cloudformation')
 
         parameters = Parameters(parms=stack_params)
 
-        stack = cf.create_stack(
+        response = cf_client.create_stack(
             StackName=self._stack_name,
-            TemplateURL=self._template_url,
             Parameters=parameters.to_stack_parms(),
             Capabilities=self._capabilities,
             TimeoutInMinutes=10,
-            OnFailure='ROLLBACK')
+            OnFailure='ROLLBACK',
+            **self.template_args())
         # TODO: Add notificationArn and Stack Tags
 
-        _monitor_stack(stack, ['CREATE_IN_PROGRESS', 'ROLLBACK_IN_PROGRESS'], progress_callback)
-        return stack
+        return cf_client, response['StackId'], None
 
-    def update(self, updated_stack_params={}, progress_callback=_logging_cb):
-        cf = self._session.resource('cloudformation')
-
-        stack = cf.Stack(self._stack_name)
-        parameters = Parameters(boto3_stack=stack)
-        parameters.update(updated_stack_params)
-        stack.update(TemplateURL=self._template_url,
-                     Parameters=parameters.to_stack_parms(),
-                     Capabilities=self._capabilities)
+    def _start_update(self, updated_stack_params):
+        '''Returns (client, stack ID, last event ID before the update), or None if there is nothing to update.'''
+        cf_client = self._client('cloudformation')
+
+        deployed_template = _parse_template(
+            cf_client.get_template(StackName=self._stack_name, TemplateStage='Original')['TemplateBody'])
+        if not updated_stack_params and template_hash(deployed_template) == template_hash(self._template_body):
+            logger.info('%s - template and parameters unchanged, no update required', self._stack_name)
+            self.changes = []
+            return None
+
+        parameters = _update_parameters(_parse_template(self._template_body).get('Parameters', {}),
+                                        deployed_template.get('Parameters', {}),
+                                        updated_stack_params)
+        change_set = self._create_change_set(cf_client, parameters)
+        if _is_no_changes(change_set):
+            logger.info('%s - change set contains no changes, no update required', self._stack_name)
+            cf_client.delete_change_set(ChangeSetName=change_set['ChangeSetId'])
+            self.changes = []
+            return None
+        if change_set['Status'] == 'FAILED':
+            cf_client.delete_change_set(ChangeSetName=change_set['ChangeSetId'])  # left behind, they pile up
+            raise ValueError('Change set for stack {} failed: {}'.format(
+                self._stack_name, change_set.get('StatusReason')))
+
+        self.changes = change_set['Changes']
+        for change in self.changes:
+            rc = change['ResourceChange']
+            logger.info('%s - planned %s %s (%s) replacement: %s', self._stack_name, rc['Action'],
+                        rc['LogicalResourceId'], rc['ResourceType'], rc.get('Replacement', 'N/A'))
+
+        stack_id = change_set['StackId']
+        since_event_id = latest_event_id(cf_client, stack_id)
+        cf_client.execute_change_set(ChangeSetName=change_set['ChangeSetId'])
         # TODO: Add notificationArn and Stack Tags
 
-        _monitor_stack(stack, ['UPDATE_IN_PROGRESS', 'UPDATE_COMPLETE_CLEANUP_IN_PROGRESS',
-                               'UPDATE_ROLLBACK_COMPLETE_CLEANUP_IN_PROGRESS',
-                               'UPDATE_ROLLBACK_IN_PROGRESS'], progress_callback)
-        return stack
+        return cf_client, stack_id, since_event_id
+
+    def _create_change_set(self, cf_client, parameters):
+        '''Create a change set and wait for CloudFormation to finish computing it. Returns the described change set.'''
+        response = cf_client.create_change_set(
+            StackName=self._stack_name,
+            ChangeSetName='laurel-{}'.format(datetime.utcnow().strftime('%Y%m%d-%H%M%S')),
+            ChangeSetType='UPDATE',
+            Parameters=parameters,
+            Capabilities=self._capabilities,
+            **self.template_args())
+
+        backoff = Backoff(initial=1.0, maximum=10.0)
+        while True:
+            change_set = cf_client.describe_change_set(ChangeSetName=response['Id'])
+            if change_set['Status'] in ('CREATE_COMPLETE', 'FAILED'):
+                break
+            time.sleep(backoff.next())
+
+        changes = list(change_set.get('Changes', []))
+        token = change_set.get('NextToken')
+        while token is not None:
+            page = cf_client.describe_change_set(ChangeSetName=response['Id'], NextToken=token)
+            changes.extend(page.get('Changes', []))
+            token = page.get('NextToken')
+        change_set['Changes'] = changes
+        return change_set
 
     def _upload_template(self, template_body):
-        key_name = '{}/{}.template'.format(self._key_prefix, self._stack_name)
-        bucket = self._session.resource('s3').Bucket(self._bucket_name)
-        bucket.put_object(Key=key_name,
-                          Body=template_body)
+        '''Upload the template under a key derived from its SHA-256, so identical templates share one object.'''
+        body = _to_bytes(template_body)
+        key_name = '{}/{}.template'.format(self._key_prefix, hashlib.sha256(body).hexdigest())
+        s3_client = self._client('s3')
+        if _s3_object_matches(s3_client, self._bucket_name, key_name, body):
+            logger.debug('%s - template already uploaded to %s', self._stack_name, key_name)
+        else:
+            s3_client.put_object(Bucket=self._bucket_name,
+                                 Key=key_name,
+                                 Body=body)
         return _to_s3_url(self._bucket_name, key_name)
 
+    def _stack(self):
+        return self._session.resource('cloudformation').Stack(self._stack_name)
+
+    def _client(self, service_name):
+        if service_name not in self._clients:
+            self._clients[service_name] = self._session.client(service_name)
+        return self._clients[service_name]
+
+    def _prepare_async(self):
+        # boto3 sessions are not thread safe: create everything the poller's threads need here, up front.
+        self._client('cloudformation')
+        if self.template_source == 's3':
+            self._client('s3')
+        return self._stack()
+
 
 class StackDeleter(object):
     def __init__(self, boto3_session, stack_name):
@@ -91,10 +276,23 @@ class StackDeleter(object):
         return True
 
     def delete(self, progress_callback=_logging_cb):
+        cf_client, stack_id, since_event_id = self._start_delete(_get_stack(self._session, self._stack_name))
+        # monitor by ID: describing a deleted stack by name fails, by ID it does not.
+        _monitor_stack(cf_client, stack_id, progress_callback, since_event_id)
+
+    def delete_events(self, backoff=None):
+        '''Start deleting the stack. Returns an iterator of its ResourceEvents as they happen, ending with the stack's final event.'''
+        cf_client, stack_id, since_event_id = self._start_delete(_get_stack(self._session, self._stack_name))
+        return _stack_events(cf_client, stack_id, since_event_id, backoff)
+
+    def delete_async(self, poller, progress_callback=_logging_cb):
+        '''Start deleting the stack without waiting for it. Returns a Future resolved once poller sees the delete finish.'''
         stack = _get_stack(self._session, self._stack_name)
+        return poller.follow(lambda: self._start_delete(stack), progress_callback)
+
+    def _start_delete(self, stack):
+        cf_client = stack.meta.client
+        stack_id = stack.stack_id
+        since_event_id = latest_event_id(cf_client, stack_id)
         stack.delete()
-        try:
-            _monitor_stack(stack, ['DELETE_IN_PROGRESS'], progress_callback)
-        except botocore.exceptions.ClientError:
-            # this is okay, we expect to get this exception when the stack is deleted.
-            pass
+        return cf_client, stack_id, since_event_id
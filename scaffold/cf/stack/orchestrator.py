@@ -0,0 +1,94 @@
+import logging
+
+from concurrent import futures
+
+logger = logging.getLogger('laurel.cf.orchestrator')
+
+
+def dependency_graph(builders):
+    '''Return {stack_name: set(stack names it depends on)}, restricted to the stacks being built.
+
+    Dependencies outside the set are assumed to exist already.
+    '''
+    names = set(b.stack_name for b in builders)
+    return {b.stack_name: set(d for d in b.get_dependency_stack_names() if d in names) for b in builders}
+
+
+def deployment_layers(graph):
+    '''Group the stacks of a dependency graph into layers; each layer depends only on earlier layers.'''
+    remaining = {name: set(deps) for name, deps in graph.items()}
+    layers = []
+    while remaining:
+        layer = sorted(name for name, deps in remaining.items() if not deps)
+        if not layer:
+            raise ValueError('Circular stack dependencies: {}'.format(sorted(remaining)))
+        for name in layer:
+            del remaining[name]
+        for deps in remaining.values():
+            deps.difference_update(layer)
+        layers.append(layer)
+    return layers
+
+
+class OrchestrationResults(object):
+    def __init__(self):
+        self.results = {}   # stack name -> StackResults
+        self.failures = {}  # stack name -> exception
+        self.skipped = []   # stacks never built because a dependency failed or the run was cancelled
+
+    def succeeded(self):
+        return not self.failures and not self.skipped
+
+
+class StackOrchestrator(object):
+    '''Builds a set of stacks concurrently, starting each stack as soon as the stacks it depends on are built.
+
+    Builders run on worker threads. boto3 sessions are not thread safe, so each builder should
+    have its own session (see session.clone).
+    '''
+    def __init__(self, builders, max_workers=4, fail_fast=True):
+        self._builders = {b.stack_name: b for b in builders}
+        self._graph = dependency_graph(builders)
+        self._max_workers = max_workers
+        self._fail_fast = fail_fast
+        deployment_layers(self._graph)  # fail early on cycles
+
+    def layers(self):
+        return deployment_layers(self._graph)
+
+    def build(self, dry_run=False):
+        results = OrchestrationResults()
+        remaining = {name: set(deps) for name, deps in self._graph.items()}
+        running = {}
+
+        with futures.ThreadPoolExecutor(max_workers=self._max_workers) as executor:
+            while remaining or running:
+                if not (self._fail_fast and results.failures):
+                    for name in sorted(n for n, deps in remaining.items() if not deps):
+                        del remaining[name]
+                        logger.info('starting stack %s', name)
+                        running[executor.submit(self._builders[name].build, dry_run)] = name
+                if not running:
+                    break
+
+                done, _ = futures.wait(running, return_when=futures.FIRST_COMPLETED)
+                for future in done:
+                    name = running.pop(future)
+                    try:
+                        results.results[name] = future.result()
+                    except Exception as e:
+                        logger.exception('stack %s failed', name)
+                        results.failures[name] = e
+                        continue
+                    logger.info('finished stack %s', name)
+                    for deps in remaining.values():
+                        deps.discard(name)
+
+                if self._fail_fast and results.failures:
+                    for future, name in list(running.items()):
+                        if future.cancel():
+                            del running[future]
+                            results.skipped.append(name)
+
+        results.skipped = sorted(results.skipped + list(remaining))
+        return results
@@ -0,0 +1,131 @@
+import logging
+import threading
+import time
+
+from concurrent import futures
+
+from .monitor import Backoff, StackMonitor
+
+logger = logging.getLogger('laurel.cf.poller')
+
+
+class _Watch(object):
+    def __init__(self, monitor, callback, finish, result):
+        self.monitor = monitor
+        self.callback = callback
+        self.finish = finish
+        self.result = result
+        self.due = 0
+
+
+class StackPoller(object):
+    '''Follows any number of stack operations without a thread per stack.
+
+    The boto3 calls that start an operation run on a small thread pool. Following the operations to completion
+    happens on a single poller thread, which visits each stack's event cursor on that stack's own backoff schedule.
+    Results are delivered through concurrent.futures Futures; progress callbacks run on the poller thread.
+    '''
+    def __init__(self, max_workers=4, backoff_factory=Backoff):
+        self._executor = futures.ThreadPoolExecutor(max_workers=max_workers)
+        self._backoff_factory = backoff_factory
+        self._watches = []
+        self._starting = 0  # operations submitted whose start() has not yet returned
+        self._condition = threading.Condition()
+        self._shutdown = False
+        self._thread = threading.Thread(target=self._run, name='laurel-stack-poller')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.shutdown(wait=True)
+        return False
+
+    def follow(self, start, callback, finish=None):
+        '''Run start() on the thread pool, then follow the stack operation it started.
+
+        start returns (cf_client, stack_id, since_event_id), or None if it started nothing.
+        Returns a Future resolved with finish(final stack event), or with the final event if finish is None.
+        finish runs on the poller thread and should be quick.
+        '''
+        result = futures.Future()
+        with self._condition:
+            if self._shutdown:
+                raise RuntimeError('cannot follow operations after shutdown')
+            self._starting += 1
+        started = self._executor.submit(start)
+        started.add_done_callback(lambda f: self._started(f, callback, finish, result))
+        return result
+
+    def shutdown(self, wait=True):
+        '''Stop accepting operations. The poller thread exits once every operation already started or being
+        followed has finished.
+        '''
+        with self._condition:
+            self._shutdown = True
+            self._condition.notify()
+        self._executor.shutdown(wait)
+        if wait:
+            self._thread.join()
+
+    def _started(self, started, callback, finish, result):
+        watch = None
+        try:
+            operation = started.result()
+        except Exception as e:
+            result.set_exception(e)
+        else:
+            if operation is None:
+                self._resolve(result, finish, None)
+            else:
+                cf_client, stack_id, since_event_id = operation
+                monitor = StackMonitor(cf_client, stack_id, since_event_id, backoff=self._backoff_factory())
+                watch = _Watch(monitor, callback, finish, result)
+        # the watch is registered under the same lock shutdown is checked under, so the poller cannot miss it
+        with self._condition:
+            self._starting -= 1
+            if watch is not None:
+                self._watches.append(watch)
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._watches and (self._starting or not self._shutdown):
+                    self._condition.wait()
+                if not self._watches:
+                    return
+                now = time.time()
+                due = [w for w in self._watches if w.due <= now]
+                if not due:
+                    self._condition.wait(min(w.due for w in self._watches) - now)
+                    continue
+            for watch in due:
+                self._poll(watch)
+
+    def _poll(self, watch):
+        try:
+            event = watch.monitor.poll(watch.callback)
+        except Exception as e:
+            logger.exception('polling stack events failed')
+            self._remove(watch)
+            watch.result.set_exception(e)
+            return
+        if event is None:
+            watch.due = time.time() + watch.monitor.next_delay()
+            return
+        self._remove(watch)
+        self._resolve(watch.result, watch.finish, event)
+
+    def _remove(self, watch):
+        with self._condition:
+            self._watches.remove(watch)
+
+    @staticmethod
+    def _resolve(result, finish, event):
+        try:
+            result.set_result(event if finish is None else finish(event))
+        except Exception as e:
+            result.set_exception(e)
@@ -0,0 +1,45 @@
+import copy
+import logging
+
+from concurrent import futures
+
+from scaffold.cf import AmiRegionMap
+from .orchestrator import OrchestrationResults
+
+logger = logging.getLogger('laurel.cf.regions')
+
+# The regions laurel templates have AMIs for
+DEFAULT_REGIONS = sorted(AmiRegionMap())
+
+
+def region_args(args, region):
+    '''Copy of args for deploying to one region. A {region} placeholder in the deploy bucket name is filled in.'''
+    args = copy.copy(args)
+    args.region = region
+    if getattr(args, 'deploy_s3_bucket', None):
+        args.deploy_s3_bucket = args.deploy_s3_bucket.format(region=region)
+    return args
+
+
+def fan_out(regions, deploy, max_workers=None):
+    '''Run deploy(region) for every region concurrently. Returns OrchestrationResults keyed by region.
+
+    deploy runs on a worker thread and must create its own session for the region (see session.new).
+    '''
+    unknown = sorted(set(regions) - set(DEFAULT_REGIONS))
+    if unknown:
+        raise ValueError('No AMIs are mapped for regions {}. Known regions: {}'.format(unknown, DEFAULT_REGIONS))
+
+    results = OrchestrationResults()
+    with futures.ThreadPoolExecutor(max_workers=max_workers or len(regions)) as executor:
+        running = {executor.submit(deploy, region): region for region in regions}
+        for future in futures.as_completed(running):
+            region = running[future]
+            try:
+                results.results[region] = future.result()
+            except Exception as e:
+                logger.exception('deploying to %s failed', region)
+                results.failures[region] = e
+                continue
+            logger.info('finished deploying to %s', region)
+    return results
@@ -0,0 +1,117 @@
+from collections import OrderedDict
+from contextlib import contextmanager
+import json
+import os
+import threading
+import time
+
+try:
+    from time import monotonic
+except ImportError:  # Python 2
+    try:
+        from monotonic import monotonic
+    except ImportError:
+        monotonic = time.time
+
+
+class PhaseTimer(object):
+    '''Times the phases of a build. phases is {phase name: seconds}, in the order the phases finished.
+
+    Phases may run on several threads at once; total() then counts the overlapping time more than once.
+    '''
+    def __init__(self, clock=monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.phases = OrderedDict()
+
+    @contextmanager
+    def phase(self, name):
+        start = self._clock()
+        try:
+            yield
+        finally:
+            seconds = self._clock() - start
+            with self._lock:
+                self.phases[name] = self.phases.get(name, 0.0) + seconds
+
+    def total(self):
+        return sum(self.phases.values())
+
+
+def _body_size(body):
+    if body is None:
+        return 0
+    if isinstance(body, (bytes, bytearray, unicode)):
+        return len(body)
+    try:
+        return os.fstat(body.fileno()).st_size - body.tell()
+    except (AttributeError, IOError, OSError, ValueError):
+        pass
+    try:
+        position = body.tell()
+        body.seek(0, os.SEEK_END)
+        size = body.tell() - position
+        body.seek(position)
+        return size
+    except (AttributeError, IOError, OSError, ValueError):
+        return 0
+
+
+class ApiCallCounter(object):
+    '''Counts the AWS API calls made through a boto3 session, and the bytes sent to S3 by PutObject/UploadPart.
+
+    Only clients created after install() are counted: botocore clients copy the session's handlers when created.
+    For the same reason, clients keep the handler after uninstall(), so an uninstalled counter ignores their calls.
+    A counter can be installed on several sessions at once.
+    '''
+    def __init__(self):
+        self.calls = {}  # 'service.Operation' -> count
+        self.bytes_uploaded = 0
+        self._lock = threading.Lock()
+        self._events = []
+        self._active = True
+
+    def install(self, boto3_session):
+        boto3_session.events.register('before-call.*.*', self._before_call, unique_id=self._unique_id())
+        with self._lock:
+            self._events.append(boto3_session.events)
+        return self
+
+    def uninstall(self):
+        with self._lock:
+            events, self._events = self._events, []
+            self._active = False
+        for e in events:
+            e.unregister('before-call.*.*', unique_id=self._unique_id())
+
+    def total(self):
+        return sum(self.calls.values())
+
+    def _unique_id(self):
+        return 'laurel-api-call-counter-{}'.format(id(self))
+
+    def _before_call(self, event_name, params=None, **kwargs):
+        _, service, operation = event_name.split('.', 2)
+        uploaded = 0
+        if service == 's3' and operation in ('PutObject', 'UploadPart') and params:
+            uploaded = _body_size(params.get('body'))  # params is the serialized request
+        key = '{}.{}'.format(service, operation)
+        with self._lock:
+            if not self._active:
+                return
+            self.calls[key] = self.calls.get(key, 0) + 1
+            self.bytes_uploaded += uploaded
+
+
+def build_report(results):
+    '''JSON-ready report of StackResults, or of OrchestrationResults of them (nested to any depth).'''
+    if hasattr(results, 'to_dict'):
+        return results.to_dict()
+    return {'results': {name: build_report(r) for name, r in results.results.items()},
+            'failures': {name: str(e) for name, e in results.failures.items()},
+            'skipped': list(results.skipped)}
+
+
+def write_build_report(path, results):
+    with open(path, 'w') as f:
+        json.dump(build_report(results), f, indent=2)  # not sorted: timings are in phase order
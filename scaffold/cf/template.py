@@ -1,7 +1,19 @@
+import json
+import logging
+
 import troposphere as tp
 import troposphere.autoscaling as autoscaling
 
 from . import AmiRegionMap
+from .stack.exports import export_name
+from .template_cache import default_cache
+
+logger = logging.getLogger('laurel.cf.template')
+
+# Compact JSON is what laurel sends to CloudFormation: indentation only costs bytes against its size limits.
+# Keys are sorted either way, so the same template always serializes to the same bytes.
+COMPACT_ENCODER = json.JSONEncoder(sort_keys=True, separators=(',', ':'))
+PRETTY_ENCODER = json.JSONEncoder(indent=4, sort_keys=True, separators=(',', ': '))  # as troposphere's to_json
 
 
 def tags_to_dict(taglist):
@@ -37,19 +49,68 @@ AMI_REGION_MAP = AmiRegionMap()
 
 class TemplateBuilder(object):
 
-    def __init__(self, name, description, build_parm_attrs=[]):
+    def __init__(self, name, description, build_parm_attrs=[], export_outputs=False):
         self.name = name
         self.description = description
         self.default_tags = tp.Tags(Application=REF_STACK_NAME, Name=self.name)
         self.build_parm_attrs = build_parm_attrs
-
-    def build_template(self):
-        self._init_template()
-        self._add_build_parms()
-        self.internal_build_template()
-
-    def to_json(self):
-        return self.template.to_json()
+        # Export every output as '<stack name>-<output key>', so dependent stacks can find it with ListExports
+        self.export_outputs = export_outputs
+        self._template_cache = default_cache
+        self._template = None
+        self._json = None
+
+    @property
+    def template(self):
+        if self._template is None:
+            self._build()
+        self._json = None  # the caller may change the template
+        return self._template
+
+    def build_template(self, use_cache=True):
+        '''Build the template, or fetch its JSON from the template cache. use_cache=False bypasses the cache.'''
+        self._template = None
+        self._json = None
+        if not (use_cache and self._template_cache.enabled()):
+            self._build()
+            return
+        try:
+            key = self._template_cache.key(self, self._init_template().mappings)
+        except (TypeError, ValueError):
+            logger.warning('%s - cannot derive a template cache key, building without the cache', self.name, exc_info=True)
+            self._build()
+            return
+        self._template = None
+        cached = self._template_cache.get(key)
+        if cached is not None:
+            # self.template is only built if someone asks for it
+            self._json = cached
+            return
+        self._build()
+        self._json = self.to_json(compact=True)
+        self._template_cache.put(key, self._json)
+
+    def to_json(self, compact=False):
+        '''The template as JSON with sorted keys: indented, or compact for sending to CloudFormation.'''
+        if compact and self._json is not None:
+            return self._json
+        return ''.join(self._json_chunks(compact))
+
+    def write_json(self, fileobj, compact=True):
+        '''Stream the template's JSON to a file object without building the whole string. Returns the byte count.'''
+        size = 0
+        for chunk in self._json_chunks(compact):
+            chunk = chunk.encode('utf-8') if isinstance(chunk, unicode) else chunk
+            fileobj.write(chunk)
+            size += len(chunk)
+        return size
+
+    def _json_chunks(self, compact):
+        # _json, if set, is the compact JSON from the template cache
+        if compact and self._json is not None:
+            return [self._json]
+        document = json.loads(self._json) if self._json is not None else self.template.to_dict()
+        return (COMPACT_ENCODER if compact else PRETTY_ENCODER).iterencode(document)
 
     def add_metadata(self, key, meta_dict):
         meta = self.template.metadata or {}
@@ -76,8 +137,12 @@ class TemplateBuilder(object):
     def output_ref(self, name, o):
         self.output_named(name, tp.Ref(o))
 
-    def output_named(self, name, value):
-        self.template.add_output(tp.Output(name, Value=value))
+    def output_named(self, name, value, export=None):
+        '''Add an output. export (default: export_outputs) exports it as export_name(stack name, name).'''
+        output = tp.Output(name, Value=value)
+        if self.export_outputs if export is None else export:
+            output.Export = tp.Export(tp.Sub(export_name('${AWS::StackName}', name)))
+        self.template.add_output(output)
 
     def restore_build_parms(self, parms):
         for attr, value in parms.iteritems():
@@ -89,9 +154,14 @@ class TemplateBuilder(object):
     def internal_add_mappings(self):
         self.template.add_mapping(AMI_REGION_MAP_NAME, AMI_REGION_MAP)
 
+    def _build(self):
+        self._init_template()
+        self._add_build_parms()
+        self.internal_build_template()
+
     def _init_template(self):
         template = tp.Template()
-        self.template = template
+        self._template = template
         template.add_version()
         template.add_description(self.description)
         self.internal_add_mappings()
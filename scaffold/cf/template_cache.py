@@ -0,0 +1,123 @@
+import ast
+import errno
+import hashlib
+import inspect
+import json
+import logging
+import os
+import sys
+
+import troposphere as tp
+
+from scaffold.cf.stack.cache import cache_dir
+
+logger = logging.getLogger('laurel.cf.template_cache')
+
+# Set to skip the template cache even when LAUREL_CACHE_DIR is set
+BYPASS_VARIABLE = 'LAUREL_NO_TEMPLATE_CACHE'
+
+# Top-level packages whose modules a template's JSON can depend on
+SOURCE_PACKAGES = ('scaffold', 'app')
+
+
+def _state(obj):
+    '''JSON-able form of a template attribute value, for hashing.'''
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    if isinstance(obj, (set, frozenset)):
+        return sorted(obj)
+    if hasattr(obj, '__dict__'):
+        return {'__class__': type(obj).__name__, 'state': vars(obj)}
+    return repr(obj)
+
+
+def _imported_names(module):
+    '''Names of everything the module's import statements name, modules or not.'''
+    with open(inspect.getsourcefile(module)) as f:
+        tree = ast.parse(f.read())
+    package = module.__name__.split('.')
+    if not hasattr(module, '__path__'):
+        package = package[:-1]
+    for node in ast.walk(tree):
+        if isinstance(node, ast.Import):
+            for alias in node.names:
+                yield alias.name
+        elif isinstance(node, ast.ImportFrom):
+            base = package[:len(package) - node.level + 1] if node.level else []
+            prefix = '.'.join(base + ([node.module] if node.module else []))
+            yield prefix
+            for alias in node.names:
+                yield '{}.{}'.format(prefix, alias.name)
+
+
+def source_files(template_class, packages=SOURCE_PACKAGES):
+    '''Source files of the template class and its bases, and of every module in packages they import.
+
+    Imports are followed from module to module, along with the packages each module is in.
+    '''
+    classes = [cls for cls in template_class.__mro__ if cls is not object]
+    files = set(inspect.getsourcefile(cls) for cls in classes)
+    pending = [cls.__module__ for cls in classes]
+    seen = set()
+    while pending:
+        name = pending.pop()
+        if name in seen or name.split('.')[0] not in packages or sys.modules.get(name) is None:
+            continue  # not a module (an imported class or function), or not ours
+        seen.add(name)
+        module = sys.modules[name]
+        files.add(inspect.getsourcefile(module))
+        parts = name.split('.')
+        pending.extend('.'.join(parts[:i]) for i in range(1, len(parts)))
+        pending.extend(_imported_names(module))
+    return sorted(files)
+
+
+class TemplateCache(object):
+    '''Built template JSON on disk, keyed by everything the JSON is built from.
+
+    The key is a hash of the source files the template is built from (see source_files), the troposphere
+    version, the template's attributes (build_parm_attrs and all other constructor state) and its mappings.
+    '''
+    def __init__(self, directory=cache_dir, bypass=None, packages=SOURCE_PACKAGES):
+        self._directory = directory
+        self.bypass = bool(os.environ.get(BYPASS_VARIABLE)) if bypass is None else bypass
+        self._packages = packages
+
+    def enabled(self):
+        return not self.bypass and self._directory() is not None
+
+    def key(self, template_builder, mappings):
+        digest = hashlib.sha256()
+        digest.update(tp.__version__.encode('utf-8'))
+        for source_file in source_files(type(template_builder), self._packages):
+            with open(source_file, 'rb') as f:
+                digest.update(f.read())
+        state = {k: v for k, v in vars(template_builder).items() if not k.startswith('_')}
+        digest.update(json.dumps([state, mappings], sort_keys=True, default=_state).encode('utf-8'))
+        return digest.hexdigest()
+
+    def get(self, key):
+        try:
+            with open(self._path(key), 'rb') as f:
+                return f.read().decode('utf-8')
+        except IOError:
+            return None
+
+    def put(self, key, template_json):
+        path = self._path(key)
+        try:
+            os.makedirs(os.path.dirname(path))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        temp_path = '{}.{}.tmp'.format(path, os.getpid())
+        with open(temp_path, 'wb') as f:
+            f.write(template_json.encode('utf-8'))
+        os.rename(temp_path, path)
+
+    def _path(self, key):
+        return os.path.join(self._directory(), 'templates', key + '.json')
+
+
+# Used by every TemplateBuilder unless given another
+default_cache = TemplateCache()
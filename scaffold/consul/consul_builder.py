@@ -1,11 +1,11 @@
-from datetime import datetime
 import inspect
 import logging
 import os
 import tempfile
 import urllib2
 
-from scaffold.cf.stack.builder import StackBuilder
+from scaffold.cf import CONFIG_BUNDLE_NAME
+from scaffold.cf.stack.builder import StackBuilder, ConfigUploader, content_key_prefix
 from scaffold.cf import stack
 from .consul_template import ConsulTemplate
 from . import ConsulSoftware
@@ -21,15 +21,21 @@ class ConsulBuilder(StackBuilder):
         return self.args.deploy_s3_bucket
 
     def create_s3_key_prefix(self):
-        return '{}/consul-{}'.format(self.args.deploy_s3_key_prefix, datetime.utcnow().strftime('%Y%m%d-%H%M%S'))
+        return content_key_prefix(self.args.deploy_s3_key_prefix, 'consul', [self._config_dir()])
+
+    def get_template_key_prefix(self):
+        return '{}/templates'.format(self.args.deploy_s3_key_prefix)
+
+    def get_dependency_stack_names(self):
+        return [self.args.network_stack_name]
 
     def get_dependencies(self, dependencies):
-        outputs = stack.outputs(self.session, self.args.network_stack_name)
+        outputs = stack.exported_outputs(self.session, self.args.network_stack_name)
 
         dependencies.vpc_id = outputs['VpcId']
         dependencies.vpc_cidr = outputs['VpcCidr']
-        dependencies.private_subnet_ids = outputs.values(lambda k: 'PrivateSubnet' in k)
-        dependencies.public_subnet_ids = outputs.values(lambda k: 'PublicSubnet' in k)
+        dependencies.private_subnet_ids = outputs.values(stack.KeySelector.glob('*PrivateSubnet*'))
+        dependencies.public_subnet_ids = outputs.values(stack.KeySelector.glob('*PublicSubnet*'))
 
     def get_capabilities(self):
         # The consul stack contains inline policy resources. Explicitly acknowledge it here.
@@ -55,23 +61,16 @@ class ConsulBuilder(StackBuilder):
 
     def do_before_create(self, dependencies, dry_run):
 
-        self._upload_config(dependencies.s3_key_prefix)
+        uploaded = self._upload_config(dependencies.s3_key_prefix)
         self._upload_consul()
+        return uploaded
+
+    def _config_dir(self):
+        return os.path.join(os.path.dirname(inspect.getfile(ConsulTemplate)), 'config')
 
     def _upload_config(self, key_prefix):
-        s3 = self.session.resource('s3')
-        bucket = s3.Bucket(self.get_s3_bucket())
-
-        base_dir = os.path.dirname(inspect.getfile(ConsulTemplate))
-        base_dir = os.path.join(base_dir, 'config')
-
-        for dir_name, dir_list, file_list in os.walk(base_dir):
-            for file_name in file_list:
-                file_path = os.path.join(dir_name, file_name)
-                key_path = '/'.join((key_prefix, os.path.relpath(file_path, base_dir)))
-                with open(file_path, 'r') as f:
-                    bucket.put_object(Key=key_path,
-                                      Body=f.read())
+        key = '{}/{}'.format(key_prefix, CONFIG_BUNDLE_NAME)
+        return [ConfigUploader(self.session, self.get_s3_bucket()).upload_bundle(self._config_dir(), key)]
 
     def _upload_consul(self):
         components = ConsulSoftware.components()
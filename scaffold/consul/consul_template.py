@@ -46,6 +46,7 @@ import troposphere.cloudwatch as cw
 import troposphere.logs as logs
 import troposphere as tp
 
+from scaffold.cf import CONFIG_BUNDLE_NAME
 from scaffold.cf.template import asgtag, TemplateBuilder, AMI_REGION_MAP_NAME, REF_STACK_NAME
 from scaffold.cf import net
 from . import ConsulSoftware
@@ -354,8 +355,12 @@ class ConsulTemplate(TemplateBuilder):
     def _get_consul_dir(self):
         return '/opt/consul'
 
+    def _get_consul_config_bundle_dir(self):
+        # scaffold/consul/config, extracted from the bundle uploaded by ConsulBuilder
+        return '{}/bundle'.format(self._get_consul_dir())
+
     def _get_config_consul_py(self):
-        return '{}/config_consul.py'.format(self._get_consul_dir())
+        return '{}/config_consul.py'.format(self._get_consul_config_bundle_dir())
 
     def _get_consul_config_file(self):
         return '{}/config/config.json'.format(self._get_consul_dir())
@@ -369,16 +374,15 @@ class ConsulTemplate(TemplateBuilder):
     def _get_consul_ui_dir(self):
         return '{}/ui'.format(self._get_consul_dir())
 
-    def _get_consul_source_prefix(self):
-        return self._get_s3_url(self.key_prefix)
+    def _get_consul_config_bundle_url(self):
+        return self._get_s3_url('{}/{}'.format(self.key_prefix, CONFIG_BUNDLE_NAME))
 
     def _get_s3_url(self, key_prefix):
         return 'http://{}.s3.amazonaws.com/{}'.format(self.bucket, key_prefix)
 
     def _create_install_initconfig(self):
-        config_consul_py = self._get_config_consul_py()
         consul_agent_dir = self._get_consul_agent_dir()
-        source_prefix = self._get_consul_source_prefix()
+        bundle_dir = self._get_consul_config_bundle_dir()
         return cf.InitConfig(
             packages={
                 'python': {
@@ -389,23 +393,13 @@ class ConsulTemplate(TemplateBuilder):
             # groups={}, # do we need a consul group?
             # users={}, # do we need a consul user?
             sources={
-                consul_agent_dir: self._get_s3_url(ConsulSoftware.linux_s3_key())
-            },
-            files={
-                config_consul_py: {
-                    'source': '{}/config_consul.py'.format(source_prefix),
-                    'mode': '000755',
-                    'owner': 'root',
-                    'group': 'root'
-                },
-                '/etc/init.d/consul': {
-                    'source': '{}/consul.service'.format(source_prefix),
-                    'mode': '000755',
-                    'owner': 'root',
-                    'group': 'root'
-                },
+                consul_agent_dir: self._get_s3_url(ConsulSoftware.linux_s3_key()),
+                bundle_dir: self._get_consul_config_bundle_url()
             },
             commands={
+                '10_service': {
+                    'command': 'install -m 755 -o root -g root {}/consul.service /etc/init.d/consul'.format(bundle_dir)
+                },
                 '20_mode': {
                     'command': 'chmod 755 {}/consul'.format(consul_agent_dir)
                 },
@@ -446,10 +440,9 @@ class ConsulTemplate(TemplateBuilder):
 
     def _create_config_server_initconfig(self):
         cwlogs_config_file = '/opt/cw-logs/cwlogs.cfg'
-        config_cwlogs_py = '/opt/cw-logs/cwlogs.py'
+        config_cwlogs_py = '{}/config_cwlogs.py'.format(self._get_consul_config_bundle_dir())
         consul_config_file = self._get_consul_config_file()
         consul_data_dir = self._get_consul_data_dir()
-        source_prefix = self._get_consul_source_prefix()
         return cf.InitConfig(
             files={
                 # See https://www.consul.io/docs/agent/options.html#configuration_files
@@ -489,13 +482,6 @@ class ConsulTemplate(TemplateBuilder):
                     'owner': 'root',
                     'group': 'root'
                 },
-                config_cwlogs_py: {
-                    'source': '{}/config_cwlogs.py'.format(source_prefix),
-                    'mode': '000755',
-                    'owner': 'root',
-                    'group': 'root'
-                }
-
             },
             commands={
                 '31_cwlogs_config': {
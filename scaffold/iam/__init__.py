@@ -1,7 +1,7 @@
 import json
 import types
 
-from scaffold.cf.stack.elements import Outputs
+from scaffold.cf import stack
 
 
 def service_role_policy_doc(service):
@@ -26,10 +26,8 @@ def load_policy_map(boto3_session, iam_stack_name=None):
     # also map IAM stack policy outputs to arns so we can use simple names
     # for policies created in the iam stack.
     if iam_stack_name is not None:
-        cf = boto3_session.resource('cloudformation')
-        iam_stack = cf.Stack(iam_stack_name)
-        outputs = Outputs(iam_stack)
-        for k in outputs.keys(key_filter=lambda x: x.endswith('Policy')):
+        outputs = stack.outputs(boto3_session, iam_stack_name)
+        for k in outputs.keys(stack.KeySelector.suffix('Policy')):
             policy_map[k] = outputs[k]
 
     return policy_map
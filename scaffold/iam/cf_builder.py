@@ -1,5 +1,3 @@
-from datetime import datetime
-
 from .cf_template import IAMTemplate
 from scaffold.cf.stack.builder import StackBuilder
 
@@ -13,7 +11,10 @@ class IAMBuilder(StackBuilder):
         return self.args.deploy_s3_bucket
 
     def create_s3_key_prefix(self):
-        return '{}/iam-{}'.format(self.args.deploy_s3_key_prefix, datetime.utcnow().strftime('%Y%m%d-%H%M%S'))
+        return '{}/iam'.format(self.args.deploy_s3_key_prefix)
+
+    def get_template_key_prefix(self):
+        return '{}/templates'.format(self.args.deploy_s3_key_prefix)
 
     def get_build_parameter_names(self):
         return list(IAMTemplate.BUILD_PARM_NAMES)
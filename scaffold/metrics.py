@@ -0,0 +1,172 @@
+import atexit
+import bisect
+import json
+import os
+import sys
+import threading
+
+from scaffold.cf.stack.timing import monotonic
+from scaffold.throttling import is_throttling_error
+
+# Opt-in: '-' prints a summary of the process's AWS API calls to stderr at exit; anything else is a file
+# the summary is written to as JSON.
+METRICS_VARIABLE = 'LAUREL_API_METRICS'
+
+# Upper bounds, in milliseconds, of the latency histogram buckets. The last bucket is unbounded.
+LATENCY_BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+BUCKET_NAMES = ['<={}ms'.format(b) for b in LATENCY_BUCKETS_MS] + ['>{}ms'.format(LATENCY_BUCKETS_MS[-1])]
+
+
+class OperationMetrics(object):
+    '''Counts and latencies of the calls to one service operation.'''
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.retries = 0
+        self.throttles = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.histogram = [0] * (len(LATENCY_BUCKETS_MS) + 1)
+
+    def record(self, seconds, error, retries):
+        self.calls += 1
+        self.errors += 1 if error else 0
+        self.retries += retries
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        self.histogram[bisect.bisect_left(LATENCY_BUCKETS_MS, seconds * 1000)] += 1
+
+    def percentile(self, fraction):
+        '''Upper bound in milliseconds of the bucket holding the given fraction of calls (None if unbounded).'''
+        wanted = fraction * self.calls
+        seen = 0
+        for bound, count in zip(LATENCY_BUCKETS_MS + (None,), self.histogram):
+            seen += count
+            if count and seen >= wanted:
+                return bound
+        return None
+
+    def to_dict(self):
+        return {'calls': self.calls,
+                'errors': self.errors,
+                'retries': self.retries,
+                'throttles': self.throttles,
+                'seconds': self.seconds,
+                'mean_ms': 1000 * self.seconds / self.calls if self.calls else 0.0,
+                'max_ms': 1000 * self.max_seconds,
+                'p50_ms': self.percentile(0.5),
+                'p90_ms': self.percentile(0.9),
+                'p99_ms': self.percentile(0.99),
+                'histogram': dict(zip(BUCKET_NAMES, self.histogram))}
+
+
+class ApiMetrics(object):
+    '''Records every AWS API call made through the boto3 sessions it is installed on.
+
+    Installed through botocore's event system; it only observes and never changes a call:
+    - before-call: start the call's clock
+    - needs-retry: count throttled attempts
+    - after-call / after-call-error: record latency (retries included), errors and botocore's retry count
+    '''
+    def __init__(self, clock=monotonic):
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._operations = {}  # 'service.Operation' -> OperationMetrics
+
+    def install(self, boto3_session):
+        events = boto3_session.events
+        events.register('before-call.*.*', self._before_call, unique_id='laurel-metrics-before-call')
+        events.register('needs-retry.*.*', self._needs_retry, unique_id='laurel-metrics-needs-retry')
+        events.register('after-call.*.*', self._after_call, unique_id='laurel-metrics-after-call')
+        events.register('after-call-error.*.*', self._after_call_error, unique_id='laurel-metrics-after-call-error')
+        return boto3_session
+
+    def operation(self, key):
+        with self._lock:
+            if key not in self._operations:
+                self._operations[key] = OperationMetrics()
+            return self._operations[key]
+
+    def summary(self):
+        '''{'service.Operation': metrics dict} for every operation called so far.'''
+        with self._lock:
+            return {key: m.to_dict() for key, m in self._operations.items()}
+
+    def report(self):
+        '''Human-readable table of summary().'''
+        summary = self.summary()
+        lines = ['{:<50} {:>6} {:>6} {:>7} {:>9} {:>9} {:>9} {:>9}'.format(
+            'operation', 'calls', 'errors', 'retries', 'throttles', 'mean ms', 'p90 ms', 'max ms')]
+        for key, m in sorted(summary.items()):
+            lines.append('{:<50} {:>6} {:>6} {:>7} {:>9} {:>9.1f} {:>9} {:>9.1f}'.format(
+                key, m['calls'], m['errors'], m['retries'], m['throttles'], m['mean_ms'],
+                '>{}'.format(LATENCY_BUCKETS_MS[-1]) if m['p90_ms'] is None else m['p90_ms'], m['max_ms']))
+        lines.append('{} calls, {:.1f}s in AWS'.format(sum(m['calls'] for m in summary.values()),
+                                                       sum(m['seconds'] for m in summary.values())))
+        return '\n'.join(lines)
+
+    def _before_call(self, context=None, **kwargs):
+        if context is not None:
+            context['laurel_metrics_start'] = self._clock()
+
+    def _needs_retry(self, event_name, response=None, **kwargs):
+        if response is not None and is_throttling_error(response[1].get('Error', {})):
+            m = self.operation(_key(event_name))
+            with self._lock:
+                m.throttles += 1
+
+    def _after_call(self, event_name, http_response=None, parsed=None, context=None, **kwargs):
+        error = http_response is None or http_response.status_code >= 300
+        retries = (parsed or {}).get('ResponseMetadata', {}).get('RetryAttempts', 0)
+        self._record(event_name, context, error, retries)
+
+    def _after_call_error(self, event_name, context=None, **kwargs):
+        self._record(event_name, context, True, 0)
+
+    def _record(self, event_name, context, error, retries):
+        start = (context or {}).pop('laurel_metrics_start', None)
+        seconds = self._clock() - start if start is not None else 0.0
+        m = self.operation(_key(event_name))
+        with self._lock:
+            m.record(seconds, error, retries)
+
+
+def _key(event_name):
+    return '.'.join(event_name.split('.')[1:3])
+
+
+def enabled():
+    return bool(os.environ.get(METRICS_VARIABLE))
+
+
+def install(boto3_session):
+    '''Install default_metrics on the session if LAUREL_API_METRICS is set. Returns the session.'''
+    if not enabled():
+        return boto3_session
+    _report_at_exit()
+    return default_metrics.install(boto3_session)
+
+
+def write_summary(destination, metrics=None):
+    '''Print the summary ('-': stderr) or write it to a file as JSON.'''
+    metrics = metrics or default_metrics
+    if destination == '-':
+        print >>sys.stderr, metrics.report()
+    else:
+        with open(destination, 'w') as f:
+            json.dump(metrics.summary(), f, indent=2, sort_keys=True)
+
+
+_exit_lock = threading.Lock()
+_exit_registered = []
+
+
+def _report_at_exit():
+    with _exit_lock:
+        if not _exit_registered:
+            atexit.register(write_summary, os.environ[METRICS_VARIABLE])
+            _exit_registered.append(True)
+
+
+# Shared by every session created through session.new while LAUREL_API_METRICS is set
+default_metrics = ApiMetrics()
@@ -0,0 +1,421 @@
+from datetime import datetime
+import hashlib
+import io
+import json
+import logging
+import threading
+import urllib
+import uuid
+import weakref
+
+import boto3
+from botocore import xform_name
+from botocore.awsrequest import AWSResponse
+from dateutil.tz import tzutc
+
+logger = logging.getLogger('laurel.offline')
+
+# Set to a fixtures file to run every session made by session.new against an OfflineAws seeded from it
+FIXTURES_VARIABLE = 'LAUREL_OFFLINE_FIXTURES'
+
+STACK_RESOURCE_TYPE = 'AWS::CloudFormation::Stack'
+
+DEFAULT_REGION = 'us-west-2'
+
+_installed = weakref.WeakKeyDictionary()  # session -> OfflineAws
+_shared = {}                              # fixtures path -> OfflineAws
+_shared_lock = threading.Lock()
+
+
+class OfflineError(Exception):
+    '''An AWS error response. Clients raise it as the usual botocore ClientError.'''
+    def __init__(self, code, message, status=400):
+        super(OfflineError, self).__init__(message)
+        self.code = code
+        self.status = status
+
+
+def load_fixtures(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def backend(boto3_session):
+    '''The OfflineAws installed on the session, or None for a session that talks to AWS.'''
+    return _installed.get(boto3_session)
+
+
+def shared(fixtures_path):
+    '''One OfflineAws per fixtures file, so every session in the process sees the same stacks and objects.'''
+    with _shared_lock:
+        if fixtures_path not in _shared:
+            _shared[fixtures_path] = OfflineAws(load_fixtures(fixtures_path))
+        return _shared[fixtures_path]
+
+
+def _s3_url_key(url):
+    # template URLs as made by StackOperation: http://s3.amazonaws.com/<bucket>/<key>
+    bucket, key = url.split('://', 1)[1].split('/', 1)[1].split('/', 1)
+    return bucket, key
+
+
+def _body_bytes(body):
+    if body is None:
+        return b''
+    if hasattr(body, 'read'):
+        body = body.read()
+    return body.encode('utf-8') if isinstance(body, unicode) else body
+
+
+def _arn_region(arn):
+    # arn:aws:cloudformation:<region>:<account>:...
+    return arn.split(':', 4)[3]
+
+
+def _output_value(key, value):
+    # templates are not evaluated: outputs built from intrinsic functions get a placeholder value
+    return value if isinstance(value, basestring) else 'offline-{}'.format(key)
+
+
+class OfflineAws(object):
+    '''In-process stand-in for the CloudFormation, S3, IAM, STS and autoscaling calls laurel makes.
+
+    install(session) answers every call made through the session's clients (and resources) from memory;
+    nothing is sent to AWS. Stack operations finish at once. Calls laurel does not make raise NotImplementedError.
+    Stacks, change sets and objects belong to the region of the client that made them, as stacks do in AWS.
+
+    fixtures seed the backend:
+        {"account": "123456789012",
+         "region": "us-west-2",
+         "stacks": {"network": {"Description": "...", "Parameters": {...}, "Outputs": {...},
+                                "BuildParameters": {...}, "Tags": {...}, "Template": {...}}},
+         "objects": {"bucket": {"key": "content"}},
+         "regions": {"us-east-1": {"stacks": {...}, "objects": {...}}},
+         "policies": {"PolicyName": "arn"},
+         "roles": ["RoleName"],
+         "auto_scaling_groups": {"name": {"MinSize": 1, "MaxSize": 1, "DesiredCapacity": 1}}}
+    Everything is optional. The top level stacks and objects are in region (us-west-2 by default); regions seeds
+    others. A stack without a Template gets one made from its other entries.
+    '''
+    def __init__(self, fixtures=None, clock=lambda: datetime.now(tzutc())):
+        fixtures = fixtures or {}
+        self._clock = clock
+        self._lock = threading.RLock()
+        self.account = fixtures.get('account', '123456789012')
+        self.calls = []        # (service, operation) in call order
+        self._stacks = {}      # stack id -> stack
+        self._live = {}        # (region, stack name) -> stack id, for stacks that have not been deleted
+        self._change_sets = {}
+        self.objects = {}      # (region, bucket, key) -> bytes
+        self.policies = dict(fixtures.get('policies', {}))
+        self.roles = list(fixtures.get('roles', []))
+        self.auto_scaling_groups = {name: dict(group, AutoScalingGroupName=name)
+                                    for name, group in fixtures.get('auto_scaling_groups', {}).items()}
+        regions = dict(fixtures.get('regions', {}))
+        regions[fixtures.get('region', DEFAULT_REGION)] = fixtures
+        for region, seeds in sorted(regions.items()):
+            for bucket, objects in seeds.get('objects', {}).items():
+                for key, content in objects.items():
+                    self.objects[(region, bucket, key)] = _body_bytes(content)
+            for name, stack in sorted(seeds.get('stacks', {}).items()):
+                self._seed_stack(region, name, stack)
+
+    def install(self, boto3_session):
+        '''Answer the session's calls from this backend. Returns the session.'''
+        events = boto3_session.events
+        events.register('before-parameter-build.*.*', self._keep_params, unique_id='laurel-offline-params')
+        # last, so that API call counters and other before-call handlers still see every call
+        events.register_last('before-call.*.*', self._answer, unique_id='laurel-offline-answer')
+        _installed[boto3_session] = self
+        return boto3_session
+
+    def session(self, region_name=None):
+        '''A new session, with placeholder credentials, answered by this backend.'''
+        return self.install(boto3.session.Session(aws_access_key_id='offline', aws_secret_access_key='offline',
+                                                  region_name=region_name))
+
+    def _keep_params(self, params, context, **kwargs):
+        # before-call only sees the serialized request; keep the call's own parameters for _answer
+        context['laurel_offline_params'] = dict(params)
+
+    def _answer(self, event_name, context, **kwargs):
+        _, service, operation = event_name.split('.', 2)
+        params = context.pop('laurel_offline_params', {})
+        handler = getattr(self, '_{}_{}'.format(service.replace('-', '_'), xform_name(operation)), None)
+        if handler is None:
+            raise NotImplementedError('{}.{} is not available offline'.format(service, operation))
+        with self._lock:
+            self.calls.append((service, operation))
+            try:
+                parsed = handler(context.get('client_region'), **params)
+            except OfflineError as e:
+                error = {'Error': {'Code': e.code, 'Message': str(e)}, 'ResponseMetadata': {'HTTPStatusCode': e.status}}
+                return AWSResponse(None, e.status, {}, None), error
+        parsed.setdefault('ResponseMetadata', {'HTTPStatusCode': 200})
+        return AWSResponse(None, 200, {}, None), parsed
+
+    # CloudFormation
+
+    def _seed_stack(self, region, name, fixture):
+        template = fixture.get('Template')
+        if template is None:
+            template = {'Description': fixture.get('Description', ''),
+                        'Metadata': {'BuildParameters': fixture.get('BuildParameters', {})},
+                        'Parameters': {k: {'Type': 'String'} for k in fixture.get('Parameters', {})},
+                        'Outputs': {k: {'Value': v} for k, v in fixture.get('Outputs', {}).items()}}
+        stack = self._new_stack(region, name, template, fixture.get('Parameters', {}), fixture.get('Tags', {}))
+        if 'Outputs' in fixture:
+            stack['Outputs'] = [{'OutputKey': k, 'OutputValue': v} for k, v in sorted(fixture['Outputs'].items())]
+        self._event(stack, 'CREATE_COMPLETE')
+
+    def _new_stack(self, region, name, template, parameters, tags):
+        stack_id = 'arn:aws:cloudformation:{}:{}:stack/{}/{}'.format(region, self.account, name, uuid.uuid4())
+        stack = {'StackName': name, 'StackId': stack_id, 'CreationTime': self._clock(), 'Tags': tags, 'Events': []}
+        self._apply(stack, template, parameters)
+        self._stacks[stack_id] = stack
+        self._live[(region, name)] = stack_id
+        return stack
+
+    def _apply(self, stack, template, parameters):
+        stack['Template'] = template
+        stack['Description'] = template.get('Description')
+        stack['Parameters'] = [{'ParameterKey': k, 'ParameterValue': v} for k, v in sorted(parameters.items())]
+        outputs = []
+        for key, output in sorted(template.get('Outputs', {}).items()):
+            o = {'OutputKey': key, 'OutputValue': _output_value(key, output.get('Value'))}
+            export_name = output.get('Export', {}).get('Name')
+            if isinstance(export_name, dict) and isinstance(export_name.get('Fn::Sub'), basestring):
+                export_name = export_name['Fn::Sub'].replace('${AWS::StackName}', stack['StackName'])
+            if isinstance(export_name, basestring):
+                o['ExportName'] = export_name
+            outputs.append(o)
+        stack['Outputs'] = outputs
+
+    def _event(self, stack, status, logical_id=None):
+        stack['StackStatus'] = status
+        stack['Events'].insert(0, {'EventId': str(uuid.uuid4()),
+                                   'StackId': stack['StackId'],
+                                   'StackName': stack['StackName'],
+                                   'LogicalResourceId': logical_id or stack['StackName'],
+                                   'PhysicalResourceId': stack['StackId'],
+                                   'ResourceType': STACK_RESOURCE_TYPE,
+                                   'Timestamp': self._clock(),
+                                   'ResourceStatus': status})
+
+    def _find(self, region, stack_name):
+        if stack_name in self._stacks and _arn_region(stack_name) == region:
+            stack_id = stack_name
+        else:
+            stack_id = self._live.get((region, stack_name))
+        if stack_id is None:
+            raise OfflineError('ValidationError', 'Stack with id {} does not exist'.format(stack_name))
+        return self._stacks[stack_id]
+
+    def _template(self, region, TemplateBody=None, TemplateURL=None):
+        if TemplateURL is not None:
+            key = (region,) + _s3_url_key(TemplateURL)
+            if key not in self.objects:
+                raise OfflineError('ValidationError', 'Template {} does not exist'.format(TemplateURL))
+            TemplateBody = self.objects[key].decode('utf-8')
+        return json.loads(TemplateBody)
+
+    def _describe(self, stack):
+        described = {k: v for k, v in stack.items() if k not in ('Template', 'Events')}
+        described['Tags'] = [{'Key': k, 'Value': v} for k, v in sorted(stack['Tags'].items())]
+        return described
+
+    def _live_ids(self, region):
+        return [i for (r, _), i in sorted(self._live.items()) if r == region]
+
+    def _cloudformation_describe_stacks(self, region, StackName=None, NextToken=None):
+        if StackName is not None:
+            return {'Stacks': [self._describe(self._find(region, StackName))]}
+        return {'Stacks': [self._describe(self._stacks[i]) for i in self._live_ids(region)]}
+
+    def _cloudformation_list_stacks(self, region, NextToken=None, StackStatusFilter=None):
+        summaries = []
+        for stack in self._stacks.values():
+            if _arn_region(stack['StackId']) != region:
+                continue
+            if StackStatusFilter and stack['StackStatus'] not in StackStatusFilter:
+                continue
+            summaries.append({k: stack[k] for k in ('StackName', 'StackId', 'StackStatus', 'CreationTime',
+                                                    'LastUpdatedTime') if k in stack})
+        return {'StackSummaries': summaries}
+
+    def _cloudformation_list_exports(self, region, NextToken=None):
+        exports = []
+        for stack_id in self._live_ids(region):
+            for output in self._stacks[stack_id]['Outputs']:
+                if 'ExportName' in output:
+                    exports.append({'ExportingStackId': stack_id, 'Name': output['ExportName'],
+                                    'Value': output['OutputValue']})
+        return {'Exports': exports}
+
+    def _cloudformation_list_imports(self, region, ExportName, NextToken=None):
+        return {'Imports': []}
+
+    def _cloudformation_get_template(self, region, StackName, TemplateStage=None, ChangeSetName=None):
+        return {'TemplateBody': self._find(region, StackName)['Template']}
+
+    def _cloudformation_get_template_summary(self, region, StackName=None, **kwargs):
+        template = self._find(region, StackName)['Template']
+        summary = {'Parameters': [{'ParameterKey': k} for k in sorted(template.get('Parameters', {}))]}
+        if 'Description' in template:
+            summary['Description'] = template['Description']
+        if 'Metadata' in template:
+            summary['Metadata'] = json.dumps(template['Metadata'])
+        return summary
+
+    def _cloudformation_create_stack(self, region, StackName, TemplateBody=None, TemplateURL=None, Parameters=(),
+                                     Tags=(), **kwargs):
+        if (region, StackName) in self._live:
+            raise OfflineError('AlreadyExistsException', 'Stack [{}] already exists'.format(StackName))
+        stack = self._new_stack(region, StackName, self._template(region, TemplateBody, TemplateURL),
+                                {p['ParameterKey']: p['ParameterValue'] for p in Parameters},
+                                {t['Key']: t['Value'] for t in Tags})
+        self._event(stack, 'CREATE_IN_PROGRESS')
+        self._event(stack, 'CREATE_COMPLETE')
+        return {'StackId': stack['StackId']}
+
+    def _cloudformation_delete_stack(self, region, StackName, **kwargs):
+        stack = self._find(region, StackName)
+        self._event(stack, 'DELETE_IN_PROGRESS')
+        self._event(stack, 'DELETE_COMPLETE')
+        self._live.pop((region, stack['StackName']), None)
+        return {}
+
+    def _cloudformation_describe_stack_events(self, region, StackName, NextToken=None):
+        return {'StackEvents': list(self._find(region, StackName)['Events'])}
+
+    def _cloudformation_create_change_set(self, region, StackName, ChangeSetName, TemplateBody=None, TemplateURL=None,
+                                          Parameters=(), **kwargs):
+        stack = self._find(region, StackName)
+        template = self._template(region, TemplateBody, TemplateURL)
+        previous = {p['ParameterKey']: p['ParameterValue'] for p in stack['Parameters']}
+        parameters = {p['ParameterKey']: previous.get(p['ParameterKey']) if p.get('UsePreviousValue')
+                      else p['ParameterValue'] for p in Parameters}
+        old_resources = stack['Template'].get('Resources', {})
+        new_resources = template.get('Resources', {})
+        changes = []
+        for name in sorted(set(old_resources) | set(new_resources)):
+            if old_resources.get(name) == new_resources.get(name):
+                continue
+            action = 'Add' if name not in old_resources else 'Remove' if name not in new_resources else 'Modify'
+            resource = new_resources.get(name) or old_resources[name]
+            change = {'Action': action, 'LogicalResourceId': name, 'ResourceType': resource.get('Type')}
+            if action == 'Modify':
+                change['Replacement'] = 'Conditional'
+            changes.append({'Type': 'Resource', 'ResourceChange': change})
+        change_set_id = 'arn:aws:cloudformation:{}:{}:changeSet/{}/{}'.format(
+            region, self.account, ChangeSetName, uuid.uuid4())
+        change_set = {'ChangeSetId': change_set_id, 'ChangeSetName': ChangeSetName, 'StackId': stack['StackId'],
+                      'StackName': stack['StackName'], 'Status': 'CREATE_COMPLETE', 'Changes': changes,
+                      'Template': template, 'StackParameters': parameters}
+        if not changes and parameters == previous and template == stack['Template']:
+            change_set['Status'] = 'FAILED'
+            change_set['StatusReason'] = "The submitted information didn't contain changes. " \
+                                         "Submit different information to create a change set."
+        self._change_sets[change_set_id] = change_set
+        return {'Id': change_set_id, 'StackId': stack['StackId']}
+
+    def _change_set(self, region, ChangeSetName):
+        if ChangeSetName not in self._change_sets or _arn_region(ChangeSetName) != region:
+            raise OfflineError('ChangeSetNotFound', 'ChangeSet [{}] does not exist'.format(ChangeSetName), 404)
+        return self._change_sets[ChangeSetName]
+
+    def _cloudformation_describe_change_set(self, region, ChangeSetName, StackName=None, NextToken=None):
+        change_set = self._change_set(region, ChangeSetName)
+        return {k: v for k, v in change_set.items() if k not in ('Template', 'StackParameters')}
+
+    def _cloudformation_execute_change_set(self, region, ChangeSetName, StackName=None, **kwargs):
+        change_set = self._change_sets.pop(self._change_set(region, ChangeSetName)['ChangeSetId'])
+        stack = self._stacks[change_set['StackId']]
+        self._event(stack, 'UPDATE_IN_PROGRESS')
+        self._apply(stack, change_set['Template'], change_set['StackParameters'])
+        stack['LastUpdatedTime'] = self._clock()
+        self._event(stack, 'UPDATE_COMPLETE')
+        return {}
+
+    def _cloudformation_delete_change_set(self, region, ChangeSetName, StackName=None):
+        self._change_sets.pop(self._change_set(region, ChangeSetName)['ChangeSetId'])
+        return {}
+
+    # S3
+
+    def _object(self, region, Bucket, Key):
+        if (region, Bucket, Key) not in self.objects:
+            raise OfflineError('NoSuchKey', 'The specified key does not exist.', 404)
+        return self.objects[(region, Bucket, Key)]
+
+    def _s3_head_object(self, region, Bucket, Key, **kwargs):
+        try:
+            body = self._object(region, Bucket, Key)
+        except OfflineError:
+            raise OfflineError('404', 'Not Found', 404)  # HEAD responses carry no error code
+        return {'ETag': '"{}"'.format(hashlib.md5(body).hexdigest()), 'ContentLength': len(body)}
+
+    def _s3_get_object(self, region, Bucket, Key, **kwargs):
+        body = self._object(region, Bucket, Key)
+        return {'Body': io.BytesIO(body), 'ContentLength': len(body),
+                'ETag': '"{}"'.format(hashlib.md5(body).hexdigest())}
+
+    def _s3_put_object(self, region, Bucket, Key, Body=None, **kwargs):
+        body = _body_bytes(Body)
+        self.objects[(region, Bucket, Key)] = body
+        return {'ETag': '"{}"'.format(hashlib.md5(body).hexdigest())}
+
+    def _s3_copy_object(self, region, Bucket, Key, CopySource, **kwargs):
+        if isinstance(CopySource, dict):
+            source = (CopySource['Bucket'], CopySource['Key'])
+        else:  # botocore has already turned it into "bucket/key"
+            source = tuple(urllib.unquote(CopySource).lstrip('/').split('/', 1))
+        body = self._object(region, *source)
+        self.objects[(region, Bucket, Key)] = body
+        return {'CopyObjectResult': {'ETag': '"{}"'.format(hashlib.md5(body).hexdigest())}}
+
+    def _s3_list_objects_v2(self, region, Bucket, Prefix='', **kwargs):
+        contents = [{'Key': key, 'Size': len(body), 'ETag': '"{}"'.format(hashlib.md5(body).hexdigest())}
+                    for (r, bucket, key), body in sorted(self.objects.items())
+                    if r == region and bucket == Bucket and key.startswith(Prefix)]
+        return {'Contents': contents, 'KeyCount': len(contents), 'IsTruncated': False}
+
+    # IAM and STS
+
+    def _iam_list_policies(self, region, **kwargs):
+        return {'Policies': [{'PolicyName': name, 'Arn': arn, 'PolicyId': name, 'Path': '/'}
+                             for name, arn in sorted(self.policies.items())],
+                'IsTruncated': False}
+
+    def _iam_get_user(self, region, UserName='offline'):
+        return {'User': {'UserName': UserName, 'UserId': UserName, 'Path': '/', 'CreateDate': self._clock(),
+                         'Arn': 'arn:aws:iam::{}:user/{}'.format(self.account, UserName)}}
+
+    def _iam_get_role(self, region, RoleName):
+        if RoleName not in self.roles:
+            raise OfflineError('NoSuchEntity', 'The role with name {} cannot be found.'.format(RoleName), 404)
+        return {'Role': {'RoleName': RoleName, 'RoleId': RoleName, 'Path': '/', 'CreateDate': self._clock(),
+                         'Arn': 'arn:aws:iam::{}:role/{}'.format(self.account, RoleName)}}
+
+    def _sts_get_caller_identity(self, region):
+        return {'Account': self.account, 'UserId': 'offline',
+                'Arn': 'arn:aws:iam::{}:user/offline'.format(self.account)}
+
+    def _sts_assume_role(self, region, RoleArn, RoleSessionName, **kwargs):
+        return {'Credentials': {'AccessKeyId': 'offline', 'SecretAccessKey': 'offline', 'SessionToken': 'offline',
+                                'Expiration': self._clock()},
+                'AssumedRoleUser': {'AssumedRoleId': 'offline:{}'.format(RoleSessionName),
+                                    'Arn': '{}/{}'.format(RoleArn, RoleSessionName)}}
+
+    # Auto Scaling
+
+    def _auto_scaling_describe_auto_scaling_groups(self, region, AutoScalingGroupNames=None, **kwargs):
+        names = sorted(self.auto_scaling_groups) if not AutoScalingGroupNames else AutoScalingGroupNames
+        return {'AutoScalingGroups': [dict(self.auto_scaling_groups[n]) for n in names
+                                      if n in self.auto_scaling_groups]}
+
+    def _auto_scaling_update_auto_scaling_group(self, region, AutoScalingGroupName, **kwargs):
+        if AutoScalingGroupName not in self.auto_scaling_groups:
+            raise OfflineError('ValidationError', 'AutoScalingGroup name not found - {}'.format(AutoScalingGroupName))
+        self.auto_scaling_groups[AutoScalingGroupName].update(kwargs)
+        return {}
@@ -0,0 +1,24 @@
+import boto3
+
+from scaffold import metrics, offline
+from scaffold.throttling import default_policy
+
+
+def install(boto3_session):
+    '''Throttling for every session; API call metrics too if LAUREL_API_METRICS is set. Returns the session.'''
+    return metrics.install(default_policy.install(boto3_session))
+
+
+def clone(boto3_session):
+    '''Return a new session with the same credentials and region. boto3 sessions must not be shared between threads.
+
+    The clone of an offline session is answered by the same backend.
+    '''
+    backend = offline.backend(boto3_session)
+    if backend is not None:
+        return metrics.install(backend.session(boto3_session.region_name))
+    creds = boto3_session.get_credentials().get_frozen_credentials()
+    return install(boto3.session.Session(aws_access_key_id=creds.access_key,
+                                         aws_secret_access_key=creds.secret_key,
+                                         aws_session_token=creds.token,
+                                         region_name=boto3_session.region_name))
@@ -1,5 +1,3 @@
-from datetime import datetime
-
 from scaffold.cf.stack.builder import StackBuilder
 from scaffold.cf import stack
 from .stile_template import StileTemplate
@@ -14,18 +12,24 @@ class StileBuilder(StackBuilder):
         return self.args.deploy_s3_bucket
 
     def create_s3_key_prefix(self):
-        return '{}/services-{}'.format(self.args.deploy_s3_key_prefix, datetime.utcnow().strftime('%Y%m%d-%H%M%S'))
+        return '{}/services'.format(self.args.deploy_s3_key_prefix)
+
+    def get_template_key_prefix(self):
+        return '{}/templates'.format(self.args.deploy_s3_key_prefix)
 
     def get_build_parameter_names(self):
         return list(StileTemplate.BUILD_PARM_NAMES)
 
+    def get_dependency_stack_names(self):
+        return [self.args.network_stack_name]
+
     def get_dependencies(self, dependencies):
-        outputs = stack.outputs(self.session, self.args.network_stack_name)
+        outputs = stack.exported_outputs(self.session, self.args.network_stack_name)
 
         dependencies.vpc_id = outputs['VpcId']
         dependencies.vpc_cidr = outputs['VpcCidr']
         dependencies.priv_rt_id = outputs['PrivateRT']
-        dependencies.public_subnet_ids = outputs.values(lambda k: 'PublicSubnet' in k)
+        dependencies.public_subnet_ids = outputs.values(stack.KeySelector.glob('*PublicSubnet*'))
 
         return dependencies
 
@@ -0,0 +1,201 @@
+import logging
+import random
+import threading
+import time
+
+logger = logging.getLogger('laurel.throttling')
+
+THROTTLING_ERROR_CODES = frozenset([
+    'Throttling',
+    'ThrottlingException',
+    'ThrottledException',
+    'RequestThrottled',
+    'RequestThrottledException',
+    'RequestLimitExceeded',
+    'TooManyRequestsException',
+    'SlowDown',
+])
+
+# Sustained calls per second allowed for each service, keyed by botocore's hyphenized service id.
+DEFAULT_RATES = {
+    'cloudformation': 4.0,
+    'iam': 5.0,
+    'auto-scaling': 5.0,
+    'sts': 10.0,
+    's3': 50.0,
+}
+DEFAULT_RATE = 10.0
+
+
+def is_throttling_error(error):
+    '''True for the parsed error of a throttled call ({'Code': ..., 'Message': ...}).'''
+    return error.get('Code') in THROTTLING_ERROR_CODES or 'Rate exceeded' in error.get('Message', '')
+
+
+class TokenBucket(object):
+    '''Thread-safe token bucket. The fill rate drops when the service throttles us and creeps back up on success.'''
+    def __init__(self, rate, capacity=None, min_rate=0.5, clock=time.time, sleep=time.sleep):
+        self.max_rate = rate
+        self.rate = rate
+        self.min_rate = min(min_rate, rate)
+        self.capacity = capacity if capacity is not None else max(1.0, rate * 2)
+        self._tokens = self.capacity
+        self._clock = clock
+        self._sleep = sleep
+        self._updated = clock()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        '''Take a token, sleeping until one is available. Returns the seconds spent waiting.'''
+        with self._lock:
+            now = self._clock()
+            self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait > 0:
+            self._sleep(wait)
+        return wait
+
+    def throttled(self):
+        with self._lock:
+            self.rate = max(self.min_rate, self.rate / 2)
+
+    def succeeded(self):
+        with self._lock:
+            self.rate = min(self.max_rate, self.rate + self.max_rate / 20)
+
+
+class ServiceCounters(object):
+    def __init__(self):
+        self.calls = 0
+        self.throttles = 0
+        self.retries = 0
+        self.retry_seconds = 0.0       # time slept before retrying throttled calls
+        self.rate_limit_seconds = 0.0  # time spent waiting for a token
+
+    def wasted_seconds(self):
+        return self.retry_seconds + self.rate_limit_seconds
+
+    def to_dict(self):
+        return {'calls': self.calls,
+                'throttles': self.throttles,
+                'retries': self.retries,
+                'retry_seconds': self.retry_seconds,
+                'rate_limit_seconds': self.rate_limit_seconds}
+
+
+class ThrottlingPolicy(object):
+    '''Rate limits and retries every AWS call made through the boto3 sessions it is installed on.
+
+    Installed through botocore's event system, so it covers client calls and resource actions alike:
+    - before-call: take a token from the service's bucket
+    - needs-retry: retry throttling errors with jittered exponential backoff ("full jitter")
+    - after-call: let the service's rate recover
+
+    One policy is meant to be shared by all sessions in a process, so concurrent stack operations
+    draw from the same buckets. AWS limits calls per service and region, so each (service, region) has
+    a bucket of its own; a session's calls count against its region.
+    '''
+    def __init__(self, rates=None, default_rate=DEFAULT_RATE, max_attempts=8, base_delay=0.5, max_delay=20.0,
+                 bucket_factory=TokenBucket, jitter=random.random):
+        self._rates = dict(DEFAULT_RATES)
+        self._rates.update(rates or {})
+        self._default_rate = default_rate
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._bucket_factory = bucket_factory
+        self._jitter = jitter
+        self._buckets = {}
+        self._counters = {}
+        self._lock = threading.Lock()
+
+    def install(self, boto3_session):
+        events = boto3_session.events
+        region = boto3_session.region_name
+
+        def before_call(**kwargs):
+            self._before_call(region, **kwargs)
+
+        def needs_retry(**kwargs):
+            return self._needs_retry(region, **kwargs)
+
+        def after_call(**kwargs):
+            self._after_call(region, **kwargs)
+
+        # 'x.*.*' is more specific than botocore's own 'needs-retry.<service>' retry handler, so it is asked first.
+        events.register('before-call.*.*', before_call, unique_id='laurel-throttling-before-call')
+        events.register('needs-retry.*.*', needs_retry, unique_id='laurel-throttling-needs-retry')
+        events.register('after-call.*.*', after_call, unique_id='laurel-throttling-after-call')
+        return boto3_session
+
+    def counters(self, service, region=None):
+        key = (service, region)
+        with self._lock:
+            if key not in self._counters:
+                self._counters[key] = ServiceCounters()
+            return self._counters[key]
+
+    def bucket(self, service, region=None):
+        key = (service, region)
+        with self._lock:
+            if key not in self._buckets:
+                self._buckets[key] = self._bucket_factory(self._rates.get(service, self._default_rate))
+            return self._buckets[key]
+
+    def summary(self):
+        '''{(service, region): counters dict} for every service and region called so far.'''
+        with self._lock:
+            return {key: c.to_dict() for key, c in self._counters.items()}
+
+    def retry_delay(self, attempts):
+        return self._jitter() * min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+
+    def _before_call(self, region, event_name, **kwargs):
+        service = _service(event_name)
+        waited = self.bucket(service, region).acquire()
+        counters = self.counters(service, region)
+        counters.calls += 1
+        counters.rate_limit_seconds += waited
+
+    def _after_call(self, region, event_name, http_response=None, parsed=None, **kwargs):
+        if http_response is not None and http_response.status_code < 400:
+            self.bucket(_service(event_name), region).succeeded()
+
+    def _needs_retry(self, region, event_name, attempts, response=None, **kwargs):
+        if response is None:
+            return None  # connection errors are left to botocore
+        if not is_throttling_error(response[1].get('Error', {})):
+            return None
+        service = _service(event_name)
+        counters = self.counters(service, region)
+        counters.throttles += 1
+        self.bucket(service, region).throttled()
+        if attempts >= self.max_attempts:
+            # botocore's own handler is asked next; it stops retrying after its own 5 attempts
+            logger.warning('%s throttled %d times, giving up', event_name, attempts)
+            return None
+        delay = self.retry_delay(attempts)
+        counters.retries += 1
+        counters.retry_seconds += delay
+        logger.debug('%s throttled, retry %d in %.2fs', event_name, attempts, delay)
+        return delay
+
+
+def log_summary(policy=None):
+    '''Log the throttling counters of every service and region that was throttled or rate limited.'''
+    policy = policy or default_policy
+    for (service, region), counters in sorted(policy.summary().items()):
+        if counters['throttles'] or counters['rate_limit_seconds']:
+            logger.info('%s in %s: %d calls, %d throttled, %d retries, %.1fs backing off, %.1fs rate limited',
+                        service, region, counters['calls'], counters['throttles'], counters['retries'],
+                        counters['retry_seconds'], counters['rate_limit_seconds'])
+
+
+def _service(event_name):
+    return event_name.split('.')[1]
+
+
+# Shared by every session created through session.new
+default_policy = ThrottlingPolicy()
@@ -1,5 +1,3 @@
-from datetime import datetime
-
 from .vpc_template import VpcTemplate
 from scaffold.cf.stack.builder import StackBuilder
 
@@ -13,7 +11,10 @@ class VpcBuilder(StackBuilder):
         return self.args.deploy_s3_bucket
 
     def create_s3_key_prefix(self):
-        return '{}/vpc-{}'.format(self.args.deploy_s3_key_prefix, datetime.utcnow().strftime('%Y%m%d-%H%M%S'))
+        return '{}/vpc'.format(self.args.deploy_s3_key_prefix)
+
+    def get_template_key_prefix(self):
+        return '{}/templates'.format(self.args.deploy_s3_key_prefix)
 
     def get_build_parameter_names(self):
         return list(VpcTemplate.BUILD_PARM_NAMES)
@@ -11,6 +11,7 @@
 # - PublicSubnet-(N) - ID of the public subnet in availability zone (N)
 # - PrivateSubnet-(N) - ID of the private subnet in availability zone (N)
 # - PrivateRouteTable - ID of the private route table
+# Every output is exported as <stack name>-<output key>.
 #
 # Template Parameters (provided at template creation time):
 # - vpc_cidr
@@ -46,7 +47,7 @@ class VpcTemplate(TemplateBuilder):
                  availability_zones=('a', 'b', 'c'),
                  pub_size=1024,
                  priv_size=2048):
-        super(VpcTemplate, self).__init__(name, description, VpcTemplate.BUILD_PARM_NAMES)
+        super(VpcTemplate, self).__init__(name, description, VpcTemplate.BUILD_PARM_NAMES, export_outputs=True)
 
         self.vpc_cidr = vpc_cidr
         self.vpc_cidr_alloc = cidr.CidrBlockAllocator(vpc_cidr)
@@ -1,12 +1,20 @@
 import logging
+import os
 
 import boto3
 
+from scaffold import metrics, offline, sessions
+
 logger = logging.getLogger('laurel.session')
 
 
 def new(profile_name, region_name, role_name):
-    session = boto3.session.Session(profile_name=profile_name, region_name=region_name)
+    fixtures = os.environ.get(offline.FIXTURES_VARIABLE)
+    if fixtures:
+        logger.info('Running offline against fixtures %s', fixtures)
+        return metrics.install(offline.shared(fixtures).session(region_name))
+
+    session = sessions.install(boto3.session.Session(profile_name=profile_name, region_name=region_name))
     if not role_name:
         return session
 
@@ -22,7 +30,12 @@ def new(profile_name, region_name, role_name):
 
     logger.info('User %s is assuming role_name %s', user_name, assumed_role['Arn'])
 
-    return boto3.session.Session(aws_access_key_id=creds['AccessKeyId'],
-                                 aws_secret_access_key=creds['SecretAccessKey'],
-                                 aws_session_token=creds['SessionToken'],
-                                 region_name=region_name)
+    return sessions.install(boto3.session.Session(aws_access_key_id=creds['AccessKeyId'],
+                                                  aws_secret_access_key=creds['SecretAccessKey'],
+                                                  aws_session_token=creds['SessionToken'],
+                                                  region_name=region_name))
+
+
+def clone(session):
+    '''Return a new session with the same credentials and region. boto3 sessions must not be shared between threads.'''
+    return sessions.clone(session)
@@ -0,0 +1,397 @@
+import datetime
+import hashlib
+import io
+import json
+import threading
+import uuid
+
+import botocore.exceptions
+
+STACK_RESOURCE_TYPE = 'AWS::CloudFormation::Stack'
+
+NO_CHANGES_REASON = "The submitted information didn't contain changes. " \
+                    "Submit different information to create a change set."
+
+
+def _client_error(code, message, operation_name):
+    return botocore.exceptions.ClientError({'Error': {'Code': code, 'Message': message}}, operation_name)
+
+
+def _template(body):
+    return body if isinstance(body, dict) else json.loads(body)
+
+
+def _resource_changes(old_template, new_template):
+    old_resources = _template(old_template).get('Resources', {})
+    new_resources = _template(new_template).get('Resources', {})
+    changes = []
+    for name in sorted(set(old_resources) | set(new_resources)):
+        if old_resources.get(name) == new_resources.get(name):
+            continue
+        action = 'Add' if name not in old_resources else 'Remove' if name not in new_resources else 'Modify'
+        resource = new_resources.get(name) or old_resources[name]
+        change = {'Action': action, 'LogicalResourceId': name, 'ResourceType': resource.get('Type')}
+        if action == 'Modify':
+            change['Replacement'] = 'Conditional'
+        changes.append({'Type': 'Resource', 'ResourceChange': change})
+    return changes
+
+
+class FakeCloudFormationClient(object):
+    '''In-memory stand-in for the CloudFormation client calls used by stack operations and caches.
+
+    Stacks do not change all at once: each describe_stack_events call releases the next scripted event, so a stack
+    takes a few polls to go from *_IN_PROGRESS to its final status. With instant=True every operation finishes at
+    once. calls lists the operations called, by method name.
+
+    Change sets list the resources whose template entries differ; one created from a TemplateURL, which this
+    client cannot read, lists none. Set change_set_failure to a reason to make every change set fail with it.
+    '''
+    def __init__(self, resource_names=('Vpc', 'Subnet'), instant=False):
+        self._lock = threading.Lock()
+        self._resource_names = list(resource_names)
+        self._instant = instant
+        self._stacks = {}  # stack id -> stack
+        self._live = {}    # stack name -> stack id, for stacks that have not been deleted
+        self._change_sets = {}
+        self._now = datetime.datetime(2016, 1, 1)
+        self.calls = []
+        self.change_set_requests = []  # create_change_set arguments, in call order
+        self.change_set_failure = None
+
+    def create_stack(self, StackName, **kwargs):
+        with self._lock:
+            self.calls.append('create_stack')
+            stack_id = 'arn:aws:cloudformation:us-west-2:123456789012:stack/{}/{}'.format(StackName, uuid.uuid4())
+            stack = {'name': StackName, 'id': stack_id, 'events': [], 'pending': [], 'outputs': [],
+                     'template': kwargs.get('TemplateBody', '{}'),
+                     'parameters': kwargs.get('Parameters', []),
+                     'tags': kwargs.get('Tags', []),
+                     'created': self._tick(), 'updated': None}
+            self._stacks[stack_id] = stack
+            self._live[StackName] = stack_id
+            self._script(stack, 'CREATE_IN_PROGRESS', 'CREATE_COMPLETE')
+            return {'StackId': stack_id}
+
+    def update_stack(self, StackName, TemplateBody=None, Parameters=None, **kwargs):
+        with self._lock:
+            self.calls.append('update_stack')
+            stack = self._find(StackName)
+            if TemplateBody is not None:
+                stack['template'] = TemplateBody
+            if Parameters is not None:
+                stack['parameters'] = self._parameters(stack, Parameters)
+            stack['updated'] = self._tick()
+            self._script(stack, 'UPDATE_IN_PROGRESS', 'UPDATE_COMPLETE')
+            return {'StackId': stack['id']}
+
+    def delete_stack(self, StackName):
+        with self._lock:
+            self.calls.append('delete_stack')
+            stack = self._find(StackName)
+            self._script(stack, 'DELETE_IN_PROGRESS', 'DELETE_COMPLETE')
+
+    def settle(self):
+        '''Release every scripted event, finishing all operations in progress.'''
+        with self._lock:
+            for stack in list(self._stacks.values()):
+                while stack['pending']:
+                    self._release(stack)
+
+    def set_outputs(self, stack_name, outputs):
+        '''Give a stack outputs, as {key: value} or {key: (value, export name)}.'''
+        with self._lock:
+            stack = self._find(stack_name)
+            stack['outputs'] = []
+            for key, value in sorted(outputs.items()):
+                output = {'OutputKey': key}
+                if isinstance(value, tuple):
+                    output['OutputValue'], output['ExportName'] = value
+                else:
+                    output['OutputValue'] = value
+                stack['outputs'].append(output)
+
+    def describe_stacks(self, StackName=None, NextToken=None):
+        with self._lock:
+            self.calls.append('describe_stacks')
+            ids = [self._find(StackName)['id']] if StackName else sorted(self._live.values())
+            return {'Stacks': [dict(self._summary(self._stacks[i]),
+                                    Outputs=self._stacks[i]['outputs'],
+                                    Parameters=self._stacks[i]['parameters'],
+                                    Tags=self._stacks[i]['tags']) for i in ids]}
+
+    def list_stacks(self, StackStatusFilter=None, NextToken=None):
+        with self._lock:
+            self.calls.append('list_stacks')
+            return {'StackSummaries': [self._summary(s) for s in self._stacks.values()
+                                       if not StackStatusFilter or s['status'] in StackStatusFilter]}
+
+    def get_paginator(self, operation_name):
+        client = self
+
+        class Paginator(object):
+            def paginate(self, **kwargs):
+                yield getattr(client, operation_name)(**kwargs)
+        return Paginator()
+
+    def get_template(self, StackName, TemplateStage='Original'):
+        with self._lock:
+            self.calls.append('get_template')
+            return {'TemplateBody': self._find(StackName)['template']}
+
+    def get_template_summary(self, StackName):
+        with self._lock:
+            self.calls.append('get_template_summary')
+            template = _template(self._find(StackName)['template'])
+            summary = {'Parameters': [{'ParameterKey': k} for k in sorted(template.get('Parameters', {}))],
+                       'ResponseMetadata': {'RequestId': str(uuid.uuid4())}}
+            if 'Description' in template:
+                summary['Description'] = template['Description']
+            if 'Metadata' in template:
+                summary['Metadata'] = json.dumps(template['Metadata'])
+            return summary
+
+    def list_imports(self, ExportName, NextToken=None):
+        with self._lock:
+            self.calls.append('list_imports')
+            export_ids = [s['id'] for s in self._stacks.values()
+                          if any(o.get('ExportName') == ExportName for o in s['outputs'])]
+            importers = [s['name'] for s in self._stacks.values()
+                         if s['name'] in self._live and ExportName in s['template']
+                         and s['id'] not in export_ids]
+            if not importers:
+                raise _client_error('ValidationError', 'Export {} is not imported by any stack.'.format(ExportName),
+                                    'ListImports')
+            return {'Imports': sorted(importers)}
+
+    def describe_stack_events(self, StackName, NextToken=None):
+        with self._lock:
+            self.calls.append('describe_stack_events')
+            stack = self._find(StackName)
+            if stack['pending']:
+                self._release(stack)
+            return {'StackEvents': list(stack['events'])}
+
+    def create_change_set(self, StackName, ChangeSetName, Parameters=(), **kwargs):
+        with self._lock:
+            self.calls.append('create_change_set')
+            self.change_set_requests.append(dict(kwargs, StackName=StackName, ChangeSetName=ChangeSetName,
+                                                 Parameters=Parameters))
+            stack = self._find(StackName)
+            template = kwargs.get('TemplateBody')
+            parameters = self._parameters(stack, Parameters)
+            changes = [] if template is None else _resource_changes(stack['template'], template)
+            change_set_id = 'arn:aws:cloudformation:us-west-2:123456789012:changeSet/{}/{}'.format(
+                ChangeSetName, uuid.uuid4())
+            change_set = {'ChangeSetId': change_set_id, 'ChangeSetName': ChangeSetName, 'StackId': stack['id'],
+                          'StackName': stack['name'], 'Status': 'CREATE_COMPLETE', 'Changes': changes,
+                          'template': template, 'parameters': parameters}
+            if self.change_set_failure is not None:
+                change_set['Status'] = 'FAILED'
+                change_set['StatusReason'] = self.change_set_failure
+            elif template is not None and not changes and parameters == stack['parameters'] and \
+                    _template(template) == _template(stack['template']):
+                change_set['Status'] = 'FAILED'
+                change_set['StatusReason'] = NO_CHANGES_REASON
+            self._change_sets[change_set_id] = change_set
+            return {'Id': change_set_id, 'StackId': stack['id']}
+
+    def describe_change_set(self, ChangeSetName, StackName=None, NextToken=None):
+        with self._lock:
+            self.calls.append('describe_change_set')
+            change_set = self._change_set(ChangeSetName)
+            return {k: v for k, v in change_set.items() if k not in ('template', 'parameters')}
+
+    def execute_change_set(self, ChangeSetName, StackName=None):
+        with self._lock:
+            self.calls.append('execute_change_set')
+            change_set = self._change_sets.pop(self._change_set(ChangeSetName)['ChangeSetId'])
+            stack = self._stacks[change_set['StackId']]
+            if change_set['template'] is not None:
+                stack['template'] = change_set['template']
+            stack['parameters'] = change_set['parameters']
+            stack['updated'] = self._tick()
+            self._script(stack, 'UPDATE_IN_PROGRESS', 'UPDATE_COMPLETE')
+
+    def delete_change_set(self, ChangeSetName, StackName=None):
+        with self._lock:
+            self.calls.append('delete_change_set')
+            self._change_sets.pop(self._change_set(ChangeSetName)['ChangeSetId'])
+
+    def _find(self, name_or_id):
+        stack_id = name_or_id if name_or_id in self._stacks else self._live.get(name_or_id)
+        if stack_id is None:
+            raise _client_error('ValidationError', 'Stack {} does not exist'.format(name_or_id), 'DescribeStacks')
+        return self._stacks[stack_id]
+
+    def _change_set(self, change_set_id):
+        if change_set_id not in self._change_sets:
+            raise _client_error('ChangeSetNotFound', 'ChangeSet [{}] does not exist'.format(change_set_id),
+                                'DescribeChangeSet')
+        return self._change_sets[change_set_id]
+
+    def _tick(self):
+        self._now += datetime.timedelta(minutes=1)
+        return self._now
+
+    @staticmethod
+    def _parameters(stack, parameters):
+        previous = {p['ParameterKey']: p['ParameterValue'] for p in stack['parameters']}
+        return [{'ParameterKey': p['ParameterKey'],
+                 'ParameterValue': previous.get(p['ParameterKey']) if p.get('UsePreviousValue')
+                 else p['ParameterValue']} for p in parameters]
+
+    @staticmethod
+    def _summary(stack):
+        summary = {'StackName': stack['name'], 'StackId': stack['id'], 'StackStatus': stack['status'],
+                   'CreationTime': stack['created']}
+        if stack['updated'] is not None:
+            summary['LastUpdatedTime'] = stack['updated']
+        return summary
+
+    def _release(self, stack):
+        event = stack['pending'].pop(0)
+        stack['events'].insert(0, event)
+        if event['ResourceType'] == STACK_RESOURCE_TYPE:
+            stack['status'] = event['ResourceStatus']
+            if event['ResourceStatus'] == 'DELETE_COMPLETE':
+                del self._live[stack['name']]
+
+    def _script(self, stack, in_progress, complete):
+        stack['status'] = in_progress
+        stack['pending'].append(self._event(stack, stack['name'], STACK_RESOURCE_TYPE, stack['id'], in_progress))
+        for name in self._resource_names:
+            stack['pending'].append(self._event(stack, name, 'AWS::EC2::' + name, name + '-id', in_progress))
+            stack['pending'].append(self._event(stack, name, 'AWS::EC2::' + name, name + '-id', complete))
+        stack['pending'].append(self._event(stack, stack['name'], STACK_RESOURCE_TYPE, stack['id'], complete))
+        while self._instant and stack['pending']:
+            self._release(stack)
+
+    @staticmethod
+    def _event(stack, logical_id, resource_type, physical_id, status):
+        return {'EventId': str(uuid.uuid4()),
+                'StackId': stack['id'],
+                'StackName': stack['name'],
+                'LogicalResourceId': logical_id,
+                'PhysicalResourceId': physical_id,
+                'ResourceType': resource_type,
+                'ResourceStatus': status}
+
+
+class FakeS3Client(object):
+    '''In-memory stand-in for the S3 client calls used for uploads. calls lists the writes, as (operation, key).'''
+    def __init__(self, fail_keys=()):
+        self.objects = {}  # (bucket, key) -> bytes
+        self.fail_keys = fail_keys
+        self.missing_code = '404'  # '403' without s3:ListBucket
+        self.threads = set()
+        self.calls = []
+        self._lock = threading.Lock()
+
+    def upload_file(self, Filename, Bucket, Key, Config=None):
+        with self._lock:
+            self.threads.add(threading.current_thread().ident)
+        if Key in self.fail_keys:
+            raise IOError('upload of {} failed'.format(Key))
+        with open(Filename, 'rb') as f:
+            body = f.read()
+        with self._lock:
+            self.objects[(Bucket, Key)] = body
+            self.calls.append(('upload_file', Key))
+
+    def put_object(self, Bucket, Key, Body):
+        with self._lock:
+            self.objects[(Bucket, Key)] = Body
+            self.calls.append(('put_object', Key))
+
+    def get_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise _client_error('NoSuchKey', 'The specified key does not exist.', 'GetObject')
+        return {'Body': io.BytesIO(self.objects[(Bucket, Key)])}
+
+    def head_object(self, Bucket, Key):
+        if (Bucket, Key) not in self.objects:
+            raise _client_error(self.missing_code, 'Not Found', 'HeadObject')
+        return {'ETag': '"{}"'.format(hashlib.md5(self.objects[(Bucket, Key)]).hexdigest())}
+
+    def copy_object(self, Bucket, Key, CopySource):
+        source = (CopySource['Bucket'], CopySource['Key'])
+        if source not in self.objects:
+            raise _client_error('NoSuchKey', 'The specified key does not exist.', 'CopyObject')
+        with self._lock:
+            self.objects[(Bucket, Key)] = self.objects[source]
+            self.calls.append(('copy_object', Key))
+
+
+class FakeStsClient(object):
+    def __init__(self, account='123456789012'):
+        self.account = account
+        self.calls = 0
+
+    def get_caller_identity(self):
+        self.calls += 1
+        return {'Account': self.account}
+
+
+class FakeMeta(object):
+    '''The meta attribute of a boto3 resource.'''
+    def __init__(self, client):
+        self.client = client
+
+
+class FakeStackResource(object):
+    def __init__(self, client, name):
+        self.meta = FakeMeta(client)
+        self.name = name
+
+    @property
+    def stack_id(self):
+        return self.meta.client._find(self.name)['id']
+
+    def delete(self):
+        self.meta.client.delete_stack(StackName=self.name)
+
+
+class FakeCloudFormationResource(object):
+    def __init__(self, client):
+        self.meta = FakeMeta(client)
+
+    def Stack(self, name):
+        return FakeStackResource(self.meta.client, name)
+
+
+class FakeCredentials(object):
+    def __init__(self, access_key):
+        self.access_key = access_key
+
+
+class FakeSession(object):
+    '''A boto3 session whose clients are the fakes it was given.'''
+    def __init__(self, cf_client=None, s3_client=None, sts_client=None, region_name='us-west-2'):
+        self.cf_client = cf_client
+        self.s3_client = s3_client
+        self.sts_client = sts_client
+        self.region_name = region_name
+
+    def client(self, service_name):
+        return {'cloudformation': self.cf_client, 's3': self.s3_client, 'sts': self.sts_client}[service_name]
+
+    def resource(self, service_name):
+        return FakeCloudFormationResource(self.cf_client)
+
+    def get_credentials(self):
+        return FakeCredentials('AKID')
+
+
+class FakeClock(object):
+    '''time.time and time.sleep for code that takes a clock: sleeping moves the clock on at once.'''
+    def __init__(self, now=0.0):
+        self.now = now
+        self.slept = []
+
+    def __call__(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
@@ -0,0 +1,32 @@
+import json
+import unittest
+from StringIO import StringIO
+
+import troposphere.iam as iam
+
+from scaffold.cf.template import TemplateBuilder
+
+
+class TestJson(unittest.TestCase):
+
+    def setUp(self):
+        self.tb = TemplateBuilder('Test', 'Testing')
+        self.tb.build_template(use_cache=False)
+        self.tb.add_resource(iam.Group('TestGroup'))
+        self.tb.output_named('Zed', 'z')
+        self.tb.output_named('Alpha', 'a')
+
+    def test_pretty_by_default(self):
+        self.assertEqual(self.tb.template.to_json(), self.tb.to_json())
+
+    def test_compact_sorted(self):
+        compact = self.tb.to_json(compact=True)
+        self.assertNotIn(' ', compact)
+        self.assertLess(compact.index('"Alpha"'), compact.index('"Zed"'))
+        self.assertEqual(json.loads(self.tb.to_json()), json.loads(compact))
+
+    def test_write_json_streams_compact(self):
+        out = StringIO()
+        size = self.tb.write_json(out)
+        self.assertEqual(self.tb.to_json(compact=True), out.getvalue())
+        self.assertEqual(len(out.getvalue()), size)
@@ -57,3 +57,16 @@ class TestOutputs(unittest.TestCase):
         o = self.tb.template.outputs['argle']
 
         self.assertIsInstance(o.Value, tp.Ref)
+
+    def test_outputs_not_exported_by_default(self):
+        self.tb.output_named('argle', 'bargle')
+        self.assertNotIn('Export', self.tb.template.outputs['argle'].to_dict())
+
+    def test_exported_outputs(self):
+        tb = TemplateBuilder('Test', 'Testing', export_outputs=True)
+        tb.build_template()
+        tb.output_named('argle', 'bargle')
+        tb.output_named('private', 'value', export=False)
+        self.assertEqual({'Name': {'Fn::Sub': '${AWS::StackName}-argle'}},
+                         tb.template.outputs['argle'].to_dict()['Export'])
+        self.assertNotIn('Export', tb.template.outputs['private'].to_dict())
@@ -0,0 +1,72 @@
+import json
+import unittest
+
+from scaffold.cf.stack.bulk_delete import BulkStackDeleter, select_stacks, stack_dependency_graph
+from scaffold.cf.stack.monitor import Backoff
+from scaffold.cf.stack.poller import StackPoller
+
+from .fake_cloudformation import FakeCloudFormationClient, FakeSession
+
+
+def template(**properties):
+    return json.dumps({'Resources': {'Thing': {'Type': 'AWS::EC2::Thing', 'Properties': properties}}})
+
+
+class TestBulkDelete(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeCloudFormationClient()
+        self.client.create_stack(StackName='dev-network', TemplateBody=template(),
+                                 Tags=[{'Key': 'Application', 'Value': 'dev'}])
+        self.client.set_outputs('dev-network', {'VpcId': 'vpc-1234', 'PrivateSubnet0': 'subnet-aaaa'})
+        self.client.create_stack(StackName='dev-stile', TemplateBody=template(VpcId='vpc-1234'),
+                                 Tags=[{'Key': 'Application', 'Value': 'dev'}])
+        self.client.create_stack(StackName='dev-consul', TemplateBody=template(SubnetIds=['subnet-aaaa']))
+        self.client.set_outputs('dev-consul', {'ConsulSg': ('sg-5678', 'dev-consul-sg')})
+        self.client.create_stack(StackName='dev-elk',
+                                 TemplateBody=template(SecurityGroup={'Fn::ImportValue': 'dev-consul-sg'}))
+        self.client.create_stack(StackName='prod-network', TemplateBody=template())
+        self.client.settle()
+        self.session = FakeSession(self.client)
+
+    def test_select_by_pattern(self):
+        names = [s['StackName'] for s in select_stacks(self.session, pattern='dev-*')]
+        self.assertEqual(['dev-consul', 'dev-elk', 'dev-network', 'dev-stile'], sorted(names))
+
+    def test_select_by_tag(self):
+        names = [s['StackName'] for s in select_stacks(self.session, tag_value='dev')]
+        self.assertEqual(['dev-network', 'dev-stile'], sorted(names))
+
+    def test_dependencies_from_outputs_and_imports(self):
+        graph = stack_dependency_graph(self.client, select_stacks(self.session, pattern='dev-*'))
+        self.assertEqual({'dev-network': set(),
+                          'dev-stile': {'dev-network'},
+                          'dev-consul': {'dev-network'},
+                          'dev-elk': {'dev-consul'}}, graph)
+
+    def test_constant_and_passed_through_outputs_are_not_dependencies(self):
+        client = FakeCloudFormationClient()
+        client.create_stack(StackName='a', TemplateBody=template(Enabled='true'))
+        client.set_outputs('a', {'Enabled': 'true', 'VpcId': 'vpc-1234'})
+        client.create_stack(StackName='b', TemplateBody=template(Enabled='true', VpcId='vpc-1234'))
+        client.set_outputs('b', {'Enabled': 'true', 'VpcId': 'vpc-1234'})
+        client.settle()
+        graph = stack_dependency_graph(client, select_stacks(FakeSession(client)))
+        self.assertEqual({'a': set(), 'b': {'a'}}, graph)
+
+    def test_plan_deletes_dependents_first(self):
+        layers = BulkStackDeleter(self.session, pattern='dev-*').plan()
+        self.assertEqual([['dev-elk'], ['dev-consul', 'dev-stile'], ['dev-network']], layers)
+
+    def test_delete(self):
+        deleter = BulkStackDeleter(self.session, pattern='dev-*')
+        with StackPoller(backoff_factory=lambda: Backoff(0.001, 0.01)) as poller:
+            results = deleter.delete(progress_callback=lambda *args: None, poller=poller)
+        self.assertTrue(results.succeeded())
+        self.assertEqual(4, len(results.results))
+        remaining = [s['StackName'] for s in select_stacks(self.session)]
+        self.assertEqual(['prod-network'], remaining)
+
+    def test_requires_selection(self):
+        with self.assertRaises(ValueError):
+            BulkStackDeleter(self.session)
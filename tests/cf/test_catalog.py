@@ -0,0 +1,50 @@
+import unittest
+
+from scaffold import offline
+from scaffold.cf.stack import KeySelector, OutputsCache, StackCatalog
+
+FIXTURES = {
+    'stacks': {
+        'web-a': {'Outputs': {'WebASG': 'asg-a', 'Url': 'http://a'}, 'Parameters': {'Size': '2'},
+                  'Tags': {'Application': 'web'}},
+        'web-b': {'Outputs': {'WebASG': 'asg-b'}, 'Tags': {'Application': 'web'}},
+        'db': {'Outputs': {'Endpoint': 'db.example.com'}, 'Parameters': {'Size': '1'}}
+    }
+}
+
+
+class TestStackCatalog(unittest.TestCase):
+
+    def setUp(self):
+        self.aws = offline.OfflineAws(FIXTURES)
+        self.session = self.aws.session('us-west-2')
+
+    def test_one_describe_for_everything(self):
+        catalog = StackCatalog(self.session)
+        self.assertEqual(['db', 'web-a', 'web-b'], catalog.names())
+        self.assertEqual('2', catalog.parameters('web-a')['Size'])
+        self.assertEqual(['asg-a'], catalog.outputs('web-a').values(KeySelector.suffix('ASG')))
+        self.assertEqual({'Application': 'web'}, catalog.tags('web-b'))
+        self.assertEqual('CREATE_COMPLETE', catalog.status('db'))
+        self.assertEqual([('cloudformation', 'DescribeStacks')], self.aws.calls)
+
+    def test_indexed_by_id(self):
+        catalog = StackCatalog(self.session)
+        stack_id = catalog.describe('db')['StackId']
+        self.assertIn(stack_id, catalog)
+        self.assertEqual('db.example.com', catalog.outputs(stack_id)['Endpoint'])
+        self.assertIs(catalog.outputs('db'), catalog.outputs(stack_id))
+
+    def test_filters(self):
+        self.assertEqual(['web-a', 'web-b'], StackCatalog(self.session, 'web-*').names())
+        by_tag = StackCatalog(self.session, lambda s: not s['Tags'])
+        self.assertEqual(['db'], by_tag.names())
+        with self.assertRaises(KeyError):
+            by_tag.outputs('web-a')
+
+    def test_primes_outputs_cache(self):
+        cache = OutputsCache(directory=lambda: None)
+        cache.clear()  # account lookups are shared with every other cache
+        cache.prime(self.session, StackCatalog(self.session))
+        self.assertEqual('asg-b', cache.get(self.session, 'web-b')['WebASG'])
+        self.assertEqual([('cloudformation', 'DescribeStacks'), ('sts', 'GetCallerIdentity')], self.aws.calls)
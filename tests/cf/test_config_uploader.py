@@ -0,0 +1,196 @@
+import io
+import json
+import os
+import shutil
+import tarfile
+import tempfile
+import time
+import unittest
+
+from scaffold.cf.stack.builder import ConfigUploader, content_key_prefix, pack_config
+
+from .fake_cloudformation import FakeS3Client, FakeSession
+
+
+class TestConfigUploader(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.base_dir, 'sub'))
+        self._write('a.conf', b'alpha\r\n')
+        self._write('b.bin', b'\x00\xff\x10')
+        self._write(os.path.join('sub', 'c.py'), b'print "c"\n')
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def _write(self, name, body):
+        with open(os.path.join(self.base_dir, name), 'wb') as f:
+            f.write(body)
+
+    def test_uploads_every_file_in_binary(self):
+        client = FakeS3Client()
+        results = ConfigUploader(FakeSession(s3_client=client), 'bucket').upload_to_s3(self.base_dir, 'prefix')
+        self.assertEqual({('bucket', 'prefix/a.conf'): b'alpha\r\n',
+                          ('bucket', 'prefix/b.bin'): b'\x00\xff\x10',
+                          ('bucket', 'prefix/sub/c.py'): b'print "c"\n'}, client.objects)
+        self.assertEqual(['prefix/a.conf', 'prefix/b.bin', 'prefix/sub/c.py'], [r.key for r in results])
+        self.assertEqual([7, 3, 10], [r.size for r in results])
+        self.assertTrue(all(r.error is None for r in results))
+
+    def test_mapping(self):
+        client = FakeS3Client()
+        uploader = ConfigUploader(FakeSession(s3_client=client), 'bucket')
+        uploader.upload_to_s3(self.base_dir, 'prefix', {'a.conf': 'etc/a.conf'})
+        self.assertIn(('bucket', 'prefix/etc/a.conf'), client.objects)
+
+    def test_single_worker(self):
+        client = FakeS3Client()
+        ConfigUploader(FakeSession(s3_client=client), 'bucket', max_workers=1).upload_to_s3(self.base_dir, 'prefix')
+        self.assertEqual(1, len(client.threads))
+
+    def test_failure_is_raised_after_other_uploads_finish(self):
+        client = FakeS3Client(fail_keys=['prefix/a.conf'])
+        with self.assertRaises(IOError):
+            ConfigUploader(FakeSession(s3_client=client), 'bucket').upload_to_s3(self.base_dir, 'prefix')
+        self.assertEqual(2, len(client.objects))
+
+
+class TestIncrementalSync(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self._write('a.conf', b'alpha')
+        self._write('b.conf', b'beta')
+        self.client = FakeS3Client()
+        self.uploader = ConfigUploader(FakeSession(s3_client=self.client), 'bucket')
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def _write(self, name, body):
+        with open(os.path.join(self.base_dir, name), 'wb') as f:
+            f.write(body)
+
+    def _sync(self, key_prefix):
+        self.client.calls = []
+        return self.uploader.upload_to_s3(self.base_dir, key_prefix, manifest_key='config.manifest.json')
+
+    def test_first_sync_uploads_everything_and_writes_manifest(self):
+        results = self._sync('one')
+        self.assertEqual(['uploaded', 'uploaded'], [r.action for r in results])
+        manifest = json.loads(self.client.objects[('bucket', 'config.manifest.json')].decode('utf-8'))
+        self.assertEqual('one', manifest['prefix'])
+        self.assertEqual(['a.conf', 'b.conf'], sorted(manifest['files']))
+
+    def test_unchanged_files_are_copied_server_side(self):
+        self._sync('one')
+        self._write('b.conf', b'beta 2')
+        results = self._sync('two')
+        self.assertEqual(['copied', 'uploaded'], [r.action for r in results])
+        self.assertEqual(b'alpha', self.client.objects[('bucket', 'two/a.conf')])
+        self.assertEqual(b'beta 2', self.client.objects[('bucket', 'two/b.conf')])
+        self.assertEqual(sorted([('copy_object', 'two/a.conf'), ('upload_file', 'two/b.conf'),
+                                 ('put_object', 'config.manifest.json')]), sorted(self.client.calls))
+
+    def test_same_prefix_same_content_is_left_alone(self):
+        self._sync('one')
+        results = self._sync('one')
+        self.assertEqual(['unchanged', 'unchanged'], [r.action for r in results])
+        self.assertEqual([('put_object', 'config.manifest.json')], self.client.calls)
+
+    def test_missing_previous_object_is_uploaded(self):
+        self._sync('one')
+        del self.client.objects[('bucket', 'one/a.conf')]
+        results = self._sync('two')
+        self.assertEqual(['uploaded', 'copied'], [r.action for r in results])
+        self.assertEqual(b'alpha', self.client.objects[('bucket', 'two/a.conf')])
+
+
+class TestConfigBundle(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        os.mkdir(os.path.join(self.base_dir, 'sub'))
+        self._write('a.conf', b'alpha')
+        self._write(os.path.join('sub', 'c.py'), b'print "c"\n')
+        self._write(os.path.join('sub', 'c.pyc'), b'\x03\xf3')
+        self.client = FakeS3Client()
+        self.uploader = ConfigUploader(FakeSession(s3_client=self.client), 'bucket')
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def _write(self, name, body):
+        with open(os.path.join(self.base_dir, name), 'wb') as f:
+            f.write(body)
+
+    def _pack(self):
+        packed = io.BytesIO()
+        pack_config(self.base_dir, packed)
+        return packed.getvalue()
+
+    def test_bundle_holds_every_file_but_compiled_python(self):
+        with tarfile.open(fileobj=io.BytesIO(self._pack()), mode='r:gz') as tar:
+            self.assertEqual(['a.conf', 'sub/c.py'], tar.getnames())
+            self.assertEqual(b'alpha', tar.extractfile('a.conf').read())
+
+    def test_same_files_pack_to_same_bytes(self):
+        first = self._pack()
+        time.sleep(1.1)
+        os.utime(os.path.join(self.base_dir, 'a.conf'), None)
+        self.assertEqual(first, self._pack())
+
+    def test_bundle_is_one_upload(self):
+        result = self.uploader.upload_bundle(self.base_dir, 'prefix/config.tar.gz')
+        self.assertEqual('uploaded', result.action)
+        self.assertEqual([('upload_file', 'prefix/config.tar.gz')], self.client.calls)
+        self.assertEqual(self._pack(), self.client.objects[('bucket', 'prefix/config.tar.gz')])
+        self.assertEqual(len(self._pack()), result.size)
+
+    def test_same_bundle_is_not_uploaded_again(self):
+        self.uploader.upload_bundle(self.base_dir, 'prefix/config.tar.gz')
+        self.client.calls = []
+        result = self.uploader.upload_bundle(self.base_dir, 'prefix/config.tar.gz')
+        self.assertEqual('unchanged', result.action)
+        self.assertEqual([], self.client.calls)
+
+    def test_forbidden_head_is_uploaded(self):
+        self.client.missing_code = '403'
+        result = self.uploader.upload_bundle(self.base_dir, 'prefix/config.tar.gz')
+        self.assertEqual('uploaded', result.action)
+
+
+class TestContentKeyPrefix(unittest.TestCase):
+
+    def setUp(self):
+        self.base_dir = tempfile.mkdtemp()
+        self._write('a.conf', b'alpha')
+        self._write('a.pyc', b'\x03\xf3')
+
+    def tearDown(self):
+        shutil.rmtree(self.base_dir)
+
+    def _write(self, name, body):
+        with open(os.path.join(self.base_dir, name), 'wb') as f:
+            f.write(body)
+
+    def _prefix(self):
+        return content_key_prefix('scaffold', 'consul', [self.base_dir])
+
+    def test_same_content_same_prefix(self):
+        prefix = self._prefix()
+        self.assertRegexpMatches(prefix, r'^scaffold/consul-[0-9a-f]{16}$')
+        os.utime(os.path.join(self.base_dir, 'a.conf'), (0, 0))
+        self._write('a.pyc', b'\x03\xf4')
+        self.assertEqual(prefix, self._prefix())
+
+    def test_changed_content_changes_prefix(self):
+        prefix = self._prefix()
+        self._write('a.conf', b'alpha 2')
+        self.assertNotEqual(prefix, self._prefix())
+
+    def test_renamed_file_changes_prefix(self):
+        prefix = self._prefix()
+        os.rename(os.path.join(self.base_dir, 'a.conf'), os.path.join(self.base_dir, 'b.conf'))
+        self.assertNotEqual(prefix, self._prefix())
@@ -0,0 +1,60 @@
+import argparse
+import os
+import unittest
+
+from scaffold import offline
+from scaffold.cf import stack
+from scaffold.cf.stack import ExportsIndex, KeySelector
+from scaffold.consul.consul_builder import ConsulBuilder
+from scaffold.vpc.vpc_builder import VpcBuilder
+
+FIXTURES = os.path.join(os.path.dirname(os.path.dirname(__file__)), 'offline_fixtures.json')
+
+
+class TestExportsIndex(unittest.TestCase):
+
+    def setUp(self):
+        for cache in (stack.outputs_cache, stack.summary_cache, stack.exports_cache):
+            cache.clear()
+        self.aws = offline.OfflineAws(offline.load_fixtures(FIXTURES))
+        self.session = self.aws.session('us-west-2')
+        args = argparse.Namespace(stack_name='Net', deploy_s3_bucket='deploy-bucket', deploy_s3_key_prefix='scaffold',
+                                  desc='Net', cidr='10.0.0.0/16', availability_zones=['a', 'b'], pub_size=1024,
+                                  priv_size=2048)
+        VpcBuilder(args, self.session, False).build()
+        self.aws.calls = []
+
+    def test_one_list_for_every_lookup(self):
+        index = ExportsIndex(self.session)
+        self.assertIn(('Net', 'VpcCidr'), index)
+        self.assertEqual('10.0.0.0/16', index.get('Net', 'VpcCidr'))
+        self.assertEqual('10.0.0.0/16', index.value('Net-VpcCidr'))
+        self.assertEqual(2, len(index.outputs('Net').values(KeySelector.glob('*PrivateSubnet*'))))
+        self.assertEqual(['Net'], index.stack_names())
+        self.assertEqual([('cloudformation', 'ListExports')], self.aws.calls)
+
+    def test_missing(self):
+        index = ExportsIndex(self.session)
+        with self.assertRaises(KeyError):
+            index.get('Net', 'Nope')
+        self.assertEqual(0, len(index.outputs('network')))
+
+    def test_dependencies_from_exports(self):
+        args = argparse.Namespace(stack_name='consul', network_stack_name='Net', deploy_s3_bucket='deploy-bucket',
+                                  deploy_s3_key_prefix='scaffold', desc='Consul', cluster_size=3,
+                                  instance_type='t2.micro', ui_instance_type='t2.micro', consul_key='key')
+        results = ConsulBuilder(args, self.session, False).build(dry_run=True)
+        self.assertIn('10.0.0.0/16', results.template)
+        self.assertEqual(1, results.api_calls['cloudformation.ListExports'])
+        self.assertNotIn('cloudformation.DescribeStacks', results.api_calls)
+
+    def test_stacks_without_exports_are_described(self):
+        self.assertEqual('vpc-deadbeef', stack.exported_outputs(self.session, 'network')['VpcId'])
+        self.assertIn(('cloudformation', 'DescribeStacks'), self.aws.calls)
+
+    def test_stacks_are_described_when_exports_are_denied(self):
+        def denied(region, **kwargs):
+            raise offline.OfflineError('AccessDenied', 'not authorized to perform cloudformation:ListExports', 403)
+        self.aws._cloudformation_list_exports = denied
+        self.assertEqual('10.0.0.0/16', stack.exported_outputs(self.session, 'Net')['VpcCidr'])
+        self.assertIn(('cloudformation', 'DescribeStacks'), self.aws.calls)
@@ -0,0 +1,168 @@
+import unittest
+
+from scaffold.cf.stack.monitor import Backoff, EventCursor, StackMonitor, latest_event_id, STACK_RESOURCE_TYPE
+
+STACK_ID = 'arn:aws:cloudformation:us-west-2:123456789012:stack/Test/guid'
+
+
+def stack_event(event_id, status, reason=None):
+    return {'EventId': event_id,
+            'StackId': STACK_ID,
+            'LogicalResourceId': 'Test',
+            'PhysicalResourceId': STACK_ID,
+            'ResourceType': STACK_RESOURCE_TYPE,
+            'ResourceStatus': status,
+            'ResourceStatusReason': reason}
+
+
+def resource_event(event_id, logical_id, status):
+    return {'EventId': event_id,
+            'StackId': STACK_ID,
+            'LogicalResourceId': logical_id,
+            'PhysicalResourceId': logical_id + '-physical',
+            'ResourceType': 'AWS::EC2::VPC',
+            'ResourceStatus': status}
+
+
+class FakeEventClient(object):
+    '''Serves stack events newest-first in pages, like describe_stack_events.'''
+    def __init__(self, page_size=2):
+        self.events = []
+        self.page_size = page_size
+        self.calls = 0
+
+    def add(self, *events):
+        for e in events:
+            self.events.insert(0, e)
+
+    def describe_stack_events(self, StackName, NextToken=None):
+        self.calls += 1
+        start = int(NextToken) if NextToken else 0
+        end = start + self.page_size
+        response = {'StackEvents': self.events[start:end]}
+        if end < len(self.events):
+            response['NextToken'] = str(end)
+        return response
+
+
+class TestEventCursor(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeEventClient()
+        self.cursor = EventCursor(self.client, STACK_ID)
+
+    def test_fetch_all_pages_oldest_first(self):
+        self.client.add(*[resource_event(str(i), 'R{}'.format(i), 'CREATE_IN_PROGRESS') for i in range(5)])
+        events = self.cursor.fetch()
+        self.assertEqual(['0', '1', '2', '3', '4'], [e['EventId'] for e in events])
+
+    def test_fetch_only_new_events(self):
+        self.client.add(*[resource_event(str(i), 'R{}'.format(i), 'CREATE_IN_PROGRESS') for i in range(5)])
+        self.cursor.fetch()
+        self.client.add(resource_event('5', 'R5', 'CREATE_COMPLETE'))
+        self.client.calls = 0
+        events = self.cursor.fetch()
+        self.assertEqual(['5'], [e['EventId'] for e in events])
+        self.assertEqual(1, self.client.calls)
+
+    def test_fetch_nothing_new(self):
+        self.client.add(resource_event('0', 'R0', 'CREATE_IN_PROGRESS'))
+        self.cursor.fetch()
+        self.assertEqual([], self.cursor.fetch())
+
+    def test_starts_after_given_event(self):
+        self.client.add(stack_event('old', 'UPDATE_COMPLETE'))
+        cursor = EventCursor(self.client, STACK_ID, latest_event_id(self.client, STACK_ID))
+        self.client.add(stack_event('new', 'UPDATE_IN_PROGRESS'))
+        self.assertEqual(['new'], [e['EventId'] for e in cursor.fetch()])
+
+
+class TestBackoff(unittest.TestCase):
+
+    def test_grows_to_maximum(self):
+        backoff = Backoff(initial=1, maximum=4, factor=2)
+        self.assertEqual([1, 2, 4, 4], [backoff.next() for _ in range(4)])
+
+    def test_reset(self):
+        backoff = Backoff(initial=1, maximum=4, factor=2)
+        backoff.next()
+        backoff.next()
+        backoff.reset()
+        self.assertEqual(1, backoff.next())
+
+
+class TestStackMonitor(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeEventClient()
+        self.reported = []
+        self.sleeps = []
+
+    def _callback(self, stack_id, status, reason):
+        self.reported.append(status)
+
+    def _sleep_then(self, *batches):
+        batches = list(batches)
+
+        def sleep(delay):
+            self.sleeps.append(delay)
+            if batches:
+                self.client.add(*batches.pop(0))
+        return sleep
+
+    def test_waits_for_terminal_stack_event(self):
+        self.client.add(stack_event('1', 'CREATE_IN_PROGRESS'))
+        sleep = self._sleep_then([resource_event('2', 'Vpc', 'CREATE_COMPLETE')],
+                                 [stack_event('3', 'CREATE_COMPLETE')])
+        final = StackMonitor(self.client, STACK_ID, sleep=sleep).wait(self._callback)
+        self.assertEqual('CREATE_COMPLETE', final['ResourceStatus'])
+        self.assertEqual(['CREATE_IN_PROGRESS', 'CREATE_COMPLETE'], self.reported)
+        self.assertEqual(2, len(self.sleeps))
+
+    def test_ignores_nested_stack_events(self):
+        nested = resource_event('2', 'Nested', 'CREATE_COMPLETE')
+        nested['ResourceType'] = STACK_RESOURCE_TYPE
+        self.client.add(stack_event('1', 'CREATE_IN_PROGRESS'), nested, stack_event('3', 'CREATE_COMPLETE'))
+        StackMonitor(self.client, STACK_ID, sleep=self._sleep_then()).wait(self._callback)
+        self.assertEqual(['CREATE_IN_PROGRESS', 'CREATE_COMPLETE'], self.reported)
+
+    def test_rollback_is_followed_to_completion(self):
+        self.client.add(stack_event('1', 'CREATE_IN_PROGRESS'),
+                        stack_event('2', 'ROLLBACK_IN_PROGRESS', 'Resource failed'),
+                        stack_event('3', 'ROLLBACK_COMPLETE'))
+        final = StackMonitor(self.client, STACK_ID, sleep=self._sleep_then()).wait(self._callback)
+        self.assertEqual('ROLLBACK_COMPLETE', final['ResourceStatus'])
+
+    def test_backs_off_while_idle(self):
+        self.client.add(stack_event('1', 'DELETE_IN_PROGRESS'))
+        sleep = self._sleep_then([], [], [stack_event('2', 'DELETE_COMPLETE')])
+        StackMonitor(self.client, STACK_ID, backoff=Backoff(1, 10, 2), sleep=sleep).wait(self._callback)
+        self.assertEqual([1, 2, 4], self.sleeps)
+
+    def test_events_are_streamed_once_until_terminal(self):
+        self.client.add(stack_event('1', 'CREATE_IN_PROGRESS'),
+                        resource_event('2', 'Vpc', 'CREATE_IN_PROGRESS'))
+        sleep = self._sleep_then([resource_event('3', 'Vpc', 'CREATE_COMPLETE')],
+                                 [],
+                                 [stack_event('4', 'CREATE_COMPLETE'), resource_event('5', 'Late', 'CREATE_COMPLETE')])
+        events = list(StackMonitor(self.client, STACK_ID, sleep=sleep).events())
+        self.assertEqual(['1', '2', '3', '4'], [e.event_id for e in events])
+        self.assertEqual([('Test', True), ('Vpc', False), ('Vpc', False), ('Test', True)],
+                         [(e.logical_id, e.is_stack) for e in events])
+        self.assertEqual('AWS::EC2::VPC', events[1].resource_type)
+        self.assertEqual(3, len(self.sleeps))
+
+    def test_events_track_when_resources_started(self):
+        first = resource_event('1', 'Vpc', 'CREATE_IN_PROGRESS')
+        first['Timestamp'] = 10
+        second = resource_event('2', 'Vpc', 'CREATE_IN_PROGRESS')
+        second['Timestamp'] = 11
+        second['ResourceStatusReason'] = 'Resource creation Initiated'
+        third = resource_event('3', 'Vpc', 'CREATE_COMPLETE')
+        third['Timestamp'] = 15
+        final = stack_event('4', 'CREATE_COMPLETE')
+        final['Timestamp'] = 16
+        self.client.add(first, second, third, final)
+        events = list(StackMonitor(self.client, STACK_ID, sleep=self._sleep_then()).events())
+        self.assertEqual([(10, 10), (11, 10), (15, 10)], [(e.timestamp, e.started) for e in events[:3]])
+        self.assertEqual('Resource creation Initiated', events[1].reason)
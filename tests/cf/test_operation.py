@@ -0,0 +1,153 @@
+import hashlib
+import json
+import unittest
+
+from scaffold.cf.stack.operation import StackOperation, TEMPLATE_BODY_LIMIT, TEMPLATE_URL_LIMIT, template_hash, \
+    template_size_report, _update_parameters
+
+from .fake_cloudformation import FakeCloudFormationClient, FakeS3Client, FakeSession
+
+TEMPLATE = {
+    'Description': 'Test',
+    'Parameters': {'KeyName': {'Type': 'String'}, 'Size': {'Type': 'Number'}},
+    'Resources': {'Vpc': {'Type': 'AWS::EC2::VPC', 'Properties': {'CidrBlock': '10.0.0.0/16'}}}
+}
+
+
+def large_template():
+    template = json.loads(json.dumps(TEMPLATE))
+    template['Description'] = 'x' * TEMPLATE_BODY_LIMIT
+    return template
+
+
+def changed_template():
+    template = json.loads(json.dumps(TEMPLATE))
+    template['Resources']['Vpc']['Properties']['CidrBlock'] = '10.1.0.0/16'
+    return template
+
+
+class TestTemplateHash(unittest.TestCase):
+
+    def test_formatting_does_not_matter(self):
+        self.assertEqual(template_hash(TEMPLATE), template_hash(json.dumps(TEMPLATE, indent=4)))
+
+    def test_content_matters(self):
+        self.assertNotEqual(template_hash(TEMPLATE), template_hash(changed_template()))
+
+
+class TestUpdateParameters(unittest.TestCase):
+
+    def test_previous_values_are_kept(self):
+        parms = _update_parameters(['KeyName', 'Size'], ['KeyName', 'Size'], {'Size': '3'})
+        self.assertEqual([{'ParameterKey': 'KeyName', 'UsePreviousValue': True},
+                          {'ParameterKey': 'Size', 'ParameterValue': '3'}], parms)
+
+    def test_new_parameters_are_left_to_defaults(self):
+        parms = _update_parameters(['KeyName', 'Size'], ['KeyName'], {})
+        self.assertEqual([{'ParameterKey': 'KeyName', 'UsePreviousValue': True}], parms)
+
+
+class TestStackOperationUpdate(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeCloudFormationClient(instant=True)
+        self.client.create_stack(StackName='Test', TemplateBody=json.dumps(TEMPLATE),
+                                 Parameters=[{'ParameterKey': 'KeyName', 'ParameterValue': 'key'},
+                                             {'ParameterKey': 'Size', 'ParameterValue': '3'}])
+        self.client.calls = []
+        self.s3 = FakeS3Client()
+        self.session = FakeSession(self.client, self.s3)
+
+    def _operation(self, template):
+        return StackOperation(self.session, 'Test', json.dumps(template, indent=4), [], 'bucket', 'prefix')
+
+    def _template_args(self):
+        return sorted(k for k in self.client.change_set_requests[-1] if k.startswith('Template'))
+
+    def test_unchanged_template_is_not_uploaded_or_updated(self):
+        operation = self._operation(TEMPLATE)
+        stack = operation.update()
+        self.assertEqual(['get_template'], self.client.calls)
+        self.assertEqual([], self.s3.calls)
+        self.assertEqual([], operation.changes)
+        self.assertEqual('Test', stack.name)
+
+    def test_changed_template_goes_through_change_set(self):
+        operation = self._operation(changed_template())
+        operation.update(progress_callback=lambda *args: None)
+        self.assertIn('execute_change_set', self.client.calls)
+        self.assertEqual([{'Type': 'Resource',
+                           'ResourceChange': {'Action': 'Modify', 'LogicalResourceId': 'Vpc',
+                                              'ResourceType': 'AWS::EC2::VPC', 'Replacement': 'Conditional'}}],
+                         operation.changes)
+        self.assertEqual([], self.s3.calls)
+        self.assertEqual([{'ParameterKey': 'KeyName', 'UsePreviousValue': True},
+                          {'ParameterKey': 'Size', 'UsePreviousValue': True}],
+                         self.client.change_set_requests[-1]['Parameters'])
+
+    def test_large_template_goes_through_s3(self):
+        operation = self._operation(large_template())
+        operation.update(progress_callback=lambda *args: None)
+        self.assertEqual('s3', operation.template_source)
+        self.assertEqual(['TemplateURL'], self._template_args())
+        self.assertEqual(1, len(self.s3.calls))
+
+    def test_small_template_is_sent_inline(self):
+        operation = self._operation(changed_template())
+        operation.update(progress_callback=lambda *args: None)
+        self.assertEqual('inline', operation.template_source)
+        self.assertEqual(['TemplateBody'], self._template_args())
+
+    def test_template_too_large_for_s3_is_refused(self):
+        operation = self._operation(dict(TEMPLATE, Description='x' * TEMPLATE_URL_LIMIT))
+        with self.assertRaises(ValueError):
+            operation.update(progress_callback=lambda *args: None)
+        self.assertEqual([], self.s3.calls)
+
+    def test_size_report(self):
+        self.assertEqual('25600 bytes, 50% of the 51200 byte TemplateBody limit and 6% of the 460800 byte '
+                         'TemplateURL limit', template_size_report(25600))
+
+    def test_change_set_without_changes_is_discarded(self):
+        operation = self._operation(TEMPLATE)
+        operation.update({'Size': '3'})
+        self.assertNotIn('execute_change_set', self.client.calls)
+        self.assertIn('delete_change_set', self.client.calls)
+        self.assertEqual([], operation.changes)
+
+    def test_failed_change_set_raises(self):
+        self.client.change_set_failure = 'Bad template'
+        operation = self._operation(changed_template())
+        with self.assertRaises(ValueError):
+            operation.update()
+        self.assertIn('delete_change_set', self.client.calls)
+
+
+class TestUploadTemplate(unittest.TestCase):
+
+    def setUp(self):
+        self.s3 = FakeS3Client()
+        self.session = FakeSession(s3_client=self.s3)
+
+    def _url(self, stack_name, template):
+        return StackOperation(self.session, stack_name, template, [], 'bucket', 'prefix').template_url()
+
+    def test_key_is_content_hash(self):
+        body = json.dumps(TEMPLATE)
+        url = self._url('Test', body)
+        self.assertTrue(url.endswith('prefix/{}.template'.format(hashlib.sha256(body).hexdigest())))
+
+    def test_identical_templates_share_one_upload(self):
+        body = json.dumps(TEMPLATE)
+        self.assertEqual(self._url('One', body), self._url('Two', body))
+        self.assertEqual(1, len(self.s3.calls))
+
+    def test_different_templates_are_uploaded(self):
+        self._url('Test', json.dumps(TEMPLATE))
+        self._url('Test', json.dumps(changed_template()))
+        self.assertEqual(2, len(self.s3.calls))
+
+    def test_forbidden_head_is_uploaded(self):
+        self.s3.missing_code = '403'
+        self._url('Test', json.dumps(TEMPLATE))
+        self.assertEqual(1, len(self.s3.calls))
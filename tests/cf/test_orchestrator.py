@@ -0,0 +1,99 @@
+import threading
+import time
+import unittest
+
+from scaffold.cf.stack.orchestrator import StackOrchestrator, dependency_graph, deployment_layers
+
+
+class FakeBuilder(object):
+    def __init__(self, stack_name, depends_on=(), fail=False, log=None, started=None, release=None, delay=0):
+        self.stack_name = stack_name
+        self._depends_on = list(depends_on)
+        self._fail = fail
+        self._log = log if log is not None else []
+        self._started = started
+        self._release = release
+        self._delay = delay
+
+    def get_dependency_stack_names(self):
+        return self._depends_on
+
+    def build(self, dry_run=False):
+        if self._started is not None:
+            self._started.set()
+        if self._release is not None:
+            self._release.wait(5)
+        time.sleep(self._delay)
+        self._log.append(self.stack_name)
+        if self._fail:
+            raise RuntimeError('{} failed'.format(self.stack_name))
+        return self.stack_name + '-results'
+
+
+class TestDependencyGraph(unittest.TestCase):
+
+    def test_external_dependencies_are_ignored(self):
+        graph = dependency_graph([FakeBuilder('stile', ['network'])])
+        self.assertEqual({'stile': set()}, graph)
+
+    def test_layers(self):
+        builders = [FakeBuilder('network'),
+                    FakeBuilder('stile', ['network']),
+                    FakeBuilder('consul', ['network']),
+                    FakeBuilder('elk', ['consul'])]
+        layers = deployment_layers(dependency_graph(builders))
+        self.assertEqual([['network'], ['consul', 'stile'], ['elk']], layers)
+
+    def test_cycle(self):
+        builders = [FakeBuilder('a', ['b']), FakeBuilder('b', ['a'])]
+        with self.assertRaises(ValueError):
+            StackOrchestrator(builders)
+
+
+class TestStackOrchestrator(unittest.TestCase):
+
+    def test_builds_dependencies_first(self):
+        log = []
+        builders = [FakeBuilder('elk', ['network'], log=log),
+                    FakeBuilder('network', log=log)]
+        results = StackOrchestrator(builders).build()
+        self.assertEqual(['network', 'elk'], log)
+        self.assertTrue(results.succeeded())
+        self.assertEqual('elk-results', results.results['elk'])
+
+    def test_independent_stacks_run_concurrently(self):
+        stile_started = threading.Event()
+        consul_started = threading.Event()
+        # each build waits for the other to start; this only completes if both run at once.
+        builders = [FakeBuilder('stile', started=stile_started, release=consul_started),
+                    FakeBuilder('consul', started=consul_started, release=stile_started)]
+        StackOrchestrator(builders, max_workers=2).build()
+        self.assertTrue(stile_started.is_set() and consul_started.is_set())
+
+    def test_dependents_of_failed_stack_are_skipped(self):
+        builders = [FakeBuilder('network', fail=True),
+                    FakeBuilder('stile', ['network'])]
+        results = StackOrchestrator(builders).build()
+        self.assertFalse(results.succeeded())
+        self.assertIn('network', results.failures)
+        self.assertEqual(['stile'], results.skipped)
+
+    def test_fail_fast_starts_nothing_new(self):
+        log = []
+        slow_started = threading.Event()
+        builders = [FakeBuilder('network', fail=True, log=log, release=slow_started),
+                    FakeBuilder('slow', log=log, started=slow_started, delay=0.1),
+                    FakeBuilder('after-slow', ['slow'], log=log)]
+        results = StackOrchestrator(builders, max_workers=2).build()
+        self.assertEqual(['network', 'slow'], sorted(log))
+        self.assertEqual(['after-slow'], results.skipped)
+
+    def test_keep_going_builds_unrelated_stacks(self):
+        log = []
+        slow_started = threading.Event()
+        builders = [FakeBuilder('network', fail=True, log=log, release=slow_started),
+                    FakeBuilder('slow', log=log, started=slow_started, delay=0.1),
+                    FakeBuilder('after-slow', ['slow'], log=log)]
+        results = StackOrchestrator(builders, max_workers=2, fail_fast=False).build()
+        self.assertEqual(['after-slow', 'network', 'slow'], sorted(log))
+        self.assertEqual([], results.skipped)
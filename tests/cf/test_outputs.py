@@ -2,7 +2,7 @@
 
 import unittest
 
-from scaffold.cf.stack.elements import Outputs
+from scaffold.cf.stack.elements import KeySelector, Outputs
 
 
 class TestOutputs(unittest.TestCase):
@@ -58,3 +58,48 @@ class TestOutputs(unittest.TestCase):
             self.assertFalse('Value' in k)
             count += 1
         self.assertEqual(4, count)
+
+    def test_contains(self):
+        self.assertIn('TwoWithEnds', self.outputs)
+        self.assertNotIn('Blah', self.outputs)
+
+
+class TestKeySelectors(unittest.TestCase):
+
+    def setUp(self):
+        # out of order on purpose: selectors return keys sorted
+        self.outputs = Outputs(outputs=[{'OutputKey': k, 'OutputValue': k.lower()}
+                                        for k in ['NetPublicSubnetC', 'NetPrivateSubnetB', 'NetPublicSubnetA',
+                                                  'NetPrivateSubnetA', 'ConsulASG', 'VpcId']])
+
+    def test_glob(self):
+        self.assertEqual(['NetPrivateSubnetA', 'NetPrivateSubnetB'],
+                         self.outputs.keys(KeySelector.glob('*PrivateSubnet*')))
+        self.assertEqual(['NetPublicSubnetA', 'NetPublicSubnetC'],
+                         self.outputs.keys(KeySelector.glob('NetPub*Subnet?')))
+
+    def test_prefix(self):
+        self.assertEqual(['netprivatesubneta', 'netprivatesubnetb', 'netpublicsubneta', 'netpublicsubnetc'],
+                         self.outputs.values(KeySelector.prefix('Net')))
+        self.assertEqual([], self.outputs.keys(KeySelector.prefix('Zzz')))
+
+    def test_literal_prefix_does_not_hide_prefix(self):
+        selector = KeySelector.glob('Net*A')
+        self.assertEqual('Net', selector.literal_prefix)
+        self.assertEqual(['NetPrivateSubnetA', 'NetPublicSubnetA'], self.outputs.keys(selector))
+        self.assertEqual(['NetPublicSubnetA', 'NetPublicSubnetC'], self.outputs.keys(selector.prefix('NetPub')))
+
+    def test_suffix(self):
+        self.assertEqual(['ConsulASG'], self.outputs.keys(KeySelector.suffix('ASG')))
+
+    def test_regex(self):
+        self.assertEqual(['NetPrivateSubnetA', 'NetPublicSubnetA'], self.outputs.keys(KeySelector.regex('Subnet[A]$')))
+
+    def test_first_is_lowest_key(self):
+        self.assertEqual('netpublicsubneta', self.outputs.first(KeySelector.glob('*PublicSubnet*')))
+        self.assertIsNone(self.outputs.first(KeySelector.prefix('Zzz')))
+
+    def test_selector_is_a_key_filter(self):
+        selector = KeySelector.suffix('SubnetA')
+        self.assertTrue(selector('NetPublicSubnetA'))
+        self.assertEqual(['NetPublicSubnetA', 'NetPrivateSubnetA'], self.outputs.keys(lambda k: selector(k)))
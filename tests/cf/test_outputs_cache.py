@@ -0,0 +1,180 @@
+import json
+import shutil
+import tempfile
+import unittest
+
+from scaffold.cf.stack.cache import OutputsCache, SummaryCache
+
+from .fake_cloudformation import FakeClock, FakeCloudFormationClient, FakeSession, FakeStsClient
+
+
+def summary_template(name, **build_parameters):
+    return json.dumps({'Description': name, 'Metadata': {'BuildParameters': build_parameters}})
+
+
+def create_stack(client, name, outputs=None, template='{}'):
+    client.create_stack(StackName=name, TemplateBody=template)
+    client.settle()
+    client.set_outputs(name, outputs or {})
+
+
+def update_stack(client, name, outputs=None, template='{}'):
+    client.update_stack(StackName=name, TemplateBody=template)
+    client.settle()
+    client.set_outputs(name, outputs or {})
+
+
+class TestOutputsCache(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeCloudFormationClient()
+        create_stack(self.client, 'network', {'VpcId': 'vpc-1234'})
+        self.client.calls = []
+        self.sts = FakeStsClient()
+        self.session = FakeSession(self.client, sts_client=self.sts)
+        self.clock = FakeClock()
+        self.tmp = tempfile.mkdtemp()
+        self._cache().clear()  # every cache shares the account lookups
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _cache(self, directory=None):
+        return OutputsCache(ttl=60, directory=lambda: directory, clock=self.clock)
+
+    def test_repeated_lookups_cost_no_calls(self):
+        cache = self._cache()
+        self.assertEqual('vpc-1234', cache.get(self.session, 'network')['VpcId'])
+        self.assertEqual('vpc-1234', cache.get(self.session, 'network')['VpcId'])
+        self.assertEqual(['describe_stacks'], self.client.calls)
+        self.assertEqual(1, self.sts.calls)
+
+    def test_caches_share_account_lookups(self):
+        self._cache().get(self.session, 'network')
+        SummaryCache(ttl=60, directory=lambda: self.tmp, clock=self.clock).get(self.session, 'network')
+        self.assertEqual(1, self.sts.calls)
+
+    def test_expires(self):
+        cache = self._cache()
+        cache.get(self.session, 'network')
+        self.clock.now += 61
+        cache.get(self.session, 'network')
+        self.assertEqual(['describe_stacks', 'describe_stacks'], self.client.calls)
+
+    def test_keyed_by_region(self):
+        cache = self._cache()
+        cache.get(self.session, 'network')
+        cache.get(FakeSession(self.client, sts_client=self.sts, region_name='us-east-1'), 'network')
+        self.assertEqual(2, len(self.client.calls))
+
+    def test_invalidate(self):
+        cache = self._cache()
+        cache.get(self.session, 'network')
+        update_stack(self.client, 'network', {'VpcId': 'vpc-5678'})
+        cache.invalidate('us-west-2', 'network')
+        self.assertEqual('vpc-5678', cache.get(self.session, 'network')['VpcId'])
+
+    def test_disk_layer_survives_the_process(self):
+        self._cache(self.tmp).get(self.session, 'network')
+        self.client.calls = []
+        outputs = self._cache(self.tmp).get(self.session, 'network')
+        self.assertEqual('vpc-1234', outputs['VpcId'])
+        self.assertEqual(['list_stacks'], self.client.calls)
+
+    def test_disk_layer_checks_all_stacks_with_one_list(self):
+        create_stack(self.client, 'iam', {'AdminPolicy': 'arn:policy'})
+        self._cache(self.tmp).get(self.session, 'network')
+        self._cache(self.tmp).get(self.session, 'iam')
+        self.client.calls = []
+        cache = self._cache(self.tmp)
+        cache.get(self.session, 'network')
+        cache.get(self.session, 'iam')
+        self.assertEqual(['list_stacks'], self.client.calls)
+
+    def test_disk_layer_invalidated_by_last_updated_time(self):
+        self._cache(self.tmp).get(self.session, 'network')
+        update_stack(self.client, 'network', {'VpcId': 'vpc-5678'})
+        self.assertEqual('vpc-5678', self._cache(self.tmp).get(self.session, 'network')['VpcId'])
+
+    def test_changing_stack_is_not_kept_on_disk(self):
+        self.client.update_stack(StackName='network')  # LastUpdatedTime is set as the update starts
+        self._cache(self.tmp).get(self.session, 'network')
+        self.client.settle()
+        self.client.set_outputs('network', {'VpcId': 'vpc-5678'})
+        self.assertEqual('vpc-5678', self._cache(self.tmp).get(self.session, 'network')['VpcId'])
+
+    def test_invalidate_removes_disk_entry(self):
+        cache = self._cache(self.tmp)
+        cache.get(self.session, 'network')
+        cache.invalidate('us-west-2', 'network')
+        self.client.calls = []
+        self._cache(self.tmp).get(self.session, 'network')
+        self.assertEqual(['describe_stacks'], self.client.calls)
+
+
+class TestSummaryCache(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeCloudFormationClient()
+        create_stack(self.client, 'network', template=summary_template('network', cidr='10.0.0.0/16'))
+        self.client.calls = []
+        self.sts = FakeStsClient()
+        self.session = FakeSession(self.client, sts_client=self.sts)
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _cache(self, directory=None):
+        return SummaryCache(ttl=60, directory=lambda: directory, clock=FakeClock())
+
+    def test_without_directory_one_call_per_process(self):
+        cache = self._cache()
+        self.assertEqual('network', cache.get(self.session, 'network')['Description'])
+        cache.get(self.session, 'network')
+        self.assertEqual(['get_template_summary'], self.client.calls)
+        self.assertEqual(0, self.sts.calls)
+        self.assertNotIn('ResponseMetadata', cache.get(self.session, 'network'))
+
+    def test_invalidate(self):
+        cache = self._cache()
+        cache.get(self.session, 'network')
+        update_stack(self.client, 'network', template=summary_template('network', cidr='10.1.0.0/16'))
+        cache.invalidate('us-west-2', 'network')
+        summary = cache.get(self.session, 'network')
+        self.assertEqual({'cidr': '10.1.0.0/16'}, json.loads(summary['Metadata'])['BuildParameters'])
+
+    def test_disk_layer_keyed_on_last_updated_time(self):
+        cache = self._cache(self.tmp)
+        cache.get(self.session, 'network')
+        cache.get(self.session, 'network')
+        self.assertEqual(['list_stacks', 'get_template_summary'], self.client.calls)
+        update_stack(self.client, 'network', template=summary_template('network', cidr='10.1.0.0/16'))
+        self.client.calls = []
+        cache.invalidate('us-west-2', 'network')
+        cache.get(self.session, 'network')
+        self.assertEqual(['list_stacks', 'get_template_summary'], self.client.calls)
+
+    def test_disk_layer_survives_the_process(self):
+        self._cache(self.tmp).get(self.session, 'network')
+        self.client.calls = []
+        self.assertEqual('network', self._cache(self.tmp).get(self.session, 'network')['Description'])
+        self.assertEqual(['list_stacks'], self.client.calls)
+
+    def test_unlisted_stack_is_not_cached_on_disk(self):
+        cache = self._cache(self.tmp)
+        cache.get(self.session, 'network')
+        create_stack(self.client, 'consul', template=summary_template('consul'))
+        self.client.calls = []
+        cache.get(self.session, 'consul')
+        cache.get(self.session, 'consul')
+        self.assertEqual(['get_template_summary'] * 2, self.client.calls)
+
+    def test_deleted_stacks_are_not_listed(self):
+        create_stack(self.client, 'old')
+        self.client.delete_stack(StackName='old')
+        self.client.settle()
+        self.client.calls = []
+        cache = self._cache(self.tmp)
+        self.assertIsNone(cache._listed_version(self.session, ('123456789012', 'us-west-2', 'old')))
+        self.assertEqual(['list_stacks'], self.client.calls)
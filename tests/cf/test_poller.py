@@ -0,0 +1,109 @@
+import threading
+import unittest
+
+import botocore.exceptions
+
+from scaffold.cf.stack.monitor import Backoff
+from scaffold.cf.stack.operation import StackDeleter, StackOperation
+from scaffold.cf.stack.poller import StackPoller
+
+from .fake_cloudformation import FakeCloudFormationClient, FakeSession
+
+TEMPLATE = '{"Resources": {}}'
+
+
+def quick_backoff():
+    return Backoff(initial=0.001, maximum=0.01)
+
+
+class TestStackOperationEvents(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeCloudFormationClient()
+        self.session = FakeSession(self.client)
+
+    def test_create_events(self):
+        operation = StackOperation(self.session, 'One', TEMPLATE, [], 'bucket', 'prefix')
+        events = list(operation.create_events(backoff=quick_backoff()))
+        self.assertEqual(['One', 'Vpc', 'Vpc', 'Subnet', 'Subnet', 'One'], [e.logical_id for e in events])
+        self.assertEqual('CREATE_COMPLETE', events[-1].status)
+        self.assertTrue(events[-1].is_stack)
+
+    def test_operation_starts_before_events_are_read(self):
+        StackOperation(self.session, 'One', TEMPLATE, [], 'bucket', 'prefix').create_events(backoff=quick_backoff())
+        self.assertEqual(1, len(self.client.describe_stacks(StackName='One')['Stacks']))
+
+    def test_delete_events(self):
+        self.client.create_stack(StackName='One', TemplateBody=TEMPLATE)
+        self.client.settle()
+        events = list(StackDeleter(self.session, 'One').delete_events(backoff=quick_backoff()))
+        self.assertEqual(['DELETE_IN_PROGRESS', 'DELETE_COMPLETE'], [e.status for e in events if e.is_stack])
+        self.assertEqual(4, len([e for e in events if not e.is_stack]))
+
+
+class TestStackPoller(unittest.TestCase):
+
+    def setUp(self):
+        self.client = FakeCloudFormationClient()
+        self.session = FakeSession(self.client)
+        self.statuses = {}
+        self.lock = threading.Lock()
+
+    def _callback(self, stack_id, status, reason):
+        with self.lock:
+            self.statuses.setdefault(stack_id, []).append(status)
+
+    def _operation(self, name):
+        return StackOperation(self.session, name, TEMPLATE, [], 'bucket', 'prefix')
+
+    def test_create_async(self):
+        with StackPoller(backoff_factory=quick_backoff) as poller:
+            future = self._operation('One').create_async(poller, progress_callback=self._callback)
+            stack = future.result(5)
+        self.assertEqual('One', stack.name)
+        self.assertEqual([['CREATE_IN_PROGRESS', 'CREATE_COMPLETE']], self.statuses.values())
+
+    def test_many_operations_share_one_poller_thread(self):
+        threads_before = threading.active_count()
+        with StackPoller(max_workers=2, backoff_factory=quick_backoff) as poller:
+            stack_futures = [self._operation('Stack{}'.format(i)).create_async(poller, progress_callback=self._callback)
+                             for i in range(20)]
+            self.assertLessEqual(threading.active_count(), threads_before + 3)
+            stacks = [f.result(5) for f in stack_futures]
+        self.assertEqual(20, len(set(s.name for s in stacks)))
+        self.assertEqual(20, len(self.statuses))
+        for statuses in self.statuses.values():
+            self.assertEqual('CREATE_COMPLETE', statuses[-1])
+
+    def test_delete_async(self):
+        with StackPoller(backoff_factory=quick_backoff) as poller:
+            self._operation('Doomed').create_async(poller, progress_callback=self._callback).result(5)
+            deleter = StackDeleter(self.session, 'Doomed')
+            event = deleter.delete_async(poller, progress_callback=self._callback).result(5)
+        self.assertEqual('DELETE_COMPLETE', event['ResourceStatus'])
+
+    def test_failed_start_fails_the_future(self):
+        with StackPoller(backoff_factory=quick_backoff) as poller:
+            future = StackDeleter(self.session, 'Missing').delete_async(poller)
+            with self.assertRaises(botocore.exceptions.ClientError):
+                future.result(5)
+
+    def test_nothing_started(self):
+        with StackPoller() as poller:
+            future = poller.follow(lambda: None, self._callback, lambda event: 'no-op')
+            self.assertEqual('no-op', future.result(5))
+
+    def test_operation_started_during_shutdown_is_followed(self):
+        release = threading.Event()
+
+        def start():
+            release.wait(5)
+            return self.client, self.client.create_stack(StackName='Late', TemplateBody=TEMPLATE)['StackId'], None
+
+        poller = StackPoller(backoff_factory=quick_backoff)
+        future = poller.follow(start, self._callback)
+        poller.shutdown(wait=False)
+        release.set()
+        self.assertEqual('CREATE_COMPLETE', future.result(5)['ResourceStatus'])
+        with self.assertRaises(RuntimeError):
+            poller.follow(lambda: None, self._callback)
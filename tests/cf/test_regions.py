@@ -0,0 +1,61 @@
+import argparse
+import threading
+import unittest
+
+from scaffold.cf.stack.regions import DEFAULT_REGIONS, fan_out, region_args
+
+
+class TestRegionArgs(unittest.TestCase):
+
+    def test_region_and_bucket(self):
+        args = argparse.Namespace(region='us-west-2', deploy_s3_bucket='deploy-{region}', stack_name='net')
+        east = region_args(args, 'us-east-1')
+        self.assertEqual('us-east-1', east.region)
+        self.assertEqual('deploy-us-east-1', east.deploy_s3_bucket)
+        self.assertEqual('net', east.stack_name)
+        self.assertEqual('deploy-{region}', args.deploy_s3_bucket)
+
+    def test_no_bucket(self):
+        args = argparse.Namespace(region='us-west-2')
+        self.assertEqual('us-west-1', region_args(args, 'us-west-1').region)
+
+
+class TestFanOut(unittest.TestCase):
+
+    def test_default_regions_are_the_ami_regions(self):
+        self.assertEqual(['us-east-1', 'us-west-1', 'us-west-2'], DEFAULT_REGIONS)
+
+    def test_regions_are_deployed_concurrently(self):
+        barrier = {'count': 0}
+        all_started = threading.Event()
+        lock = threading.Lock()
+
+        def deploy(region):
+            with lock:
+                barrier['count'] += 1
+                if barrier['count'] == len(DEFAULT_REGIONS):
+                    all_started.set()
+            # only returns if every region is being deployed at the same time
+            if not all_started.wait(5):
+                raise RuntimeError('regions deployed one after another')
+            return region.upper()
+
+        results = fan_out(DEFAULT_REGIONS, deploy)
+        self.assertTrue(results.succeeded())
+        self.assertEqual({'us-east-1': 'US-EAST-1', 'us-west-1': 'US-WEST-1', 'us-west-2': 'US-WEST-2'},
+                         results.results)
+
+    def test_failures_are_per_region(self):
+        def deploy(region):
+            if region == 'us-west-1':
+                raise ValueError('boom')
+            return region
+
+        results = fan_out(DEFAULT_REGIONS, deploy)
+        self.assertEqual(['us-east-1', 'us-west-2'], sorted(results.results))
+        self.assertEqual(['us-west-1'], list(results.failures))
+        self.assertFalse(results.succeeded())
+
+    def test_unknown_region(self):
+        with self.assertRaises(ValueError):
+            fan_out(['eu-west-1'], lambda region: region)
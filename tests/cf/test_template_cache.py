@@ -0,0 +1,121 @@
+import importlib
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+
+from scaffold.cf.template_cache import TemplateCache
+from scaffold.vpc.vpc_template import VpcTemplate
+
+
+class CountingVpcTemplate(VpcTemplate):
+    builds = 0
+
+    def internal_build_template(self):
+        CountingVpcTemplate.builds += 1
+        super(CountingVpcTemplate, self).internal_build_template()
+
+
+class TestTemplateCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.cache = TemplateCache(directory=lambda: self.tmp, bypass=False)
+        CountingVpcTemplate.builds = 0
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def _template(self, **kwargs):
+        template = CountingVpcTemplate('Vpc', 'Network', **kwargs)
+        template._template_cache = self.cache
+        return template
+
+    def _build(self, use_cache=True, **kwargs):
+        template = self._template(**kwargs)
+        template.build_template(use_cache)
+        return template.to_json()
+
+    def test_hit_skips_construction(self):
+        first = self._build()
+        second = self._build()
+        self.assertEqual(first, second)
+        self.assertEqual(1, CountingVpcTemplate.builds)
+
+    def test_build_parameters_are_part_of_the_key(self):
+        self._build()
+        changed = self._build(pub_size=512)
+        self.assertEqual(2, CountingVpcTemplate.builds)
+        self.assertIn('"pub_size": 512', changed)
+
+    def test_other_attributes_are_part_of_the_key(self):
+        self._build()
+        self._build(region='us-east-1')
+        self.assertEqual(2, CountingVpcTemplate.builds)
+
+    def test_bypass(self):
+        self._build()
+        self._build(use_cache=False)
+        self.cache.bypass = True
+        self._build()
+        self.assertEqual(3, CountingVpcTemplate.builds)
+
+    def test_disabled_without_directory(self):
+        cache = TemplateCache(directory=lambda: None, bypass=False)
+        self.assertFalse(cache.enabled())
+
+    def test_template_is_built_on_demand_after_a_hit(self):
+        expected = self._build()
+        template = self._template()
+        template.build_template()
+        self.assertEqual(1, CountingVpcTemplate.builds)
+        self.assertIsNotNone(template.template.outputs.get('VpcId'))
+        self.assertEqual(2, CountingVpcTemplate.builds)
+        self.assertEqual(expected, template.to_json())
+
+    def test_cache_holds_compact_json(self):
+        expected = self._build()
+        template = self._template()
+        template.build_template()
+        self.assertEqual(1, CountingVpcTemplate.builds)
+        self.assertNotIn('\n', template.to_json(compact=True))
+        self.assertEqual(expected, template.to_json())
+
+
+class TestSourceFiles(unittest.TestCase):
+    # A template built with a helper module from its own package
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        package = os.path.join(self.tmp, 'laurel_cache_test')
+        os.mkdir(package)
+        self._write(package, '__init__.py', '')
+        self._write(package, 'helper.py', 'SIZE = 1\n')
+        self._write(package, 'template.py', 'from scaffold.cf.template import TemplateBuilder\n'
+                                            'from .helper import SIZE\n\n\n'
+                                            'class HelperTemplate(TemplateBuilder):\n'
+                                            '    pass\n')
+        self.helper = os.path.join(package, 'helper.py')
+        sys.path.insert(0, self.tmp)
+        self.template_class = importlib.import_module('laurel_cache_test.template').HelperTemplate
+        self.cache = TemplateCache(directory=lambda: self.tmp, bypass=False,
+                                   packages=('scaffold', 'laurel_cache_test'))
+
+    def tearDown(self):
+        sys.path.remove(self.tmp)
+        for name in [n for n in sys.modules if n.startswith('laurel_cache_test')]:
+            del sys.modules[name]
+        shutil.rmtree(self.tmp)
+
+    def _write(self, directory, name, content):
+        with open(os.path.join(directory, name), 'w') as f:
+            f.write(content)
+
+    def test_editing_an_imported_helper_misses(self):
+        template = self.template_class('Helper', 'Helper')
+        key = self.cache.key(template, {})
+        self.cache.put(key, '{}')
+        self.assertEqual('{}', self.cache.get(self.cache.key(template, {})))
+        self._write(os.path.dirname(self.helper), 'helper.py', 'SIZE = 2\n')
+        self.assertIsNone(self.cache.get(self.cache.key(template, {})))
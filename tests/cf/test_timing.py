@@ -0,0 +1,167 @@
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+
+import boto3
+from botocore.stub import Stubber
+
+from scaffold.cf.stack.builder import StackBuilder
+from scaffold.cf.stack.timing import ApiCallCounter, PhaseTimer, write_build_report
+
+from .fake_cloudformation import FakeClock
+
+
+def fake_session():
+    return boto3.session.Session(aws_access_key_id='AKID', aws_secret_access_key='secret', region_name='us-west-2')
+
+
+class FakeTemplate(object):
+    def build_template(self):
+        pass
+
+    def to_json(self, compact=False):
+        return '{"Resources": {}}'
+
+
+class FakeBuilder(StackBuilder):
+    def get_s3_bucket(self):
+        return 'bucket'
+
+    def create_s3_key_prefix(self):
+        return 'prefix'
+
+    def create_template(self, dependencies, build_parms):
+        return FakeTemplate()
+
+
+class TestPhaseTimer(unittest.TestCase):
+
+    def test_phases_in_order(self):
+        clock = FakeClock()
+        timer = PhaseTimer(clock)
+        with timer.phase('first'):
+            clock.sleep(1.5)
+        clock.sleep(0.5)
+        with timer.phase('second'):
+            clock.sleep(2.0)
+        self.assertEqual([('first', 1.5), ('second', 2.0)], list(timer.phases.items()))
+        self.assertEqual(3.5, timer.total())
+
+    def test_failed_phase_is_timed(self):
+        clock = FakeClock()
+        timer = PhaseTimer(clock)
+        with self.assertRaises(ValueError):
+            with timer.phase('broken'):
+                clock.sleep(1.0)
+                raise ValueError()
+        self.assertEqual({'broken': 1.0}, dict(timer.phases))
+
+
+class TestApiCallCounter(unittest.TestCase):
+
+    def setUp(self):
+        self.session = fake_session()
+        self.counter = ApiCallCounter().install(self.session)
+        self.tmp = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmp)
+
+    def test_counts_calls_and_uploaded_bytes(self):
+        s3 = self.session.client('s3')
+        path = os.path.join(self.tmp, 'config')
+        with open(path, 'wb') as f:
+            f.write(b'0123456789')
+        with Stubber(s3) as stubber:
+            stubber.add_response('put_object', {})
+            stubber.add_response('put_object', {})
+            stubber.add_response('head_object', {})
+            s3.put_object(Bucket='bucket', Key='a', Body=b'12345')
+            with open(path, 'rb') as f:
+                s3.put_object(Bucket='bucket', Key='b', Body=f)
+            s3.head_object(Bucket='bucket', Key='a')
+        self.assertEqual({'s3.PutObject': 2, 's3.HeadObject': 1}, self.counter.calls)
+        self.assertEqual(15, self.counter.bytes_uploaded)
+        self.assertEqual(3, self.counter.total())
+
+    def test_uninstall(self):
+        self.counter.uninstall()
+        s3 = self.session.client('s3')
+        with Stubber(s3) as stubber:
+            stubber.add_response('head_object', {})
+            s3.head_object(Bucket='bucket', Key='a')
+        self.assertEqual({}, self.counter.calls)
+
+    def test_clients_created_before_uninstall_are_ignored(self):
+        s3 = self.session.client('s3')
+        self.counter.uninstall()
+        with Stubber(s3) as stubber:
+            stubber.add_response('head_object', {})
+            s3.head_object(Bucket='bucket', Key='a')
+        self.assertEqual({}, self.counter.calls)
+
+
+class TestBuildTimings(unittest.TestCase):
+
+    def test_dry_run_phases(self):
+        results = FakeBuilder('Test', fake_session(), False).build(dry_run=True)
+        self.assertEqual(['build_template', 'create_template', 'do_before_create', 'get_dependencies',
+                          'get_previous_build_parms', 'to_json', 'wait_before_create'],
+                         sorted(results.timings))
+        self.assertIsNotNone(results.elapsed)
+        self.assertEqual({}, results.api_calls)
+        self.assertEqual(0, results.bytes_uploaded)
+
+    def test_uploads_overlap_template_creation(self):
+        template_started = threading.Event()
+
+        class OverlappingBuilder(FakeBuilder):
+            def create_template(self, dependencies, build_parms):
+                template_started.set()
+                return FakeTemplate()
+
+            def do_before_create(self, dependencies, dry_run):
+                # only returns True if the template is made while this runs
+                return template_started.wait(5), self.session
+
+        session = fake_session()
+        results = OverlappingBuilder('Test', session, False).build(dry_run=True)
+        overlapped, background_session = results.before_create
+        self.assertTrue(overlapped)
+        self.assertIsNot(session, background_session)
+
+    def test_background_session_is_cloned_on_the_building_thread(self):
+        cloned_on = []
+
+        class CloningBuilder(FakeBuilder):
+            def thread_session(self):
+                cloned_on.append(threading.current_thread())
+                return super(CloningBuilder, self).thread_session()
+
+        CloningBuilder('Test', fake_session(), False).build(dry_run=True)
+        self.assertEqual([threading.current_thread()], cloned_on)
+
+    def test_background_failure_is_raised(self):
+        class FailingBuilder(FakeBuilder):
+            def do_before_create(self, dependencies, dry_run):
+                raise IOError('upload failed')
+
+        with self.assertRaises(IOError):
+            FailingBuilder('Test', fake_session(), False).build(dry_run=True)
+
+    def test_build_report(self):
+        results = FakeBuilder('Test', fake_session(), False).build(dry_run=True)
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'report.json')
+            write_build_report(path, results)
+            with open(path) as f:
+                report = json.load(f)
+        finally:
+            shutil.rmtree(tmp)
+        self.assertEqual(sorted(results.timings), sorted(report['timings']))
+        self.assertEqual('inline', report['template_source'])
+        self.assertEqual(0, report['api_call_count'])
@@ -8,3 +8,9 @@ class TestConsulTemplate(unittest.TestCase):
     def test_instantiate(self):
         # should pass without throwing any exceptions
         ConsulTemplate('TestTemplate', 'us-west-2', 'bucket', 'prefix', 'vpc-deadbeef', '10.0.0.0/8', ['subnet-cab4abba'], [])
+
+    def test_config_is_one_bundle(self):
+        t = ConsulTemplate('TestTemplate', 'us-west-2', 'bucket', 'prefix', 'vpc-deadbeef', '10.0.0.0/8', ['subnet-cab4abba'], [])
+        t.build_template(use_cache=False)
+        self.assertIn('http://bucket.s3.amazonaws.com/prefix/config.tar.gz', t.to_json())
+        self.assertNotIn('prefix/config_consul.py', t.to_json())
@@ -0,0 +1,62 @@
+import argparse
+import os
+import unittest
+
+import yaml
+
+import deploy_environment
+from scaffold import offline
+from scaffold.cf import stack
+from scaffold.cf.stack.orchestrator import StackOrchestrator
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'offline_fixtures.json')
+
+
+def documented_example():
+    '''The example environment in deploy_environment's header comment.'''
+    with open(os.path.splitext(deploy_environment.__file__)[0] + '.py') as f:
+        lines = f.read().splitlines()
+    start = [i for i, line in enumerate(lines) if line.endswith('Example:')][0] + 2  # past the blank comment line
+    example = []
+    for line in lines[start:]:
+        if line == '#':
+            break
+        example.append(line[2:])
+    return yaml.safe_load('\n'.join(example))
+
+
+def deploy_args():
+    return argparse.Namespace(deploy_s3_bucket='deploy-bucket', deploy_s3_key_prefix='scaffold')
+
+
+class TestDeployEnvironment(unittest.TestCase):
+
+    def setUp(self):
+        stack.outputs_cache.clear()
+        stack.summary_cache.clear()
+        stack.exports_cache.clear()
+        self.aws = offline.OfflineAws(offline.load_fixtures(FIXTURES))
+        self.session = self.aws.session('us-west-2')
+
+    def test_documented_example(self):
+        environment = documented_example()
+        builders = deploy_environment.create_builders(deploy_args(), environment, self.session)
+        results = StackOrchestrator(builders, 4, True).build(False)
+        self.assertEqual({}, results.failures)
+        self.assertEqual(sorted(environment['stacks']), sorted(results.results))
+        for name, stack_results in results.results.items():
+            self.assertEqual('CREATE_COMPLETE', stack_results.stack.stack_status, name)
+
+    def test_name_that_cannot_title_resources(self):
+        environment = {'stacks': {'dev-network': {'type': 'vpc'}}}
+        with self.assertRaises(ValueError) as cm:
+            deploy_environment.create_builders(deploy_args(), environment, self.session)
+        self.assertIn('alphanumeric', str(cm.exception))
+
+    def test_documented_example_in_two_regions(self):
+        environment = documented_example()
+        for region in ('us-east-1', 'us-west-2'):
+            session = self.aws.session(region)
+            builders = deploy_environment.create_builders(deploy_args(), environment, session)
+            results = StackOrchestrator(builders, 4, True).build(False)
+            self.assertEqual({}, results.failures, region)
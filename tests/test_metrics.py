@@ -0,0 +1,96 @@
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import boto3
+import botocore.exceptions
+
+from scaffold import metrics, offline
+from scaffold.metrics import ApiMetrics, OperationMetrics
+from scaffold.throttling import ThrottlingPolicy
+from tests.test_throttling import OK_BODY, THROTTLED_BODY, ScriptedResponses
+
+
+class StepClock(object):
+    '''Each call is step seconds after the last.'''
+    def __init__(self, step):
+        self.step = step
+        self.now = 0.0
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+class TestOperationMetrics(unittest.TestCase):
+
+    def test_histogram_and_percentiles(self):
+        m = OperationMetrics()
+        for seconds in [0.005] * 8 + [0.2, 30.0]:
+            m.record(seconds, False, 0)
+        d = m.to_dict()
+        self.assertEqual(8, d['histogram']['<=10ms'])
+        self.assertEqual(1, d['histogram']['<=250ms'])
+        self.assertEqual(1, d['histogram']['>10000ms'])
+        self.assertEqual(10, d['p50_ms'])
+        self.assertEqual(250, d['p90_ms'])
+        self.assertIsNone(d['p99_ms'])
+        self.assertEqual(30000.0, d['max_ms'])
+
+
+class TestApiMetrics(unittest.TestCase):
+
+    def setUp(self):
+        self.metrics = ApiMetrics(clock=StepClock(0.5))
+
+    def test_calls_latency_and_errors(self):
+        session = self.metrics.install(offline.OfflineAws().session('us-west-2'))
+        cf = session.client('cloudformation')
+        cf.list_stacks()
+        with self.assertRaises(botocore.exceptions.ClientError):
+            cf.describe_stacks(StackName='nope')
+        summary = self.metrics.summary()
+        self.assertEqual(['cloudformation.DescribeStacks', 'cloudformation.ListStacks'], sorted(summary))
+        self.assertEqual((1, 0), (summary['cloudformation.ListStacks']['calls'],
+                                  summary['cloudformation.ListStacks']['errors']))
+        self.assertEqual(1, summary['cloudformation.DescribeStacks']['errors'])
+        self.assertEqual(500.0, summary['cloudformation.ListStacks']['mean_ms'])
+        self.assertIn('cloudformation.ListStacks', self.metrics.report())
+
+    def test_retries_and_throttles(self):
+        responses = ScriptedResponses((400, THROTTLED_BODY), (400, THROTTLED_BODY), (200, OK_BODY))
+        session = boto3.session.Session(aws_access_key_id='AKID', aws_secret_access_key='secret',
+                                        region_name='us-west-2')
+        ThrottlingPolicy(base_delay=0.001).install(session)
+        self.metrics.install(session)
+        session.events.register('before-send.cloudformation', responses)
+        session.client('cloudformation').describe_stacks()
+        m = self.metrics.summary()['cloudformation.DescribeStacks']
+        self.assertEqual((1, 0, 2, 2), (m['calls'], m['errors'], m['retries'], m['throttles']))
+
+    def test_write_summary(self):
+        session = self.metrics.install(offline.OfflineAws().session('us-west-2'))
+        session.client('sts').get_caller_identity()
+        tmp = tempfile.mkdtemp()
+        try:
+            path = os.path.join(tmp, 'metrics.json')
+            metrics.write_summary(path, self.metrics)
+            with open(path) as f:
+                self.assertEqual(1, json.load(f)['sts.GetCallerIdentity']['calls'])
+        finally:
+            shutil.rmtree(tmp)
+
+
+class TestOptIn(unittest.TestCase):
+
+    def tearDown(self):
+        os.environ.pop(metrics.METRICS_VARIABLE, None)
+
+    def test_not_installed_unless_asked(self):
+        os.environ.pop(metrics.METRICS_VARIABLE, None)
+        session = metrics.install(offline.OfflineAws().session('us-west-2'))
+        before = metrics.default_metrics.summary().get('sts.GetCallerIdentity', {}).get('calls', 0)
+        session.client('sts').get_caller_identity()
+        self.assertEqual(before, metrics.default_metrics.summary().get('sts.GetCallerIdentity', {}).get('calls', 0))
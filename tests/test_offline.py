@@ -0,0 +1,121 @@
+import argparse
+import os
+import unittest
+
+import boto3
+import botocore.exceptions
+
+from scaffold import offline
+from scaffold.cf import stack
+from scaffold.consul.consul_builder import ConsulBuilder
+from scaffold.vpc.vpc_builder import VpcBuilder
+
+FIXTURES = os.path.join(os.path.dirname(__file__), 'offline_fixtures.json')
+
+
+def vpc_args(**kwargs):
+    args = dict(stack_name='OfflineNetwork', deploy_s3_bucket='deploy-bucket', deploy_s3_key_prefix='scaffold',
+                desc='Offline Network', cidr='10.0.0.0/16', availability_zones=['a', 'b'], pub_size=1024,
+                priv_size=2048)
+    args.update(kwargs)
+    return argparse.Namespace(**args)
+
+
+class TestOfflineAws(unittest.TestCase):
+
+    def setUp(self):
+        stack.outputs_cache.clear()
+        self.aws = offline.OfflineAws(offline.load_fixtures(FIXTURES))
+        self.session = self.aws.session('us-west-2')
+
+    def test_seeded_stack(self):
+        self.assertEqual('vpc-deadbeef', stack.outputs(self.session, 'network')['VpcId'])
+        summary = stack.summary(self.session, 'network')
+        self.assertEqual('Network Stack', summary.description())
+        self.assertEqual(['a', 'b'], summary.build_parameters()['availability_zones'])
+
+    def test_missing_stack_is_a_client_error(self):
+        with self.assertRaises(botocore.exceptions.ClientError) as cm:
+            self.session.client('cloudformation').describe_stacks(StackName='nope')
+        self.assertEqual('ValidationError', cm.exception.response['Error']['Code'])
+
+    def test_unfaked_call_is_refused(self):
+        with self.assertRaises(NotImplementedError):
+            self.session.client('iam').create_user(UserName='someone')
+
+    def test_iam_and_sts(self):
+        self.assertEqual(['arn:aws:iam::aws:policy/ReadOnlyAccess'],
+                         [p.arn for p in self.session.resource('iam').policies.all()])
+        self.assertEqual('arn:aws:iam::210987654321:role/Deployer', self.session.resource('iam').Role('Deployer').arn)
+        self.assertEqual('210987654321', self.session.client('sts').get_caller_identity()['Account'])
+
+    def test_auto_scaling_groups(self):
+        autoscale = self.session.client('autoscaling')
+        autoscale.update_auto_scaling_group(AutoScalingGroupName='ConsulServerASG0', MinSize=0, MaxSize=0,
+                                            DesiredCapacity=0)
+        group = autoscale.describe_auto_scaling_groups()['AutoScalingGroups'][0]
+        self.assertEqual((0, 0, 0), (group['MinSize'], group['MaxSize'], group['DesiredCapacity']))
+
+    def test_backend_follows_sessions(self):
+        self.assertIs(self.aws, offline.backend(self.session))
+        self.assertIsNone(offline.backend(boto3.session.Session(region_name='us-west-2')))
+
+
+class TestOfflineBuilds(unittest.TestCase):
+    # The API call counts are the cost of each build: a change that makes more calls should show up here.
+
+    def setUp(self):
+        stack.outputs_cache.clear()
+        stack.summary_cache.clear()
+        self.aws = offline.OfflineAws(offline.load_fixtures(FIXTURES))
+        self.session = self.aws.session('us-west-2')
+
+    def test_create_then_update(self):
+        results = VpcBuilder(vpc_args(), self.session, False).build()
+        self.assertEqual('CREATE_COMPLETE', results.stack.stack_status)  # described after the build
+        self.assertEqual({'cloudformation.CreateStack': 1, 'cloudformation.DescribeStackEvents': 1},
+                         results.api_calls)
+
+        results = VpcBuilder(vpc_args(), self.session, True).build()
+        self.assertEqual([], results.changes)
+        self.assertEqual({'cloudformation.GetTemplate': 1}, results.api_calls)
+
+        results = VpcBuilder(vpc_args(cidr='10.1.0.0/16'), self.session, True).build()
+        self.assertEqual('UPDATE_COMPLETE', results.stack.stack_status)
+        self.assertTrue(results.changes)
+
+    def test_same_stack_in_two_regions(self):
+        for region in ('us-east-1', 'us-west-2'):
+            results = VpcBuilder(vpc_args(), self.aws.session(region), False).build()
+            self.assertEqual('CREATE_COMPLETE', results.stack.stack_status)
+            self.assertTrue(results.stack.stack_id.startswith('arn:aws:cloudformation:{}:'.format(region)))
+        east = self.aws.session('us-east-1').client('cloudformation')
+        self.assertEqual(['OfflineNetwork'], [s['StackName'] for s in east.describe_stacks()['Stacks']])
+        with self.assertRaises(botocore.exceptions.ClientError):
+            east.describe_stacks(StackName='network')  # seeded in us-west-2 only
+
+    def test_dry_run_needs_no_aws(self):
+        results = VpcBuilder(vpc_args(stack_name='network'), self.session, True).build(dry_run=True)
+        self.assertIn('VPC', results.template)
+        self.assertIn('\n    "Resources": {', results.template)  # indented for reading
+        self.assertEqual({}, results.api_calls)
+
+    def test_missing_parameters_come_from_the_last_build(self):
+        args = vpc_args(stack_name='network', desc=None, cidr=None, availability_zones=None)
+        results = VpcBuilder(args, self.session, True).build(dry_run=True)
+        self.assertIn('Network Stack', results.template)
+        self.assertIn('172.16.0.0/18', results.template)
+        self.assertEqual({'cloudformation.GetTemplateSummary': 1}, results.api_calls)
+
+        results = VpcBuilder(args, self.session, True).build(dry_run=True)
+        self.assertEqual({}, results.api_calls)
+
+    def test_dependent_stack_uploads_config(self):
+        args = argparse.Namespace(stack_name='consul', network_stack_name='network', deploy_s3_bucket='deploy-bucket',
+                                  deploy_s3_key_prefix='scaffold', desc='Consul', cluster_size=3,
+                                  instance_type='t2.micro', ui_instance_type='t2.micro', consul_key='key')
+        results = ConsulBuilder(args, self.session, False).build()
+        self.assertEqual('CREATE_COMPLETE', results.stack.stack_status)
+        bundle = results.before_create[0]
+        self.assertIn(('us-west-2', 'deploy-bucket', bundle.key), self.aws.objects)
+        self.assertEqual(bundle.size, results.bytes_uploaded)
@@ -0,0 +1,22 @@
+import unittest
+
+import boto3
+
+from scaffold import offline, sessions
+
+
+class TestClone(unittest.TestCase):
+
+    def test_same_credentials_and_region(self):
+        session = boto3.session.Session(aws_access_key_id='AKID', aws_secret_access_key='secret',
+                                        aws_session_token='token', region_name='eu-west-1')
+        clone = sessions.clone(session)
+        self.assertIsNot(session, clone)
+        self.assertEqual('eu-west-1', clone.region_name)
+        self.assertEqual(('AKID', 'secret', 'token'), tuple(clone.get_credentials().get_frozen_credentials()))
+
+    def test_offline_clone_shares_the_backend(self):
+        aws = offline.OfflineAws()
+        clone = sessions.clone(aws.session('us-west-2'))
+        self.assertIs(aws, offline.backend(clone))
+        self.assertEqual('us-west-2', clone.region_name)
@@ -0,0 +1,138 @@
+import io
+import threading
+import unittest
+
+import boto3
+import botocore.awsrequest
+import botocore.exceptions
+
+from scaffold.throttling import DEFAULT_RATES, ThrottlingPolicy, TokenBucket, is_throttling_error
+from tests.cf.fake_cloudformation import FakeClock
+
+THROTTLED_BODY = b'''<ErrorResponse xmlns="http://cloudformation.amazonaws.com/doc/2010-05-15/">
+  <Error><Type>Sender</Type><Code>Throttling</Code><Message>Rate exceeded</Message></Error>
+  <RequestId>1</RequestId>
+</ErrorResponse>'''
+
+OK_BODY = b'''<DescribeStacksResponse xmlns="http://cloudformation.amazonaws.com/doc/2010-05-15/">
+  <DescribeStacksResult><Stacks/></DescribeStacksResult>
+  <ResponseMetadata><RequestId>2</RequestId></ResponseMetadata>
+</DescribeStacksResponse>'''
+
+
+class FakeRaw(object):
+    def __init__(self, body):
+        self._body = io.BytesIO(body)
+
+    def stream(self, **kwargs):
+        yield self._body.read()
+
+
+class ScriptedResponses(object):
+    '''before-send handler answering calls from a list of (status code, body) instead of going to AWS.'''
+    def __init__(self, *responses):
+        self.responses = list(responses)
+        self.sent = 0
+
+    def __call__(self, request, **kwargs):
+        self.sent += 1
+        status, body = self.responses.pop(0)
+        return botocore.awsrequest.AWSResponse(request.url, status, {}, FakeRaw(body))
+
+
+def fake_session(policy, responses, region_name='us-west-2'):
+    session = boto3.session.Session(aws_access_key_id='AKID', aws_secret_access_key='secret',
+                                    region_name=region_name)
+    policy.install(session)
+    session.events.register('before-send.cloudformation', responses)
+    return session
+
+
+class TestTokenBucket(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = FakeClock()
+        self.bucket = TokenBucket(2.0, capacity=2, clock=self.clock, sleep=self.clock.sleep)
+
+    def test_burst_then_wait(self):
+        self.assertEqual(0, self.bucket.acquire())
+        self.assertEqual(0, self.bucket.acquire())
+        self.assertAlmostEqual(0.5, self.bucket.acquire())
+        self.assertEqual([0.5], self.clock.slept)
+
+    def test_refills_over_time(self):
+        self.bucket.acquire()
+        self.bucket.acquire()
+        self.clock.now += 1.0
+        self.assertEqual(0, self.bucket.acquire())
+        self.assertEqual(0, self.bucket.acquire())
+
+    def test_throttled_slows_down_and_recovers(self):
+        self.bucket.throttled()
+        self.bucket.throttled()
+        self.assertEqual(0.5, self.bucket.rate)
+        for i in range(100):
+            self.bucket.succeeded()
+        self.assertEqual(2.0, self.bucket.rate)
+
+    def test_concurrent_acquires_are_spaced(self):
+        # time does not pass, so each waiting caller has to queue up behind the previous one
+        bucket = TokenBucket(2.0, capacity=2, clock=self.clock, sleep=self.clock.slept.append)
+        threads = [threading.Thread(target=bucket.acquire) for i in range(6)]
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        self.assertEqual([0.5, 1.0, 1.5, 2.0], sorted(self.clock.slept))
+
+
+class TestThrottlingPolicy(unittest.TestCase):
+
+    def setUp(self):
+        self.policy = ThrottlingPolicy(base_delay=0.001, max_attempts=5, jitter=lambda: 1.0)
+
+    def test_is_throttling_error(self):
+        self.assertTrue(is_throttling_error({'Code': 'Throttling', 'Message': 'Rate exceeded'}))
+        self.assertTrue(is_throttling_error({'Code': 'TooManyRequestsException'}))
+        self.assertTrue(is_throttling_error({'Code': 'ValidationError', 'Message': 'Rate exceeded'}))
+        self.assertFalse(is_throttling_error({'Code': 'ValidationError', 'Message': 'Stack does not exist'}))
+
+    def test_retry_delay_grows_and_is_capped(self):
+        policy = ThrottlingPolicy(base_delay=1.0, max_delay=5.0, jitter=lambda: 1.0)
+        self.assertEqual([1.0, 2.0, 4.0, 5.0], [policy.retry_delay(n) for n in range(1, 5)])
+
+    def test_throttled_call_is_retried(self):
+        responses = ScriptedResponses((400, THROTTLED_BODY), (400, THROTTLED_BODY), (200, OK_BODY))
+        client = fake_session(self.policy, responses).client('cloudformation')
+        self.assertEqual([], client.describe_stacks()['Stacks'])
+        self.assertEqual(3, responses.sent)
+        counters = self.policy.summary()[('cloudformation', 'us-west-2')]
+        self.assertEqual(1, counters['calls'])
+        self.assertEqual(2, counters['throttles'])
+        self.assertEqual(2, counters['retries'])
+        self.assertAlmostEqual(0.003, counters['retry_seconds'])
+
+    def test_gives_up_after_max_attempts(self):
+        responses = ScriptedResponses(*[(400, THROTTLED_BODY)] * 5)
+        client = fake_session(self.policy, responses).client('cloudformation')
+        with self.assertRaises(botocore.exceptions.ClientError) as context:
+            client.describe_stacks()
+        self.assertEqual('Throttling', context.exception.response['Error']['Code'])
+        self.assertEqual(5, responses.sent)
+        self.assertEqual(4, self.policy.summary()[('cloudformation', 'us-west-2')]['retries'])
+
+    def test_sessions_share_buckets(self):
+        responses = ScriptedResponses((200, OK_BODY), (200, OK_BODY))
+        fake_session(self.policy, responses).client('cloudformation').describe_stacks()
+        fake_session(self.policy, responses).client('cloudformation').describe_stacks()
+        self.assertEqual(2, self.policy.summary()[('cloudformation', 'us-west-2')]['calls'])
+        self.assertEqual([('cloudformation', 'us-west-2')], list(self.policy.summary().keys()))
+
+    def test_regions_have_buckets_of_their_own(self):
+        responses = ScriptedResponses((400, THROTTLED_BODY), (200, OK_BODY), (200, OK_BODY))
+        fake_session(self.policy, responses).client('cloudformation').describe_stacks()
+        fake_session(self.policy, responses, 'us-east-1').client('cloudformation').describe_stacks()
+        self.assertLess(self.policy.bucket('cloudformation', 'us-west-2').rate, DEFAULT_RATES['cloudformation'])
+        self.assertEqual(DEFAULT_RATES['cloudformation'], self.policy.bucket('cloudformation', 'us-east-1').rate)
+        self.assertEqual([('cloudformation', 'us-east-1'), ('cloudformation', 'us-west-2')],
+                         sorted(self.policy.summary()))